@@ -1,8 +1,17 @@
+import asyncio
+import logging
 import os
-from sqlalchemy import create_engine
+import threading
+import time
+from contextlib import AsyncExitStack
+from sqlalchemy import create_engine, event, exc
+from starlette.concurrency import run_in_threadpool
 from dotenv import load_dotenv
+from services.metrics import before_cursor_execute, after_cursor_execute, record_pool_wait
 
-load_dotenv()  
+load_dotenv()
+
+logger = logging.getLogger("uvicorn.error")
 
 USER = os.getenv("USER")
 PASSWORD = os.getenv("PASSWORD")
@@ -10,6 +19,190 @@ HOST = os.getenv("HOST")
 PORT = os.getenv("PORT") or "3306"
 DATABASE = os.getenv("DATABASE")
 
-DATABASE_URL = f"mysql+pymysql://{USER}:{PASSWORD}@{HOST}:{PORT}/{DATABASE}"
+# A full URL overrides the pieces above (the benchmark suite points it at SQLite)
+DATABASE_URL = os.getenv("DATABASE_URL") or f"mysql+pymysql://{USER}:{PASSWORD}@{HOST}:{PORT}/{DATABASE}"
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL") or f"mysql+aiomysql://{USER}:{PASSWORD}@{HOST}:{PORT}/{DATABASE}"
+
+# Async engine (aiomysql); the sync PyMySQL engine stays as the fallback
+DB_ASYNC = os.getenv("DB_ASYNC", "0") == "1"
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE") or "5")
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW") or "10")
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT") or "30")
+# Seconds after which a connection is replaced; keep below MySQL's wait_timeout
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE") or "280")
+# always: ping on every checkout; idle: only connections idle for DB_PRE_PING_IDLE seconds; never
+DB_PRE_PING = (os.getenv("DB_PRE_PING") or "idle").lower()
+DB_PRE_PING_IDLE = float(os.getenv("DB_PRE_PING_IDLE") or "30")
+# Connections each worker opens at startup (defaults to the pool size; 0 disables)
+DB_POOL_WARMUP = int(os.getenv("DB_POOL_WARMUP") or str(DB_POOL_SIZE))
+
+if DB_PRE_PING not in ("always", "idle", "never"):
+    raise ValueError(f"DB_PRE_PING must be always, idle or never, not {DB_PRE_PING!r}")
+
+_POOL_OPTIONS = {
+    "pool_pre_ping": DB_PRE_PING == "always",
+    "pool_recycle": DB_POOL_RECYCLE,
+    "pool_size": DB_POOL_SIZE,
+    "max_overflow": DB_MAX_OVERFLOW,
+    "pool_timeout": DB_POOL_TIMEOUT,
+}
+
+engine = create_engine(DATABASE_URL, **_POOL_OPTIONS)
+
+async_engine = None
+if DB_ASYNC:
+    from sqlalchemy.ext.asyncio import create_async_engine
+
+    async_engine = create_async_engine(ASYNC_DATABASE_URL, **_POOL_OPTIONS)
+
+
+class PoolStats:
+    """Checkout counters of the engine in use, in this worker."""
+
+    def __init__(self):
+        self.checkouts = 0
+        self.wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+        self.timeouts = 0
+        self.pings = 0
+        self.ping_failures = 0
+        self._lock = threading.Lock()
+
+    def checkout(self, seconds):
+        with self._lock:
+            self.checkouts += 1
+            self.wait_seconds += seconds
+            self.max_wait_seconds = max(self.max_wait_seconds, seconds)
+        record_pool_wait(seconds)
+
+    def timeout(self):
+        with self._lock:
+            self.timeouts += 1
+
+    def ping(self, ok):
+        with self._lock:
+            self.pings += 1
+            if not ok:
+                self.ping_failures += 1
+
+
+pool_stats = PoolStats()
+
+
+def _on_connect(dbapi_connection, connection_record):
+    connection_record.info["checked_in_at"] = time.monotonic()
+
+
+def _on_checkin(dbapi_connection, connection_record):
+    connection_record.info["checked_in_at"] = time.monotonic()
+
+
+def _ping_if_idle(sync_engine):
+    def on_checkout(dbapi_connection, connection_record, connection_proxy):
+        idle = time.monotonic() - connection_record.info.get("checked_in_at", 0.0)
+        if idle < DB_PRE_PING_IDLE:
+            return
+        try:
+            sync_engine.dialect.do_ping(dbapi_connection)
+        except Exception as e:
+            pool_stats.ping(False)
+            # The pool discards this connection and checks out another one
+            raise exc.DisconnectionError(str(e))
+        pool_stats.ping(True)
+    return on_checkout
+
+
+# Per-request query counts and SQL time for /metrics, Server-Timing and the slow log
+for _engine in (engine, async_engine.sync_engine if async_engine is not None else None):
+    if _engine is not None:
+        event.listen(_engine, "before_cursor_execute", before_cursor_execute)
+        event.listen(_engine, "after_cursor_execute", after_cursor_execute)
+        if DB_PRE_PING == "idle":
+            event.listen(_engine.pool, "connect", _on_connect)
+            event.listen(_engine.pool, "checkin", _on_checkin)
+            event.listen(_engine.pool, "checkout", _ping_if_idle(_engine))
+
+
+def active_engine():
+    """The sync Engine behind run_db (the async engine's sync facade in async mode)."""
+    return async_engine.sync_engine if async_engine is not None else engine
+
+
+def pool_status():
+    pool = active_engine().pool
+    status = {
+        "pool": type(pool).__name__,
+        "async": async_engine is not None,
+        "pre_ping": DB_PRE_PING,
+        "recycle": DB_POOL_RECYCLE,
+        "timeout": DB_POOL_TIMEOUT,
+    }
+    # QueuePool and its async variant; other pools (SQLite memory, NullPool) only report the counters
+    for name in ("size", "checkedin", "checkedout", "overflow"):
+        if hasattr(pool, name):
+            status[name] = getattr(pool, name)()
+    if hasattr(pool, "size"):
+        status["max_overflow"] = pool._max_overflow
+        status["capacity"] = pool.size() + max(pool._max_overflow, 0)
+    with pool_stats._lock:
+        status.update({
+            "checkouts": pool_stats.checkouts,
+            "wait_seconds_total": round(pool_stats.wait_seconds, 6),
+            "wait_ms_mean": round(pool_stats.wait_seconds * 1000 / pool_stats.checkouts, 3)
+            if pool_stats.checkouts else None,
+            "wait_ms_max": round(pool_stats.max_wait_seconds * 1000, 3),
+            "timeouts": pool_stats.timeouts,
+            "pings": pool_stats.pings,
+            "ping_failures": pool_stats.ping_failures,
+        })
+    return status
+
+
+async def warm_pool(size=DB_POOL_WARMUP):
+    """Open `size` connections at once and return them to the pool."""
+    size = min(size, DB_POOL_SIZE)
+    if size <= 0:
+        return 0
+    if async_engine is not None:
+        async with AsyncExitStack() as stack:
+            await asyncio.gather(*(stack.enter_async_context(async_engine.connect()) for _ in range(size)))
+        return size
+
+    def open_all():
+        connections = []
+        try:
+            for _ in range(size):
+                connections.append(engine.connect())
+        finally:
+            for connection in connections:
+                connection.close()
+        return len(connections)
+
+    return await run_in_threadpool(open_all)
+
+
+async def run_db(fn, *args, write=False, **kwargs):
+    """Await `fn(conn, *args, **kwargs)` without blocking the event loop.
+
+    On the async engine `fn` runs through `run_sync`, so the same query code
+    serves both modes; otherwise it runs on the sync engine in the threadpool.
+    `write=True` wraps the call in a transaction.
+    """
+    try:
+        if async_engine is not None:
+            start = time.perf_counter()
+            async with (async_engine.begin() if write else async_engine.connect()) as conn:
+                pool_stats.checkout(time.perf_counter() - start)
+                return await conn.run_sync(fn, *args, **kwargs)
+
+        def call():
+            start = time.perf_counter()
+            with (engine.begin() if write else engine.connect()) as conn:
+                pool_stats.checkout(time.perf_counter() - start)
+                return fn(conn, *args, **kwargs)
 
-engine = create_engine(DATABASE_URL, pool_pre_ping=True, pool_recycle=280)
\ No newline at end of file
+        return await run_in_threadpool(call)
+    except exc.TimeoutError:
+        pool_stats.timeout()
+        logger.warning("No database connection free within %ss (pool %s)", DB_POOL_TIMEOUT, pool_status())
+        raise
@@ -0,0 +1,86 @@
+-- Tables added on top of the original catalog schema
+-- (Products, products_main_imgs, products_imgs, details, sub_categorys).
+
+-- Version stamp shared by the uvicorn workers when CATALOG_CACHE_SHARED=1.
+-- Every write bumps it; a worker that sees a new value drops its cache.
+CREATE TABLE IF NOT EXISTS catalog_version (
+    id TINYINT PRIMARY KEY,
+    version BIGINT NOT NULL DEFAULT 0
+);
+INSERT IGNORE INTO catalog_version (id, version) VALUES (1, 0);
+
+-- Resized/re-encoded copies of the uploaded images (thumb, card, full in
+-- jpg and webp), keyed by the url of the original they were made from.
+CREATE TABLE IF NOT EXISTS products_img_variants (
+    id VARCHAR(36) PRIMARY KEY,
+    product_id VARCHAR(36) NOT NULL,
+    source_url VARCHAR(512) NOT NULL,
+    variant_size VARCHAR(16) NOT NULL,
+    variant_format VARCHAR(8) NOT NULL,
+    url VARCHAR(512) NOT NULL,
+    INDEX idx_products_img_variants_product (product_id),
+    UNIQUE KEY uq_products_img_variants_source (product_id, source_url, variant_size, variant_format)
+);
+-- Tables created before the unique key: drop the duplicate rows, then add it.
+--   DELETE v FROM products_img_variants v JOIN products_img_variants d
+--     ON d.product_id = v.product_id AND d.source_url = v.source_url
+--    AND d.variant_size = v.variant_size AND d.variant_format = v.variant_format AND d.id < v.id;
+--   ALTER TABLE products_img_variants ADD UNIQUE KEY uq_products_img_variants_source
+--     (product_id, source_url, variant_size, variant_format);
+
+-- Recommended indexes for the catalog tables. Filtering and facet counts run
+-- in memory (services/facets.py); these cover the SQL that feeds them, the
+-- category listings and the child lookups done by hydration. MySQL has no
+-- CREATE INDEX IF NOT EXISTS, so apply them once.
+CREATE INDEX idx_products_category_id ON Products (category, id);
+CREATE INDEX idx_products_category_price ON Products (category, price);
+CREATE INDEX idx_products_price ON Products (price);
+CREATE INDEX idx_sub_categorys_product ON sub_categorys (product_id);
+CREATE INDEX idx_sub_categorys_name_product ON sub_categorys (sub_category_name, product_id);
+CREATE INDEX idx_details_product ON details (product_id);
+CREATE INDEX idx_products_imgs_product ON products_imgs (product_id);
+CREATE INDEX idx_products_main_imgs_product ON products_main_imgs (product_id);
+-- Image references by url: replaced-image checks and the image GC (services/image_gc.py)
+CREATE INDEX idx_products_imgs_url ON products_imgs (url);
+CREATE INDEX idx_products_main_imgs_url ON products_main_imgs (url);
+CREATE INDEX idx_products_img_variants_url ON products_img_variants (url);
+
+-- Read model (READ_MODEL=1): each product pre-serialized per image size, and
+-- every category's list as one JSON array. Both are rewritten in the same
+-- transaction as the catalog write; backfill with
+-- `python -m services.read_model rebuild`.
+CREATE TABLE IF NOT EXISTS product_documents (
+    product_id VARCHAR(36) NOT NULL,
+    image_size VARCHAR(16) NOT NULL,
+    category VARCHAR(255) NOT NULL,
+    document MEDIUMTEXT NOT NULL,
+    PRIMARY KEY (product_id, image_size),
+    INDEX idx_product_documents_category (category, image_size, product_id)
+);
+
+CREATE TABLE IF NOT EXISTS category_documents (
+    category VARCHAR(255) NOT NULL,
+    image_size VARCHAR(16) NOT NULL,
+    product_count INT NOT NULL,
+    document LONGTEXT NOT NULL,
+    PRIMARY KEY (category, image_size)
+);
+
+-- Change feed (GET /products/changes): one row per product written, appended in
+-- the write's transaction. seq comes from catalog_change_seq, whose row stays
+-- locked until commit so sequence numbers become visible in order. Trim with
+-- `python -m services.change_feed prune --keep-days N`.
+CREATE TABLE IF NOT EXISTS catalog_change_seq (
+    id TINYINT PRIMARY KEY,
+    seq BIGINT NOT NULL DEFAULT 0
+);
+INSERT IGNORE INTO catalog_change_seq (id, seq) VALUES (1, 0);
+
+CREATE TABLE IF NOT EXISTS catalog_changes (
+    seq BIGINT PRIMARY KEY,
+    product_id VARCHAR(36) NOT NULL,
+    category VARCHAR(255),
+    op VARCHAR(8) NOT NULL,
+    changed_at DATETIME NOT NULL,
+    INDEX idx_catalog_changes_changed_at (changed_at)
+);
@@ -0,0 +1,16 @@
+"""ASGI entry point for the benchmarks: the app from main.py plus a baseline route.
+
+/_bench/file/{fname} is a bare FileResponse over IMAGES_DIR, so the image
+scenarios can be compared with the cheapest possible way of sending a file.
+"""
+import os
+
+from fastapi.responses import FileResponse
+
+from main import app
+from services.images import IMAGES_DIR
+
+
+@app.get("/_bench/file/{fname}", include_in_schema=False)
+async def baseline_file(fname: str):
+    return FileResponse(os.path.join(IMAGES_DIR, os.path.basename(fname)))
@@ -0,0 +1,72 @@
+"""Compare two benchmark result files and flag regressions.
+
+    python -m benchmarks.compare benchmarks/results/before.json benchmarks/results/after.json
+
+Runs are matched by catalog size and scenarios by name. Exits with status 1
+when throughput drops, or p50/p99 latency or SQL statements per request
+grow, by more than --threshold percent.
+"""
+import argparse
+import json
+import sys
+
+# (label, getter, higher is better)
+METRICS = (
+    ("req/s", lambda s: s.get("throughput_rps"), True),
+    ("p50 ms", lambda s: s["latency_ms"].get("p50"), False),
+    ("p99 ms", lambda s: s["latency_ms"].get("p99"), False),
+    ("q/req", lambda s: s.get("db_queries_per_request"), False),
+)
+
+
+def _change(before, after):
+    if before in (None, 0) or after is None:
+        return None
+    return (after - before) / before * 100
+
+
+def compare(before, after, threshold):
+    regressions = []
+    before_runs = {run["products"]: run for run in before["runs"]}
+    for run in after["runs"]:
+        old = before_runs.get(run["products"])
+        if old is None:
+            continue
+        print(f"Catalog of {run['products']} products")
+        for name, new in run["scenarios"].items():
+            if name not in old["scenarios"]:
+                continue
+            cells = []
+            for label, get, higher_is_better in METRICS:
+                a, b = get(old["scenarios"][name]), get(new)
+                change = _change(a, b)
+                if change is None:
+                    cells.append(f"{label} {b if b is not None else '-'}")
+                    continue
+                worse = -change if higher_is_better else change
+                flag = " !" if worse > threshold else ""
+                if flag:
+                    regressions.append((run["products"], name, label, change))
+                cells.append(f"{label} {a:g} -> {b:g} ({change:+.1f}%){flag}")
+            print(f"  {name:<24} " + "  ".join(cells))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("before")
+    parser.add_argument("after")
+    parser.add_argument("--threshold", type=float, default=10.0, help="Percent change counted as a regression")
+    args = parser.parse_args()
+    with open(args.before, encoding="utf-8") as f:
+        before = json.load(f)
+    with open(args.after, encoding="utf-8") as f:
+        after = json.load(f)
+    regressions = compare(before, after, args.threshold)
+    if regressions:
+        print(f"{len(regressions)} regression(s) above {args.threshold:g}%")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
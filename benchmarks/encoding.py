@@ -0,0 +1,117 @@
+"""Measure JSON encode time and wire size of catalog list payloads.
+
+    python -m benchmarks.encoding --products 1000,10000
+
+For each catalog size a SQLite catalog is seeded and hydrated once. Then the
+whole list is encoded the old way (jsonable_encoder + stdlib json, as
+JSONResponse does) and with services.encoding.dumps (orjson). The body is
+then compressed with each gzip level and Brotli quality. Times are the median
+of --repeat runs.
+"""
+import argparse
+import gzip
+import json
+import os
+import statistics
+import tempfile
+import time
+from datetime import datetime
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from sqlalchemy import create_engine
+
+from benchmarks.seed import seed
+from services.compression import brotli
+from services.encoding import dumps, orjson
+from services.hydration import list_product_page
+from services.image_variants import apply_image_size
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+
+def _median_ms(fn, repeat):
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - started)
+    return round(statistics.median(times) * 1000, 2), result
+
+
+def measure(products, args, workdir):
+    database_url = f"sqlite:///{os.path.join(workdir, f'encoding-{products}.db')}"
+    seed(database_url, products, os.path.join(workdir, "images") + "/", "https://api.example.com/images",
+         image_files=args.image_files, seed_value=args.seed)
+    engine = create_engine(database_url)
+    with engine.connect() as conn:
+        catalog, _ = list_product_page(conn)
+    engine.dispose()
+    catalog = [apply_image_size(p, args.image_size) for p in catalog]
+
+    stdlib_ms, body = _median_ms(lambda: JSONResponse(jsonable_encoder(catalog)).body, args.repeat)
+    orjson_ms, fast_body = _median_ms(lambda: dumps(catalog), args.repeat)
+    result = {
+        "products": products,
+        "encode_ms": {"stdlib": stdlib_ms, "orjson": orjson_ms if orjson is not None else None},
+        "identity_bytes": len(body),
+        "same_json": json.loads(body) == json.loads(fast_body),
+        "compressed": [],
+    }
+    candidates = [("gzip", level) for level in args.gzip_levels]
+    if brotli is not None:
+        candidates += [("br", quality) for quality in args.brotli_qualities]
+    for encoding, level in candidates:
+        if encoding == "gzip":
+            ms, compressed = _median_ms(lambda: gzip.compress(fast_body, compresslevel=level, mtime=0), args.repeat)
+        else:
+            ms, compressed = _median_ms(lambda: brotli.compress(fast_body, quality=level), args.repeat)
+        result["compressed"].append({
+            "encoding": encoding,
+            "level": level,
+            "bytes": len(compressed),
+            "ratio": round(len(fast_body) / len(compressed), 1),
+            "compress_ms": ms,
+        })
+    return result
+
+
+def _print(result):
+    encode = result["encode_ms"]
+    print(f"{result['products']:>8} products  {result['identity_bytes'] / 1e6:.2f} MB  "
+          f"encode stdlib {encode['stdlib']} ms, orjson {encode['orjson']} ms")
+    for c in result["compressed"]:
+        print(f"         {c['encoding']:<4} {c['level']:>2}  {c['bytes'] / 1e3:>9.1f} kB  "
+              f"x{c['ratio']:<5} {c['compress_ms']} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--products", default="1000,10000", help="Comma-separated catalog sizes")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--image-size", default="thumb", help="Image size the listing is rendered with")
+    parser.add_argument("--gzip-levels", default="1,6,9")
+    parser.add_argument("--brotli-qualities", default="1,4,5,11")
+    parser.add_argument("--image-files", type=int, default=50)
+    parser.add_argument("--workdir", default=None)
+    parser.add_argument("--output", default=None, help="Result file (default benchmarks/results/encoding-<time>.json)")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    args.gzip_levels = [int(v) for v in args.gzip_levels.split(",") if v]
+    args.brotli_qualities = [int(v) for v in args.brotli_qualities.split(",") if v]
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix="bench-encoding-")
+    runs = []
+    for products in (int(p) for p in args.products.split(",") if p):
+        runs.append(measure(products, args, workdir))
+        _print(runs[-1])
+
+    output = args.output or os.path.join(RESULTS_DIR, f"encoding-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump({"runs": runs}, f, indent=2)
+    print(f"Results written to {output}")
+
+
+if __name__ == "__main__":
+    main()
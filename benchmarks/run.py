@@ -0,0 +1,473 @@
+"""Load-test the API against a seeded local database and write the results as JSON.
+
+    python -m benchmarks.run --products 1000,10000 --concurrency 16 --requests 2000
+
+For every catalog size the suite seeds the database, starts `benchmarks.app`
+(main.py's app) under uvicorn with a local SMTP stand-in, and drives each
+scenario at a fixed concurrency. It records throughput, p50/p95/p99
+latency, SQL statements and SQL time per request (from /metrics) and the
+server's RSS. Compare two result files with `python -m benchmarks.compare`.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import re
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from datetime import datetime, timezone
+from urllib.parse import quote
+
+import httpx
+from sqlalchemy import create_engine, text
+
+from benchmarks.seed import seed, WORDS, SUB_CATEGORIES, DETAILS, CATEGORIES
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(ROOT, "benchmarks", "results")
+
+# Settings recorded with each run so results are only compared like for like
+RECORDED_ENV = (
+    "DB_ASYNC", "DB_POOL_SIZE", "DB_MAX_OVERFLOW", "CATALOG_CACHE_TTL", "CATALOG_CACHE_MAX_ENTRIES",
+    "CATALOG_CACHE_SHARED", "DEFAULT_LIST_IMAGE_SIZE", "IMAGES_SENDFILE_HEADER", "MAIL_WORKERS",
+    "READ_MODEL", "READ_MODEL_SIZES", "COMPRESSION", "COMPRESSION_MIN_SIZE", "COMPRESSION_GZIP_LEVEL",
+    "COMPRESSION_BROTLI_QUALITY", "DB_POOL_TIMEOUT", "DB_POOL_RECYCLE", "DB_PRE_PING", "DB_PRE_PING_IDLE",
+    "DB_POOL_WARMUP", "SINGLE_FLIGHT", "SINGLE_FLIGHT_WAIT",
+)
+
+
+class Context:
+    def __init__(self, products, categories, images):
+        self.products = products
+        self.categories = categories
+        self.images = images
+
+
+def _product(ctx, rnd):
+    return rnd.choice(ctx.products)
+
+
+def _category_product(ctx, rnd):
+    product_id, category = _product(ctx, rnd)
+    return "GET", f"/products/category/{quote(category)}/{product_id}", {}
+
+
+# Products on the simulated cart page
+CART_SIZE = 20
+
+
+def _cart_per_id(ctx, rnd):
+    # What the frontend does today: one request per cart item, all in flight at once
+    return [("GET", f"/products/products/{product_id}", {}) for product_id, _ in rnd.sample(ctx.products, CART_SIZE)]
+
+
+def _cart_batch(ctx, rnd):
+    ids = ",".join(product_id for product_id, _ in rnd.sample(ctx.products, CART_SIZE))
+    return "GET", f"/products/batch?ids={ids}", {}
+
+
+# Identical requests arriving together, as when a cached category page expires under load
+HERD_SIZE = 32
+
+
+def _category_herd(ctx, rnd):
+    path = f"/products/category/{quote(rnd.choice(ctx.categories))}"
+    return [("GET", path, {})] * HERD_SIZE
+
+
+SCENARIOS = {
+    "products_page": lambda ctx, rnd: ("GET", "/products/products?limit=50", {}),
+    "products_full": lambda ctx, rnd: ("GET", "/products/products", {}),
+    "products_full_original": lambda ctx, rnd: ("GET", "/products/products?image_size=original", {}),
+    "product_by_id": lambda ctx, rnd: ("GET", f"/products/products/{_product(ctx, rnd)[0]}", {}),
+    "category_list": lambda ctx, rnd: ("GET", f"/products/category/{quote(rnd.choice(ctx.categories))}", {}),
+    "category_product": _category_product,
+    "cart_per_id": _cart_per_id,
+    "cart_batch": _cart_batch,
+    "category_herd": _category_herd,
+    "search": lambda ctx, rnd: ("GET", f"/products/search?q={quote(rnd.choice(WORDS))}", {}),
+    "search_prefix": lambda ctx, rnd: ("GET", f"/products/search?q={quote(rnd.choice(WORDS)[:3])}", {}),
+    "search_multi": lambda ctx, rnd: ("GET", f"/products/search?q={quote(' '.join(rnd.sample(WORDS, 2)))}", {}),
+    "filter": lambda ctx, rnd: (
+        "GET",
+        f"/products/filter?category={quote(rnd.choice(ctx.categories))}"
+        f"&sub_category={quote(rnd.choice(SUB_CATEGORIES))}"
+        f"&min_price={rnd.randrange(0, 50000)}&max_price={rnd.randrange(50000, 150000)}&sort=price_asc",
+        {},
+    ),
+    "filter_all": lambda ctx, rnd: ("GET", "/products/filter?in_stock=true&sort=title_asc", {}),
+    "image_original": lambda ctx, rnd: ("GET", f"/images/{rnd.choice(ctx.images)}", {}),
+    "image_thumb": lambda ctx, rnd: ("GET", f"/images/{rnd.choice(ctx.images)}?size=thumb&format=webp", {}),
+    "image_baseline": lambda ctx, rnd: ("GET", f"/_bench/file/{rnd.choice(ctx.images)}", {}),
+    "contact": lambda ctx, rnd: ("POST", "/contact/formContact", {"json": {
+        "full_name": "Cliente Prueba", "email": "cliente@example.com",
+        "message": "Consulta por " + " ".join(rnd.sample(WORDS, 4)),
+    }}),
+}
+# Run once each, after the concurrent scenarios, because they are heavy or change the catalog
+ONESHOT_SCENARIOS = ("bulk_export", "bulk_import")
+DEFAULT_SCENARIOS = (
+    "products_page", "product_by_id", "category_list", "category_product", "search", "search_prefix",
+    "filter", "image_original", "image_thumb", "image_baseline", "contact", *ONESHOT_SCENARIOS,
+)
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _rss_mb(pid):
+    # Linux only; other platforms report null
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            fields = dict(line.split(":", 1) for line in f if ":" in line)
+    except OSError:
+        return None, None
+    current = int(fields["VmRSS"].split()[0]) / 1024
+    peak = int(fields.get("VmHWM", fields["VmRSS"]).split()[0]) / 1024
+    return round(current, 1), round(peak, 1)
+
+
+_SAMPLE_RE = re.compile(r'^(\w+)(?:\{(.*)\})? (\S+)$')
+_TOTALS = (
+    "http_request_db_queries_sum", "http_request_db_queries_count", "http_request_db_seconds_sum",
+    "db_pool_checkout_seconds_sum", "db_pool_checkout_seconds_count", "db_pool_timeouts_total",
+)
+
+
+async def _db_totals(client):
+    """Summed SQL statements, SQL seconds and request count over all routes except /metrics."""
+    response = await client.get("/metrics")
+    totals = Counter()
+    for line in response.text.splitlines():
+        match = _SAMPLE_RE.match(line)
+        if not match or 'route="/metrics"' in (match.group(2) or ""):
+            continue
+        name = match.group(1)
+        if name in _TOTALS:
+            totals[name] += float(match.group(3))
+    return totals
+
+
+def _percentile(sorted_values, p):
+    if not sorted_values:
+        return None
+    k = (len(sorted_values) - 1) * p / 100
+    lo = int(k)
+    hi = min(lo + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (k - lo)
+
+
+def _summary(latencies, statuses, errors, wall, before, after, pid):
+    latencies = sorted(latencies)
+    count = after["http_request_db_queries_count"] - before["http_request_db_queries_count"]
+    queries = after["http_request_db_queries_sum"] - before["http_request_db_queries_sum"]
+    db_seconds = after["http_request_db_seconds_sum"] - before["http_request_db_seconds_sum"]
+    checkouts = after["db_pool_checkout_seconds_count"] - before["db_pool_checkout_seconds_count"]
+    pool_wait = after["db_pool_checkout_seconds_sum"] - before["db_pool_checkout_seconds_sum"]
+    rss, peak = _rss_mb(pid)
+    ms = lambda v: round(v * 1000, 3) if v is not None else None
+    return {
+        "requests": len(latencies),
+        "http_requests": sum(statuses.values()),
+        "errors": errors,
+        "status": {str(k): v for k, v in sorted(statuses.items())},
+        "seconds": round(wall, 3),
+        "throughput_rps": round(len(latencies) / wall, 2) if wall else None,
+        "latency_ms": {
+            "mean": ms(sum(latencies) / len(latencies)) if latencies else None,
+            "p50": ms(_percentile(latencies, 50)),
+            "p95": ms(_percentile(latencies, 95)),
+            "p99": ms(_percentile(latencies, 99)),
+            "max": ms(latencies[-1]) if latencies else None,
+        },
+        "db_queries_per_request": round(queries / count, 2) if count else None,
+        "db_queries_per_operation": round(queries / len(latencies), 2) if latencies else None,
+        "db_ms_per_request": round(db_seconds * 1000 / count, 3) if count else None,
+        "pool_wait_ms_per_checkout": round(pool_wait * 1000 / checkouts, 3) if checkouts else None,
+        "pool_timeouts": int(after["db_pool_timeouts_total"] - before["db_pool_timeouts_total"]),
+        "rss_mb": rss,
+        "peak_rss_mb": peak,
+    }
+
+
+async def drive(client, scenario, ctx, concurrency, total, duration, seed_value):
+    """Run `total` operations (or until `duration` seconds) with `concurrency` in flight.
+
+    An operation is one request, or the list of requests a scenario returns,
+    sent together; its latency is the time until the last response.
+    """
+    latencies, statuses = [], Counter()
+    errors = 0
+    remaining = total
+    deadline = time.perf_counter() + duration if duration else None
+
+    async def send(method, url, kwargs):
+        response = await client.request(method, url, **kwargs)
+        await response.aread()
+        return response.status_code
+
+    async def worker(n):
+        nonlocal remaining, errors
+        rnd = random.Random(seed_value * 1000 + n)
+        while remaining > 0 and (deadline is None or time.perf_counter() < deadline):
+            remaining -= 1
+            requests = scenario(ctx, rnd)
+            if isinstance(requests, tuple):
+                requests = [requests]
+            start = time.perf_counter()
+            try:
+                codes = await asyncio.gather(*(send(*request) for request in requests))
+            except httpx.HTTPError:
+                errors += 1
+                continue
+            latencies.append(time.perf_counter() - start)
+            statuses.update(codes)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker(n) for n in range(concurrency)))
+    return latencies, statuses, errors, time.perf_counter() - start
+
+
+def _import_payload(rows, seed_value):
+    rnd = random.Random(seed_value)
+    lines = []
+    for n in range(rows):
+        lines.append(json.dumps({
+            "title": " ".join(rnd.sample(WORDS, 3)).capitalize() + f" import {n}",
+            "price": round(rnd.uniform(500, 150000), 2),
+            "category": rnd.choice(CATEGORIES),
+            "sub_category": ",".join(rnd.sample(SUB_CATEGORIES, 2)),
+            "details": rnd.sample(DETAILS, 3),
+            "stock": rnd.random() < 0.7,
+        }, ensure_ascii=False))
+    return ("\n".join(lines) + "\n").encode()
+
+
+async def oneshot(client, name, import_rows, seed_value):
+    if name == "bulk_export":
+        request = client.build_request("GET", "/products/bulk/export")
+    else:
+        payload = _import_payload(import_rows, seed_value)
+        request = client.build_request(
+            "POST", "/products/bulk/import",
+            files={"file": ("catalog.ndjson", payload, "application/x-ndjson")},
+        )
+    start = time.perf_counter()
+    response = await client.send(request, stream=True)
+    size = 0
+    last = b""
+    async for chunk in response.aiter_bytes():
+        size += len(chunk)
+        last = (last + chunk)[-4096:]
+    elapsed = time.perf_counter() - start
+    result = {"status": response.status_code, "bytes": size}
+    if name == "bulk_import":
+        summary = json.loads(last.strip().splitlines()[-1])
+        result.update(rows=import_rows, inserted=summary.get("inserted"), failed=summary.get("failed"))
+        result["rows_per_second"] = round(import_rows / elapsed, 1)
+    return [elapsed], Counter({response.status_code: 1}), 0, elapsed, result
+
+
+def _product_context(database_url, images_dir):
+    engine = create_engine(database_url)
+    with engine.connect() as conn:
+        products = [tuple(row) for row in conn.execute(text("SELECT id, category FROM Products"))]
+    engine.dispose()
+    categories = sorted({category for _, category in products})
+    images = sorted(f for f in os.listdir(images_dir) if f.startswith("bench-"))
+    return Context(products, categories, images)
+
+
+def _start(cmd, env, cwd=ROOT):
+    return subprocess.Popen(cmd, env=env, cwd=cwd, stdout=subprocess.DEVNULL if not os.getenv("BENCH_VERBOSE") else None,
+                            stderr=None if os.getenv("BENCH_VERBOSE") else subprocess.DEVNULL)
+
+
+async def _wait_ready(base_url, proc, timeout):
+    async with httpx.AsyncClient(base_url=base_url) as client:
+        deadline = time.perf_counter() + timeout
+        while time.perf_counter() < deadline:
+            if proc.poll() is not None:
+                raise RuntimeError("The API process exited during startup (set BENCH_VERBOSE=1 to see why)")
+            try:
+                if (await client.get("/health/ready")).status_code == 200:
+                    return
+            except httpx.HTTPError:
+                pass
+            await asyncio.sleep(0.1)
+    raise RuntimeError("The API did not become ready in time")
+
+
+async def run_size(args, products, workdir):
+    database_url = args.database_url or f"sqlite:///{os.path.join(workdir, f'bench-{products}.db')}"
+    images_dir = os.path.join(workdir, "images") + "/"
+    port = _free_port()
+    smtp_port = _free_port()
+    base_url = f"http://127.0.0.1:{port}"
+
+    started = time.perf_counter()
+    seed(database_url, products, images_dir, f"{base_url}/images", image_files=args.image_files, seed_value=args.seed)
+    seed_seconds = time.perf_counter() - started
+    ctx = _product_context(database_url, images_dir)
+
+    env = {
+        **os.environ,
+        "DATABASE_URL": database_url,
+        "IMAGES_DIR": images_dir,
+        "IMAGES_BASE_URL": f"{base_url}/images",
+        "MAIL_SPOOL_DIR": os.path.join(workdir, "spool") + "/",
+        "SMTP_HOST": "127.0.0.1",
+        "SMTP_PORT": str(smtp_port),
+        "SMTP_SECURITY": "none",
+        "SENDER_EMAIL": "bench@example.com",
+        "SENDER_PASSWORD": "bench",
+        "RECEIVER_EMAIL": "inbox@example.com",
+    }
+    if args.async_database_url:
+        env.update(ASYNC_DATABASE_URL=args.async_database_url, DB_ASYNC="1")
+
+    read_model_seconds = None
+    if env.get("READ_MODEL") == "1":
+        # The seeder writes rows directly, so the documents are backfilled here
+        started = time.perf_counter()
+        subprocess.run([sys.executable, "-m", "services.read_model", "rebuild"], env=env, cwd=ROOT,
+                       check=True, stdout=subprocess.DEVNULL)
+        read_model_seconds = round(time.perf_counter() - started, 2)
+
+    smtp = _start([sys.executable, "-m", "benchmarks.smtp_standin", "--port", str(smtp_port)], env)
+    server = _start([
+        sys.executable, "-m", "uvicorn", "benchmarks.app:app", "--host", "127.0.0.1", "--port", str(port),
+        "--log-level", "warning", "--no-access-log",
+    ], env)
+    result = {"products": products, "seed_seconds": round(seed_seconds, 2), "scenarios": {}}
+    if read_model_seconds is not None:
+        result["read_model_seconds"] = read_model_seconds
+    try:
+        started = time.perf_counter()
+        await _wait_ready(base_url, server, args.startup_timeout)
+        result["startup_seconds"] = round(time.perf_counter() - started, 2)
+        result["rss_mb_idle"] = _rss_mb(server.pid)[0]
+
+        limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+        async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=args.timeout) as client:
+            for name in args.scenarios:
+                if name in ONESHOT_SCENARIOS:
+                    before = await _db_totals(client)
+                    latencies, statuses, errors, wall, extra = await oneshot(client, name, args.import_rows, args.seed)
+                    after = await _db_totals(client)
+                    summary = _summary(latencies, statuses, errors, wall, before, after, server.pid)
+                    summary.update(extra)
+                else:
+                    scenario = SCENARIOS[name]
+                    await drive(client, scenario, ctx, args.concurrency, args.warmup, None, args.seed + 1)
+                    before = await _db_totals(client)
+                    latencies, statuses, errors, wall = await drive(
+                        client, scenario, ctx, args.concurrency, args.requests, args.duration, args.seed
+                    )
+                    after = await _db_totals(client)
+                    summary = _summary(latencies, statuses, errors, wall, before, after, server.pid)
+                result["scenarios"][name] = summary
+                lat = summary["latency_ms"]
+                print(
+                    f"  {products:>7} {name:<24} {summary['throughput_rps'] or 0:>9.1f} req/s"
+                    f"  p50 {lat['p50'] or 0:>8.2f}ms  p99 {lat['p99'] or 0:>8.2f}ms"
+                    f"  {summary['db_queries_per_request'] if summary['db_queries_per_request'] is not None else '-':>6} q/req"
+                    f"  {summary['errors'] + sum(v for k, v in statuses.items() if k >= 400)} errors",
+                    flush=True,
+                )
+    finally:
+        for proc in (server, smtp):
+            proc.terminate()
+            try:
+                proc.wait(timeout=15)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+    return result
+
+
+def _git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def main_async(args):
+    workdir = args.workdir or tempfile.mkdtemp(prefix="barelectro-bench-")
+    os.makedirs(workdir, exist_ok=True)
+    results = {
+        "meta": {
+            "started": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "git": _git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "database": "external" if args.database_url else "sqlite",
+            "async": bool(args.async_database_url),
+            "concurrency": args.concurrency,
+            "requests": args.requests,
+            "duration": args.duration,
+            "warmup": args.warmup,
+            "seed": args.seed,
+            "env": {k: os.environ[k] for k in RECORDED_ENV if k in os.environ},
+        },
+        "runs": [],
+    }
+    for products in args.products:
+        print(f"Catalog of {products} products", flush=True)
+        results["runs"].append(await run_size(args, products, workdir))
+
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"bench-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2, ensure_ascii=False)
+    print(f"Results written to {output}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--products", default="1000", help="Comma-separated catalog sizes, e.g. 100,1000,10000")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=1000, help="Requests per scenario")
+    parser.add_argument("--duration", type=float, default=None, help="Stop a scenario after this many seconds")
+    parser.add_argument("--warmup", type=int, default=50, help="Unmeasured requests before each scenario")
+    parser.add_argument("--scenarios", default=",".join(DEFAULT_SCENARIOS),
+                        help="Comma-separated; available: " + ", ".join([*SCENARIOS, *ONESHOT_SCENARIOS]))
+    parser.add_argument("--import-rows", type=int, default=1000, help="Rows sent by the bulk_import scenario")
+    parser.add_argument("--image-files", type=int, default=200, help="Distinct image files in the seeded catalog")
+    parser.add_argument("--database-url", default=None,
+                        help="Seed and use this database instead of a fresh SQLite file (must have the schema)")
+    parser.add_argument("--async-database-url", default=None,
+                        help="Also run the app with DB_ASYNC=1 against this URL (e.g. mysql+aiomysql://...)")
+    parser.add_argument("--workdir", default=None, help="Where databases, images and the mail spool go")
+    parser.add_argument("--output", default=None, help="Result file (default benchmarks/results/bench-<time>.json)")
+    parser.add_argument("--timeout", type=float, default=120)
+    parser.add_argument("--startup-timeout", type=float, default=300)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    args.products = [int(p) for p in args.products.split(",") if p]
+    args.scenarios = [s.strip() for s in args.scenarios.split(",") if s.strip()]
+    unknown = [s for s in args.scenarios if s not in SCENARIOS and s not in ONESHOT_SCENARIOS]
+    if unknown:
+        parser.error(f"Unknown scenarios: {', '.join(unknown)}")
+    # One-shot scenarios go last so the catalog is unchanged for the others
+    args.scenarios = [s for s in args.scenarios if s not in ONESHOT_SCENARIOS] + \
+                     [s for s in args.scenarios if s in ONESHOT_SCENARIOS]
+    asyncio.run(main_async(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+-- SQLite stand-in for the MySQL catalog schema, used by the benchmark suite.
+-- Column names and the id/product_id layout match the production tables;
+-- types are the closest SQLite equivalents.
+
+CREATE TABLE IF NOT EXISTS Products (
+    id VARCHAR(36) PRIMARY KEY,
+    title VARCHAR(255) NOT NULL,
+    price REAL NOT NULL,
+    category VARCHAR(255) NOT NULL,
+    height REAL,
+    width REAL,
+    depth REAL,
+    stock INTEGER
+);
+
+CREATE TABLE IF NOT EXISTS products_main_imgs (
+    id VARCHAR(36) PRIMARY KEY,
+    product_id VARCHAR(36) NOT NULL UNIQUE,
+    url VARCHAR(512) NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS products_imgs (
+    id VARCHAR(36) PRIMARY KEY,
+    product_id VARCHAR(36) NOT NULL,
+    url VARCHAR(512) NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS details (
+    id VARCHAR(36) PRIMARY KEY,
+    product_id VARCHAR(36) NOT NULL,
+    detail_text TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS sub_categorys (
+    id VARCHAR(36) PRIMARY KEY,
+    product_id VARCHAR(36) NOT NULL,
+    sub_category_name VARCHAR(255) NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS catalog_version (
+    id INTEGER PRIMARY KEY,
+    version INTEGER NOT NULL DEFAULT 0
+);
+INSERT OR IGNORE INTO catalog_version (id, version) VALUES (1, 0);
+
+CREATE TABLE IF NOT EXISTS products_img_variants (
+    id VARCHAR(36) PRIMARY KEY,
+    product_id VARCHAR(36) NOT NULL,
+    source_url VARCHAR(512) NOT NULL,
+    variant_size VARCHAR(16) NOT NULL,
+    variant_format VARCHAR(8) NOT NULL,
+    url VARCHAR(512) NOT NULL
+);
+
+-- Same recommended indexes as Database/schema.sql
+CREATE INDEX IF NOT EXISTS idx_products_category_id ON Products (category, id);
+CREATE INDEX IF NOT EXISTS idx_products_category_price ON Products (category, price);
+CREATE INDEX IF NOT EXISTS idx_products_price ON Products (price);
+CREATE INDEX IF NOT EXISTS idx_sub_categorys_product ON sub_categorys (product_id);
+CREATE INDEX IF NOT EXISTS idx_sub_categorys_name_product ON sub_categorys (sub_category_name, product_id);
+CREATE INDEX IF NOT EXISTS idx_details_product ON details (product_id);
+CREATE INDEX IF NOT EXISTS idx_products_imgs_product ON products_imgs (product_id);
+CREATE INDEX IF NOT EXISTS idx_products_img_variants_product ON products_img_variants (product_id);
+CREATE INDEX IF NOT EXISTS idx_products_imgs_url ON products_imgs (url);
+CREATE INDEX IF NOT EXISTS idx_products_main_imgs_url ON products_main_imgs (url);
+CREATE INDEX IF NOT EXISTS idx_products_img_variants_url ON products_img_variants (url);
+CREATE UNIQUE INDEX IF NOT EXISTS uq_products_img_variants_source
+    ON products_img_variants (product_id, source_url, variant_size, variant_format);
+
+CREATE TABLE IF NOT EXISTS product_documents (
+    product_id VARCHAR(36) NOT NULL,
+    image_size VARCHAR(16) NOT NULL,
+    category VARCHAR(255) NOT NULL,
+    document TEXT NOT NULL,
+    PRIMARY KEY (product_id, image_size)
+);
+CREATE INDEX IF NOT EXISTS idx_product_documents_category ON product_documents (category, image_size, product_id);
+
+CREATE TABLE IF NOT EXISTS category_documents (
+    category VARCHAR(255) NOT NULL,
+    image_size VARCHAR(16) NOT NULL,
+    product_count INTEGER NOT NULL,
+    document TEXT NOT NULL,
+    PRIMARY KEY (category, image_size)
+);
+
+CREATE TABLE IF NOT EXISTS catalog_change_seq (
+    id INTEGER PRIMARY KEY,
+    seq INTEGER NOT NULL DEFAULT 0
+);
+INSERT OR IGNORE INTO catalog_change_seq (id, seq) VALUES (1, 0);
+
+CREATE TABLE IF NOT EXISTS catalog_changes (
+    seq INTEGER PRIMARY KEY,
+    product_id VARCHAR(36) NOT NULL,
+    category VARCHAR(255),
+    op VARCHAR(8) NOT NULL,
+    changed_at TIMESTAMP NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_catalog_changes_changed_at ON catalog_changes (changed_at);
@@ -0,0 +1,170 @@
+"""Seed a synthetic catalog for the benchmarks.
+
+    python -m benchmarks.seed --database-url sqlite:///bench.db --products 10000 --images-dir /tmp/bench-images
+
+SQLite databases get benchmarks/schema_sqlite.sql first; any other URL must
+already have the production schema (plus Database/schema.sql).
+"""
+import argparse
+import io
+import os
+import random
+import uuid
+
+from sqlalchemy import create_engine, text
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+SCHEMA_SQLITE = os.path.join(os.path.dirname(__file__), "schema_sqlite.sql")
+
+CATEGORIES = [
+    "Iluminación", "Cables", "Herramientas", "Enchufes", "Interruptores", "Automatización",
+    "Climatización", "Seguridad", "Energía solar", "Protecciones", "Canalizaciones", "Timbres",
+]
+WORDS = [
+    "lámpara", "led", "foco", "panel", "cable", "unipolar", "tripolar", "enchufe", "interruptor",
+    "térmica", "diferencial", "contactor", "sensor", "movimiento", "timer", "tablero", "caja",
+    "caño", "curva", "prolongador", "zapatilla", "alargue", "pinza", "alicate", "destornillador",
+    "tester", "multímetro", "cinta", "aisladora", "ventilador", "extractor", "calefactor",
+    "reflector", "exterior", "interior", "estanco", "blanco", "negro", "cálido", "frío",
+]
+DETAILS = [
+    "Potencia 10W", "Potencia 20W", "Potencia 50W", "220V", "12V", "IP65", "IP20", "Luz cálida",
+    "Luz fría", "Sección 2.5mm", "Sección 4mm", "Rollo 100m", "Garantía 1 año", "Garantía 2 años",
+    "Uso exterior", "Uso interior", "Norma IRAM", "Color blanco", "Color negro", "Bajo consumo",
+]
+SUB_CATEGORIES = [f"{w.capitalize()} {n}" for w in WORDS[:20] for n in ("A", "B")]
+
+
+def _image_bytes(seed):
+    if Image is None:
+        # Not decodable, but fine for serving originals
+        return b"\xff\xd8\xff\xe0" + os.urandom(2048) + b"\xff\xd9"
+    rnd = random.Random(seed)
+    img = Image.new("RGB", (800, 600), tuple(rnd.randrange(256) for _ in range(3)))
+    buf = io.BytesIO()
+    img.save(buf, "JPEG", quality=85)
+    return buf.getvalue()
+
+
+def write_images(images_dir, count):
+    """A pool of image files that the products share. Returns their filenames."""
+    os.makedirs(images_dir, exist_ok=True)
+    names = []
+    for i in range(count):
+        name = f"bench-{i:05d}.jpg"
+        path = os.path.join(images_dir, name)
+        if not os.path.exists(path):
+            with open(path, "wb") as f:
+                f.write(_image_bytes(i))
+        names.append(name)
+    return names
+
+
+def apply_sqlite_schema(engine):
+    with open(SCHEMA_SQLITE, encoding="utf-8") as f:
+        statements = [s.strip() for s in f.read().split(";")]
+    with engine.begin() as conn:
+        for statement in statements:
+            lines = [l for l in statement.splitlines() if not l.strip().startswith("--")]
+            if "".join(lines).strip():
+                conn.exec_driver_sql("\n".join(lines))
+
+
+def product_rows(count, image_names, base_url, rnd, details=3, sub_categories=2, images=2):
+    """Rows for every table, generated in chunks of 1000 products."""
+    chunk = {"Products": [], "products_main_imgs": [], "products_imgs": [], "details": [], "sub_categorys": []}
+    for n in range(count):
+        product_id = str(uuid.uuid4())
+        words = rnd.sample(WORDS, 3)
+        chunk["Products"].append({
+            "id": product_id,
+            "title": " ".join(words).capitalize() + f" {n}",
+            "price": round(rnd.uniform(500, 150000), 2),
+            "category": rnd.choice(CATEGORIES),
+            "height": round(rnd.uniform(1, 120), 1) if rnd.random() < 0.8 else None,
+            "width": round(rnd.uniform(1, 120), 1) if rnd.random() < 0.8 else None,
+            "depth": round(rnd.uniform(1, 60), 1) if rnd.random() < 0.8 else None,
+            "stock": rnd.random() < 0.7,
+        })
+        chunk["products_main_imgs"].append({
+            "id": str(uuid.uuid4()), "product_id": product_id,
+            "url": f"{base_url}/{rnd.choice(image_names)}",
+        })
+        chunk["products_imgs"] += [
+            {"id": str(uuid.uuid4()), "product_id": product_id, "url": f"{base_url}/{rnd.choice(image_names)}"}
+            for _ in range(images)
+        ]
+        chunk["details"] += [
+            {"id": str(uuid.uuid4()), "product_id": product_id, "detail_text": d}
+            for d in rnd.sample(DETAILS, details)
+        ]
+        chunk["sub_categorys"] += [
+            {"id": str(uuid.uuid4()), "product_id": product_id, "sub_category_name": s}
+            for s in rnd.sample(SUB_CATEGORIES, sub_categories)
+        ]
+        if len(chunk["Products"]) >= 1000 or n == count - 1:
+            yield chunk
+            chunk = {name: [] for name in chunk}
+
+
+INSERTS = {
+    "Products": "INSERT INTO Products (id, title, price, category, height, width, depth, stock) "
+                "VALUES (:id, :title, :price, :category, :height, :width, :depth, :stock)",
+    "products_main_imgs": "INSERT INTO products_main_imgs (id, product_id, url) VALUES (:id, :product_id, :url)",
+    "products_imgs": "INSERT INTO products_imgs (id, product_id, url) VALUES (:id, :product_id, :url)",
+    "details": "INSERT INTO details (id, product_id, detail_text) VALUES (:id, :product_id, :detail_text)",
+    "sub_categorys": "INSERT INTO sub_categorys (id, product_id, sub_category_name) "
+                     "VALUES (:id, :product_id, :sub_category_name)",
+}
+
+
+def seed(database_url, products, images_dir, base_url, image_files=200, details=3,
+         sub_categories=2, images=2, seed_value=42, reset=True):
+    """Fill the catalog tables with `products` synthetic products. Returns the product ids."""
+    rnd = random.Random(seed_value)
+    engine = create_engine(database_url)
+    if engine.dialect.name == "sqlite":
+        apply_sqlite_schema(engine)
+    image_names = write_images(images_dir, image_files)
+    ids = []
+    with engine.begin() as conn:
+        if reset:
+            for table in ("products_img_variants", "product_documents", "category_documents", "catalog_changes",
+                          *INSERTS):
+                conn.execute(text(f"DELETE FROM {table}"))
+            conn.execute(text("UPDATE catalog_change_seq SET seq = 0"))
+        for chunk in product_rows(products, image_names, base_url, rnd, details, sub_categories, images):
+            for table, rows in chunk.items():
+                if rows:
+                    conn.execute(text(INSERTS[table]), rows)
+            ids += [row["id"] for row in chunk["Products"]]
+    engine.dispose()
+    return ids
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--database-url", required=True)
+    parser.add_argument("--products", type=int, default=1000)
+    parser.add_argument("--images-dir", default="images/")
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000/images")
+    parser.add_argument("--image-files", type=int, default=200, help="Distinct image files shared by the products")
+    parser.add_argument("--details", type=int, default=3)
+    parser.add_argument("--sub-categories", type=int, default=2)
+    parser.add_argument("--images", type=int, default=2, help="Gallery images per product")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    ids = seed(
+        args.database_url, args.products, args.images_dir, args.base_url.rstrip("/"),
+        image_files=args.image_files, details=args.details, sub_categories=args.sub_categories,
+        images=args.images, seed_value=args.seed,
+    )
+    print(f"Seeded {len(ids)} products")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""Minimal local SMTP server that accepts everything, for the contact-form scenario.
+
+    python -m benchmarks.smtp_standin --port 2525
+
+Plain SMTP (no TLS), accepts any AUTH, counts messages and connections.
+Run the app with SMTP_SECURITY=none against it. With --refuse-recipients
+every RCPT TO gets a permanent 550, as for a rejected message.
+"""
+import argparse
+import asyncio
+
+
+class SMTPStandIn:
+    def __init__(self, delay=0.0, refuse_recipients=False):
+        self.delay = delay
+        self.refuse_recipients = refuse_recipients
+        self.messages = 0
+        self.connections = 0
+
+    async def handle(self, reader, writer):
+        self.connections += 1
+        writer.write(b"220 smtp-standin ESMTP\r\n")
+        await writer.drain()
+        in_data = False
+        while line := await reader.readline():
+            command = line.rstrip(b"\r\n")
+            if in_data:
+                if command == b".":
+                    in_data = False
+                    if self.delay:
+                        await asyncio.sleep(self.delay)
+                    self.messages += 1
+                    writer.write(b"250 OK queued\r\n")
+                    await writer.drain()
+                continue
+            verb = command[:4].upper()
+            if verb in (b"EHLO", b"HELO"):
+                writer.write(b"250-smtp-standin\r\n250-AUTH PLAIN LOGIN\r\n250 8BITMIME\r\n")
+            elif verb == b"AUTH":
+                writer.write(b"235 2.7.0 Authentication successful\r\n")
+            elif verb == b"RCPT" and self.refuse_recipients:
+                writer.write(b"550 5.1.1 Mailbox unavailable\r\n")
+            elif verb == b"DATA":
+                in_data = True
+                writer.write(b"354 End data with <CR><LF>.<CR><LF>\r\n")
+            elif verb == b"QUIT":
+                writer.write(b"221 Bye\r\n")
+                await writer.drain()
+                break
+            else:
+                writer.write(b"250 OK\r\n")
+            await writer.drain()
+        writer.close()
+
+    async def serve(self, host, port):
+        server = await asyncio.start_server(self.handle, host, port)
+        async with server:
+            await server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=2525)
+    parser.add_argument("--delay", type=float, default=0.0, help="Seconds to wait before accepting each message")
+    parser.add_argument("--refuse-recipients", action="store_true", help="Reject every recipient with 550")
+    args = parser.parse_args()
+    asyncio.run(SMTPStandIn(args.delay, args.refuse_recipients).serve(args.host, args.port))
+
+
+if __name__ == "__main__":
+    main()
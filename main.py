@@ -1,10 +1,48 @@
+from services.startup import startup, validate_config
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
+import logging
 import uvicorn
 from fastapi.middleware.cors import CORSMiddleware
 from routers import contact as contact_router
 from routers import products as products_router
+from routers import images as images_router
+from routers import admin as admin_router
+from routers import health as health_router
+from Database.dbGetConnection import warm_pool, pool_status
+from services.mail_queue import mail_queue
+from services.image_gc import image_gc
+from services.metrics import MetricsMiddleware, render_metrics, add_collector
+from services.compression import CompressionMiddleware, compressed_cache
+from services.catalog_cache import catalog_cache
 
-app = FastAPI()
+logger = logging.getLogger("uvicorn.error")
+
+async def _warm_pool():
+    opened = await warm_pool()
+    logger.info("Database pool warmed with %d connections", opened)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    startup.begin()
+    # Bad settings stop the worker here instead of failing on the first request
+    validate_config()
+    # Steps that need the database are retried in the background if it is not up yet;
+    # /health/ready answers 503 until they succeed
+    await startup.run("database pool", _warm_pool)
+    await startup.run("catalog", products_router.warm_catalog)
+    await mail_queue.start()
+    await image_gc.start()
+    startup.finish()
+    try:
+        yield
+    finally:
+        await startup.stop()
+        await image_gc.stop()
+        await mail_queue.stop()
+
+app = FastAPI(lifespan=lifespan)
 
 origins = [
     "http://localhost:3000",
@@ -20,15 +58,76 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "Server-Timing"],
 )
+# Added after CORS and before metrics, so the byte counters see the compressed size
+app.add_middleware(CompressionMiddleware)
+app.add_middleware(MetricsMiddleware)
+
+@add_collector
+def _catalog_cache_metrics():
+    stats = catalog_cache.stats()
+    return [
+        ("catalog_cache_hits_total", "counter", "Catalog cache lookups served from memory.", stats["hits"]),
+        ("catalog_cache_misses_total", "counter", "Catalog cache lookups that went to the database.", stats["misses"]),
+        ("catalog_cache_evictions_total", "counter", "Entries evicted to respect the size limit.", stats["evictions"]),
+        ("catalog_cache_entries", "gauge", "Entries currently cached.", stats["entries"]),
+        ("catalog_cache_hit_ratio", "gauge", "Hits over lookups since start.", stats["hit_rate"]),
+    ]
+
+@add_collector
+def _mail_queue_metrics():
+    stats = mail_queue.stats()
+    return [
+        ("contact_mail_queued", "gauge", "Contact messages waiting to be sent.", stats["queued"] + stats["waiting_retry"]),
+        ("contact_mail_sent_total", "counter", "Contact messages delivered.", stats["sent"]),
+        ("contact_mail_failed_total", "counter", "Contact messages given up on.", stats["failed"]),
+    ]
+
+@add_collector
+def _compression_metrics():
+    stats = compressed_cache.stats()
+    return [
+        ("compressed_cache_hits_total", "counter", "Responses sent from already compressed bytes.", stats["hits"]),
+        ("compressed_cache_misses_total", "counter", "Responses compressed on the fly.", stats["misses"]),
+        ("compressed_cache_bytes", "gauge", "Compressed bytes currently cached.", stats["bytes"]),
+    ]
+
+@add_collector
+def _db_pool_metrics():
+    stats = pool_status()
+    return [
+        ("db_pool_checked_out", "gauge", "Connections currently in use.", stats.get("checkedout")),
+        ("db_pool_overflow", "gauge", "Connections open beyond the pool size.", stats.get("overflow")),
+        ("db_pool_capacity", "gauge", "Pool size plus max overflow.", stats.get("capacity")),
+        ("db_pool_timeouts_total", "counter", "Checkouts that gave up after DB_POOL_TIMEOUT.", stats["timeouts"]),
+        ("db_pool_ping_failures_total", "counter", "Idle connections found dead on checkout.", stats["ping_failures"]),
+    ]
+
+@add_collector
+def _image_gc_metrics():
+    totals = image_gc.stats()["totals"]
+    return [
+        ("image_gc_runs_total", "counter", "Completed image GC sweeps.", totals["runs"]),
+        ("image_gc_removed_files_total", "counter", "Unreferenced image files removed.", totals["removed_files"]),
+        ("image_gc_reclaimed_bytes_total", "counter", "Disk space freed by the image GC.", totals["reclaimed_bytes"]),
+    ]
 
 
 @app.get('/')
 def read_root():
     return {"message": "BarElectro API by iWeb Techonology. All rights reserved"}
 
+@app.get('/metrics', include_in_schema=False)
+def get_metrics():
+    # Prometheus text exposition; each worker process reports its own counters
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
 if __name__ == "__main__":
     uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
     
 app.include_router(contact_router.router, prefix="/contact", tags=["Contact"])
-app.include_router(products_router.router, prefix="/products", tags=["Products"])
\ No newline at end of file
+app.include_router(products_router.router, prefix="/products", tags=["Products"])
+app.include_router(images_router.router, prefix="/images", tags=["Images"])
+app.include_router(admin_router.router, prefix="/admin", tags=["Admin"])
+app.include_router(health_router.router, prefix="/health", tags=["Health"])
\ No newline at end of file
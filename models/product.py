@@ -1,10 +1,13 @@
 from pydoc import describe
 from unicodedata import category
-from pydantic import BaseModel
-from typing import Optional
+from pydantic import BaseModel, Field
+from typing import Optional, Union
 from datetime import date as dt
 from typing import List
 
+# Products one batch lookup may ask for
+MAX_BATCH_SIZE = 100
+
 class Products(BaseModel):
     id: Optional[str] = None
     title: str
@@ -22,6 +25,10 @@ class ProductCreate(BaseModel):
     category: str
     sub_category: str
     details: List[str]
+    height: Optional[float] = None
+    width: Optional[float] = None
+    depth: Optional[float] = None
+    stock: Optional[bool] = None
 
 class ProductDetail(BaseModel):
     id: int
@@ -39,4 +46,13 @@ class Product(BaseModel):
     details: List[ProductDetail] = []
 
     class Config:
-        orm_mode = True
\ No newline at end of file
+        orm_mode = True
+
+class ProductRef(BaseModel):
+    id: str
+    category: Optional[str] = None
+
+class BatchLookup(BaseModel):
+    # Plain ids, or {"category", "id"} pairs checked like /category/{category}/{id}
+    items: List[Union[str, ProductRef]] = Field(..., min_length=1, max_length=MAX_BATCH_SIZE)
+    image_size: str = "original"
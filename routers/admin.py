@@ -0,0 +1,50 @@
+import hmac
+import os
+
+from dotenv import load_dotenv
+from fastapi import APIRouter, Depends, HTTPException, Request
+
+from Database.dbGetConnection import pool_status
+from services.single_flight import read_flight
+from services.image_gc import image_gc
+
+load_dotenv()
+
+# Without it the admin endpoints answer 403
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN") or ""
+
+
+def require_admin(request: Request):
+    """Accept `Authorization: Bearer <ADMIN_TOKEN>` or `X-Admin-Token: <ADMIN_TOKEN>`."""
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Admin endpoints are disabled (ADMIN_TOKEN not set)")
+    scheme, _, token = request.headers.get("Authorization", "").partition(" ")
+    if scheme.lower() != "bearer":
+        token = request.headers.get("X-Admin-Token", "")
+    if not hmac.compare_digest(token.strip().encode(), ADMIN_TOKEN.encode()):
+        raise HTTPException(status_code=401, detail="Invalid admin token",
+                            headers={"WWW-Authenticate": "Bearer"})
+
+
+router = APIRouter(dependencies=[Depends(require_admin)])
+
+
+@router.get("/db/pool")
+def get_pool_stats():
+    return pool_status()
+
+
+@router.get("/single-flight")
+def get_single_flight_stats(top: int = 20):
+    return read_flight.stats(top)
+
+
+@router.get("/images/gc")
+def get_image_gc_report():
+    return image_gc.stats()
+
+
+@router.post("/images/gc")
+async def run_image_gc(dry_run: bool = False):
+    # The safety stop always applies here; `collect --force` on the CLI overrides it
+    return await image_gc.run(dry_run=dry_run)
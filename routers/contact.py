@@ -1,51 +1,41 @@
+import logging
+
 from fastapi import HTTPException, APIRouter
-from pydantic import BaseModel
-import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
-import os
+from pydantic import BaseModel, EmailStr, Field
 from dotenv import load_dotenv
+from services.mail_queue import mail_queue, MailNotConfigured
 
 load_dotenv()
 
+logger = logging.getLogger("uvicorn.error")
+
 router = APIRouter()
 
 class FormData(BaseModel):
-    full_name: str
-    email: str
+    # Both end up in mail headers, so line breaks are rejected here (422)
+    full_name: str = Field(..., pattern=r"^[^\r\n]*$")
+    email: EmailStr
     message: str
 
-def sendEmail(form_data: FormData):
-    sender_email = os.environ.get("SENDER_EMAIL")
-    sender_password = os.environ.get("SENDER_PASSWORD")
-    receiver_email = os.environ.get("RECEIVER_EMAIL")
-    
-    if not sender_email:
-        raise HTTPException(status_code=500, detail="El email del remitente no está configurado")
-    if not sender_password:
-        raise HTTPException(status_code=500, detail="La contraseña del remitente no está configurada")
-    if not receiver_email:
-        raise HTTPException(status_code=500, detail="El email del receptor no está configurado")
-        
+async def sendEmail(form_data: FormData):
     subject = f"{form_data.full_name} - Contacto"
     body = f"Nombre completo: {form_data.full_name}\nEmail: {form_data.email}\nMensaje: {form_data.message}"
-
-    msg = MIMEMultipart()
-    msg['From'] = sender_email
-    msg['To'] = receiver_email
-    msg['Subject'] = subject
-    msg.attach(MIMEText(body, 'plain'))
-
     try:
-        with smtplib.SMTP_SSL('smtp.gmail.com', 465) as server:
-            server.login(sender_email, sender_password)
-            server.sendmail(sender_email, receiver_email, msg.as_string())
-        print("Correo enviado exitosamente")
-    except Exception as e:
-        print(f"Error al enviar el correo: {e}")
+        return await mail_queue.enqueue(subject, body, reply_to=form_data.email)
+    except MailNotConfigured as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    except Exception:
+        logger.exception("Error al encolar el correo")
         raise HTTPException(status_code=500, detail="Error al enviar el correo")
 
-@router.post("/formContact")
+@router.post("/formContact", status_code=202)
 async def send_email(form_data: FormData):
-    sendEmail(form_data)
-    return {"message": "Formulario enviado exitosamente"}
+    # Delivery happens in the background; the message is already spooled to disk
+    message_id = await sendEmail(form_data)
+    return {"message": "Formulario enviado exitosamente", "id": message_id}
+
+@router.get("/queue/stats")
+def get_queue_stats():
+    return mail_queue.stats()
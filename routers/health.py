@@ -0,0 +1,36 @@
+import asyncio
+import os
+
+from dotenv import load_dotenv
+from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+from sqlalchemy import text
+
+from Database.dbGetConnection import run_db
+from services.startup import startup
+
+load_dotenv()
+
+# How long the readiness probe waits for `SELECT 1`
+HEALTH_DB_TIMEOUT = float(os.getenv("HEALTH_DB_TIMEOUT") or "2")
+
+router = APIRouter()
+
+def _ping(conn):
+    conn.execute(text("SELECT 1"))
+
+@router.get("/live")
+def live():
+    # The process is up and serving; restarts are only needed when this fails
+    return {"status": "ok"}
+
+@router.get("/ready")
+async def ready():
+    status = startup.status()
+    if not startup.ready:
+        return JSONResponse(status_code=503, content={"status": "starting", **status})
+    try:
+        await asyncio.wait_for(run_db(_ping), HEALTH_DB_TIMEOUT)
+    except Exception as e:
+        return JSONResponse(status_code=503, content={"status": "unavailable", "database": str(e) or type(e).__name__, **status})
+    return {"status": "ready", "database": "ok", **status}
@@ -0,0 +1,97 @@
+import os
+from typing import Optional
+from fastapi import APIRouter, HTTPException, Query, Request, Response
+from fastapi.responses import FileResponse
+from starlette.concurrency import run_in_threadpool
+from dotenv import load_dotenv
+from services.images import IMAGES_DIR
+from services.image_variants import variant_path, VARIANTS_DIR, IMAGE_SIZES, VARIANT_FORMATS
+from services.http_cache import etag_matches
+
+load_dotenv()
+
+router = APIRouter()
+
+MEDIA_TYPES = {
+    ".jpg": "image/jpeg",
+    ".jpeg": "image/jpeg",
+    ".png": "image/png",
+    ".gif": "image/gif",
+    ".webp": "image/webp",
+    ".avif": "image/avif",
+}
+
+# Filenames are content hashes (uuids for older uploads) that are never rewritten,
+# so responses can be cached forever
+IMAGES_CACHE_CONTROL = os.getenv("IMAGES_CACHE_CONTROL") or "public, max-age=31536000, immutable"
+# Hand the transfer to a fronting nginx (X-Accel-Redirect) or Apache/lighttpd
+# (X-Sendfile) so the kernel sendfile()s the file instead of the Python worker
+IMAGES_SENDFILE_HEADER = os.getenv("IMAGES_SENDFILE_HEADER")
+# Internal location the proxy maps onto IMAGES_DIR (used with X-Accel-Redirect)
+IMAGES_SENDFILE_PREFIX = (os.getenv("IMAGES_SENDFILE_PREFIX") or "/internal-images/").rstrip("/") + "/"
+
+def _safe_name(fname: str):
+    if os.path.basename(fname) != fname or fname.startswith("."):
+        raise HTTPException(status_code=404, detail="Image not found.")
+
+def _stat(path):
+    try:
+        st = os.stat(path)
+    except (FileNotFoundError, NotADirectoryError):
+        return None
+    return st if os.path.isfile(path) else None
+
+async def serve_image(request: Request, path: Optional[str]) -> Response:
+    """Immutable, range-capable response for a file under IMAGES_DIR."""
+    st = await run_in_threadpool(_stat, path) if path else None
+    if st is None:
+        raise HTTPException(status_code=404, detail="Image not found.")
+
+    ext = os.path.splitext(path)[1].lower()
+    response = FileResponse(path, media_type=MEDIA_TYPES.get(ext), stat_result=st)
+    response.headers["Cache-Control"] = IMAGES_CACHE_CONTROL
+    etag = response.headers["etag"]
+
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers={"ETag": etag, "Cache-Control": IMAGES_CACHE_CONTROL})
+
+    if IMAGES_SENDFILE_HEADER:
+        if IMAGES_SENDFILE_HEADER.lower() == "x-accel-redirect":
+            target = IMAGES_SENDFILE_PREFIX + os.path.relpath(path, IMAGES_DIR).replace(os.sep, "/")
+        else:
+            target = os.path.abspath(path)
+        return Response(headers={
+            IMAGES_SENDFILE_HEADER: target,
+            "Content-Type": response.media_type or "application/octet-stream",
+            "ETag": etag,
+            "Last-Modified": response.headers["last-modified"],
+            "Cache-Control": IMAGES_CACHE_CONTROL,
+        })
+
+    # Range/If-Range are handled by FileResponse; servers offering the ASGI
+    # pathsend extension get the path instead of streamed chunks
+    return response
+
+@router.api_route('/variants/{fname}', methods=["GET", "HEAD"])
+async def get_image_variant(fname: str, request: Request):
+    _safe_name(fname)
+    return await serve_image(request, os.path.join(VARIANTS_DIR, fname))
+
+@router.api_route('/{fname}', methods=["GET", "HEAD"])
+async def get_image(
+    fname: str,
+    request: Request,
+    size: str = Query("original", description="original, thumb, card or full"),
+    format: str = Query("jpg", description="jpg or webp (ignored for the original)"),
+):
+    _safe_name(fname)
+    if size not in IMAGE_SIZES:
+        raise HTTPException(status_code=400, detail=f"Unknown image size: {size}")
+    if format not in VARIANT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unknown image format: {format}")
+
+    if size == "original":
+        path = os.path.join(IMAGES_DIR, fname)
+    else:
+        path = await run_in_threadpool(variant_path, fname, size, format)
+    return await serve_image(request, path)
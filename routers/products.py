@@ -1,92 +1,280 @@
 from typing import Optional, List
 from unicodedata import category
-from fastapi import APIRouter, HTTPException, UploadFile, File, Form
+from fastapi import APIRouter, HTTPException, UploadFile, File, Form, Query, Request, Response
+from fastapi.responses import StreamingResponse
 from sqlalchemy import text
-from Database.dbGetConnection import engine
+from starlette.concurrency import run_in_threadpool
+from Database.dbGetConnection import run_db
 import uuid
-import os
-import shutil
-from models.product import Products, ProductCreate
+from models.product import Products, ProductCreate, ProductRef, BatchLookup, MAX_BATCH_SIZE
+from services.hydration import list_product_page, fetch_products_by_ids, MAX_PAGE_SIZE
+from services.catalog_cache import (
+    catalog_cache, get_cached_products, list_cached_page, invalidate_products, bump_shared_version,
+    preload_catalog, CATALOG_CACHE_SHARED, CATALOG_PRELOAD
+)
+from services.search_index import search_index
+from services.product_writes import (
+    update_product, insert_children, insert_variants, ProductNotFound
+)
+from services.facets import facet_index, SORT_KEYS
+from services.encoding import CatalogJSONResponse, dumps
+from services.http_cache import check_not_modified, conditional_bytes, make_etag
+from services.images import store_uploads, ImageRejected
+from services.image_gc import image_gc
+from services.bulk import (
+    normalize_items, detect_format, iter_rows, next_chunk, validate_chunk, insert_products,
+    BULK_EXPORT_PAGE_SIZE
+)
+from services.image_variants import (
+    generate_all_variants, apply_image_size, IMAGE_SIZES, DEFAULT_LIST_IMAGE_SIZE
+)
+from services.read_model import (
+    refresh_documents, refresh_category_documents, get_product_document, get_product_documents,
+    get_category_document,
+    READ_MODEL, READ_MODEL_SIZES
+)
+from services.single_flight import read_flight
+from services.change_feed import (
+    record_changes, read_changes, head, change_notifier, ChangesGone, UPSERT, DELETE,
+    CHANGES_PAGE_SIZE, CHANGES_MAX_WAIT, CHANGES_POLL_INTERVAL, CHANGES_KEEPALIVE
+)
+import asyncio
 import json
-
-router = APIRouter()
-
-IMAGES_DIR = "images/"
-DOMAIN_URL = "mdpuf8ksxirarnlhtl6pxo2xylsjmtq8-barelectro-api.bargiuelectro.com/images"
+import logging
+
+router = APIRouter(default_response_class=CatalogJSONResponse)
+
+logger = logging.getLogger("uvicorn.error")
+
+_index_lock = asyncio.Lock()
+
+_INDEX_FIELDS = "id,title,price,category,height,width,depth,stock,details_list,sub_categorys"
+
+def _index_documents(conn):
+    docs, cursor = [], None
+    while True:
+        page, cursor = list_product_page(conn, limit=1000, cursor=cursor, fields=_INDEX_FIELDS)
+        docs.extend(page)
+        if not cursor:
+            return docs
+
+def _indexes_stale():
+    return any(not index.ready or index.stale for index in (search_index, facet_index))
+
+async def build_indexes(only_if_stale=False):
+    """(Re)build the search and facet indexes from one pass over the catalog.
+
+    With `only_if_stale`, requests that queued behind a rebuild find the
+    indexes fresh and return instead of rebuilding them once more each.
+    """
+    async with _index_lock:
+        if only_if_stale and not _indexes_stale():
+            return
+        docs = await run_db(_index_documents)
+        await run_in_threadpool(search_index.rebuild, docs)
+        await run_in_threadpool(facet_index.rebuild, docs)
+    logger.info("Search and facet indexes built with %d products", len(search_index))
+
+async def warm_catalog():
+    """Startup: fill the catalog cache and build the indexes from the same pass over the catalog."""
+    if not (CATALOG_PRELOAD and catalog_cache.enabled):
+        await build_indexes()
+        return
+    async with _index_lock:
+        products = await run_db(preload_catalog)
+        await run_in_threadpool(search_index.rebuild, products)
+        await run_in_threadpool(facet_index.rebuild, products)
+    logger.info("Catalog cache and indexes loaded with %d products", len(products))
+
+# Products other workers wrote, re-indexed by the next search or filter
+_remote_changes = set()
+
+def _on_cache_cleared(keys, changed):
+    if keys is None:
+        # We do not know which products changed
+        search_index.stale = True
+        facet_index.stale = True
+    elif changed:
+        _remote_changes.update(changed)
+
+catalog_cache.add_listener(_on_cache_cleared)
+
+async def _refresh_indexes():
+    if _indexes_stale():
+        await build_indexes(only_if_stale=True)
+    if _remote_changes:
+        product_ids = list(_remote_changes)
+        _remote_changes.difference_update(product_ids)
+        await _reindex(product_ids)
+
+async def _after_write(product_ids, categories, deleted=False):
+    """Bring the in-process read structures up to date after a committed write."""
+    invalidate_products(product_ids, categories)
+    read_flight.forget()
+    change_notifier.notify()
+    await _reindex(product_ids, deleted)
+
+async def _reindex(product_ids, deleted=False):
+    try:
+        products = {} if deleted else await run_db(fetch_products_by_ids, product_ids)
+        for product_id in product_ids:
+            if product_id in products:
+                search_index.index(products[product_id])
+                facet_index.index(products[product_id])
+            else:
+                search_index.remove(product_id)
+                facet_index.remove(product_id)
+    except Exception:
+        logger.exception("Could not refresh the search and facet indexes; they will be rebuilt")
+        search_index.stale = True
+        facet_index.stale = True
+
+def _cursor_headers(next_cursor: Optional[str]):
+    # Keep the body a plain array; the next page is advertised through headers
+    return {"X-Next-Cursor": next_cursor} if next_cursor else None
+
+def _list_page(conn, category=None, limit=None, cursor=None, fields=None, image_size="original"):
+    if image_size not in IMAGE_SIZES:
+        raise ValueError(f"Unknown image size: {image_size}")
+    requested = [f.strip() for f in fields.split(",")] if fields else None
+    # Swapping urls for a variant needs the variants even when they were not asked for
+    if requested and image_size != "original" and "image_variants" not in requested:
+        fields = ",".join(requested + ["image_variants"])
+
+    if catalog_cache.enabled:
+        products, next_cursor = list_cached_page(conn, category=category, limit=limit, cursor=cursor, fields=fields)
+    else:
+        products, next_cursor = list_product_page(conn, category=category, limit=limit, cursor=cursor, fields=fields)
+
+    keep_variants = bool(requested) and "image_variants" in requested
+    products = [apply_image_size(p, image_size, keep_variants) for p in products]
+    return products, next_cursor
+
+def _get_product(conn, product_id):
+    return get_cached_products(conn, [product_id]).get(product_id)
+
+def _page_content(conn, **page):
+    """Returns (content, next cursor, shared version it was read at)."""
+    version = catalog_cache.sync_shared_version(conn)
+    whole_category = not any(page.get(k) for k in ("limit", "cursor", "fields"))
+    if READ_MODEL and whole_category and page.get("category") and page.get("image_size") in READ_MODEL_SIZES:
+        document = get_category_document(conn, page["category"], page["image_size"])
+        if document is not None:
+            return document, None, version
+    return (*_list_page(conn, **page), version)
+
+def _product_content(conn, product_id):
+    """Returns (category, product or its document, shared version) or None."""
+    version = catalog_cache.sync_shared_version(conn)
+    if READ_MODEL:
+        row = get_product_document(conn, product_id)
+        if row is not None:
+            return row.category, row.document, version
+    product = _get_product(conn, product_id)
+    return (product["category"], product, version) if product else None
+
+def _encode(content):
+    # Read-model documents are already serialized and go out as they are
+    body = content.encode("utf-8") if isinstance(content, str) else dumps(content)
+    return body, make_etag(body)
+
+async def _load_page(**page):
+    content, next_cursor, version = await run_db(_page_content, **page)
+    body, body_etag = await run_in_threadpool(_encode, content)
+    return body, body_etag, version, next_cursor
+
+async def _load_product(product_id):
+    found = await run_db(_product_content, product_id)
+    if found is None:
+        return None
+    return (found[0], *_encode(found[1]), found[2])
+
+async def _revalidate(request):
+    """304 from the version validator alone, before anything is loaded (CATALOG_CACHE_SHARED=1)."""
+    if not (CATALOG_CACHE_SHARED and request.headers.get("if-none-match")):
+        return None
+    version = await run_db(catalog_cache.sync_shared_version)
+    return check_not_modified(request, version)[1]
+
+def _read_response(request, body, body_etag, version, headers=None):
+    # Runs once per request, after the (possibly shared) load. `version` is the
+    # one the body was loaded at, not whatever this worker has synced since.
+    etag, not_modified = check_not_modified(request, version)
+    if not_modified:
+        return not_modified
+    return conditional_bytes(request, body, etag or body_etag, headers)
+
+async def _read_page(request, **page):
+    not_modified = await _revalidate(request)
+    if not_modified:
+        return not_modified
+    key = ("page",) + tuple(page[k] for k in ("category", "limit", "cursor", "fields", "image_size"))
+    body, body_etag, version, next_cursor = await read_flight.do(key, _load_page, **page)
+    return _read_response(request, body, body_etag, version, _cursor_headers(next_cursor))
 
 @router.get('/products')
-def get_products():
+async def get_products(
+    request: Request,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE, description="Page size"),
+    cursor: Optional[str] = Query(None, description="Cursor returned in X-Next-Cursor"),
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return"),
+    image_size: str = Query(DEFAULT_LIST_IMAGE_SIZE, description="original, thumb, card or full"),
+):
     try:
-        with engine.begin() as conn:
-            result = conn.execute(text("SELECT * FROM Products"))
-            rows = result.mappings().all()
-            if not rows:
-                raise HTTPException(status_code=404, detail="No products found.")
-
-            products = []
-            for product in rows:
-                hid = product["id"]
-
-                main = conn.execute(
-                    text("SELECT url FROM products_main_imgs WHERE product_id = :id"),
-                    {"id": hid}
-                ).fetchone()
-
-                images = conn.execute(
-                    text("SELECT url FROM products_imgs WHERE product_id = :id"),
-                    {"id": hid}
-                ).scalars().all()
-
-                details_list = conn.execute(
-                    text("SELECT detail_text FROM details WHERE product_id = :id"),
-                    {"id": hid}
-                ).scalars().all()
-
-                sub_categorys = conn.execute(
-                    text("SELECT sub_category_name FROM sub_categorys WHERE product_id = :id"),
-                    {"id": hid}
-                ).scalars().all()
-
-                data = dict(product)
-                data["main_image"] = main[0] if main else None
-                data["images"] = images
-                data["details_list"] = details_list
-                data["sub_categorys"] = sub_categorys
-
-                products.append(data)
-
-            return products
-
+        return await _read_page(
+            request, category=None, limit=limit, cursor=cursor, fields=fields, image_size=image_size
+        )
+
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get('/products/{id}')
-def get_products_by_id(id: str):
+async def get_products_by_id(id: str, request: Request):
     try:
-        with engine.connect() as conn:
-            res = conn.execute(
-                text("SELECT * FROM Products WHERE id = :id"), {"id": id}
-            ).mappings().first()
-            if not res:
-                raise HTTPException(status_code=404, detail="Product not found.")
-            main = conn.execute(
-                text("SELECT url FROM products_main_imgs WHERE product_id = :id"), {"id": id}
-            ).fetchone()
-            images = conn.execute(
-                text("SELECT url FROM products_imgs WHERE product_id = :id"), {"id": id}
-            ).scalars().all()
-            product = dict(res)
-            product["main_image"] = main[0] if main else None
-            product["images"] = images
-            return product
+        not_modified = await _revalidate(request)
+        if not_modified:
+            return not_modified
+        found = await read_flight.do(("product", id), _load_product, id)
+        if found is None:
+            raise HTTPException(status_code=404, detail="Product not found.")
+        return _read_response(request, found[1], found[2], found[3])
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+def _insert_product(conn, product, details, sub_categories, url_main, urls_images, variants):
+    product_id = product["id"]
+    conn.execute(
+        text("""
+            INSERT INTO Products (id, title, price, category, height, width, depth, stock)
+            VALUES (:id, :title, :price, :category, :height, :width, :depth, :stock)
+        """),
+        product
+    )
+    insert_children(conn, "details", product_id, details)
+    insert_children(conn, "sub_categorys", product_id, sub_categories)
+    if url_main is not None:
+        conn.execute(
+            text("INSERT INTO products_main_imgs (id, product_id, url) VALUES (:id, :product_id, :url)"),
+            {"id": str(uuid.uuid4()), "product_id": product_id, "url": url_main}
+        )
+    insert_children(conn, "images", product_id, urls_images)
+    insert_variants(conn, product_id, variants)
+
+    record_changes(conn, UPSERT, [(product_id, product["category"])])
+    refresh_documents(conn, [product_id])
+    bump_shared_version(conn)
+
 @router.post("/products/create_product", tags=["Products"])
 async def create_product(
     title: str = Form(...),
     price: float = Form(...),
-    details_items: List[str] = Form(default=[]),      
+    details_items: List[str] = Form(default=[]),
     category: str = Form(..., description="Product category"),
     sub_category: List[str] = Form(None, description="Product sub-category"),
     height: Optional[float] = Form(None, description="Product height (optional)"),
@@ -99,97 +287,35 @@ async def create_product(
     product_id = str(uuid.uuid4())
 
     try:
-        if not os.path.exists(IMAGES_DIR):
-            os.makedirs(IMAGES_DIR, exist_ok=True)
-
-        with engine.begin() as conn:
-            conn.execute(
-                text("""
-                    INSERT INTO Products (id, title, price, category, height, width, depth, stock)
-                    VALUES (:id, :title, :price, :category, :height, :width, :depth, :stock)
-                """),
-                {
-                    "id": product_id,
-                    "title": title,
-                    "price": price,
-                    "category": category,
-                    "height": height,
-                    "width": width,
-                    "depth": depth,
-                    "stock": stock
-                }
-            )
-            # Insert details
-            normalized_details = []
-            for d in details_items:
-                if isinstance(d, str) and "," in d:
-                    normalized_details.extend([item.strip() for item in d.split(",") if item.strip()])
-                elif d:
-                    normalized_details.append(d.strip())
-
-            for d in normalized_details:
-                if not d:
-                    continue
-                conn.execute(
-                    text("""
-                        INSERT INTO details (id, product_id, detail_text)
-                        VALUES (:id, :product_id, :detail_text)
-                    """),
-                    {"id": str(uuid.uuid4()), "product_id": product_id, "detail_text": d}
-                )
-
-            # Insert sub-category
-            normalized_subcat = []
-            for d in sub_category or []:
-                if isinstance(d, str) and "," in d:
-                    normalized_subcat.extend([item.strip() for item in d.split(",") if item.strip()])
-                elif d:
-                    normalized_subcat.append(d.strip())
-
-            for d in normalized_subcat:
-                if not d:
-                    continue
-                conn.execute(
-                    text("""
-                        INSERT INTO sub_categorys (id, product_id, sub_category_name)
-                        VALUES (:id, :product_id, :sub_category_name)
-                    """),
-                    {"id": str(uuid.uuid4()), "product_id": product_id, "sub_category_name": d}
-                )
-
-            # main image
-            url_main = None
-            if main_image is not None:
-                ext = os.path.splitext(main_image.filename or "file.jpg")[1]
-                fname = f"{uuid.uuid4()}{ext}"
-                path = os.path.join(IMAGES_DIR, fname)
-                with open(path, "wb") as buf:
-                    shutil.copyfileobj(main_image.file, buf)
-                url_main = f"{DOMAIN_URL}/{fname}"
-                conn.execute(
-                    text("INSERT INTO products_main_imgs (id, product_id, url) VALUES (:id, :product_id, :url)"),
-                    {"id": str(uuid.uuid4()), "product_id": product_id, "url": url_main}
-                )
-
-            urls_images = []
-            if images:
-                for img in images:
-                    if img is None:
-                        continue
-                    ext = os.path.splitext(img.filename or "file.jpg")[1]
-                    fname = f"{uuid.uuid4()}{ext}"
-                    path = os.path.join(IMAGES_DIR, fname)
-                    with open(path, "wb") as buf:
-                        shutil.copyfileobj(img.file, buf)
-                    url = f"{DOMAIN_URL}/{fname}"
-                    urls_images.append(url)
-                    conn.execute(
-                        text("""
-                            INSERT INTO products_imgs (id, product_id, url)
-                            VALUES (:id, :product_id, :url)
-                        """),
-                        {"id": str(uuid.uuid4()), "product_id": product_id, "url": url}
-                    )
+        # Files are streamed to disk first; the transaction only inserts rows. If it
+        # fails they are left to the image GC: with content-addressed names another
+        # request may already reference the same files
+        stored = await store_uploads([main_image, *(images or [])])
+        url_main = stored[0].url if stored[0] else None
+        urls_images = [s.url for s in stored[1:] if s]
+        variants = await generate_all_variants(stored)
+
+        await run_db(
+            _insert_product,
+            {
+                "id": product_id,
+                "title": title,
+                "price": price,
+                "category": category,
+                "height": height,
+                "width": width,
+                "depth": depth,
+                "stock": stock
+            },
+            normalize_items(details_items),
+            normalize_items(sub_category),
+            url_main,
+            urls_images,
+            variants,
+            write=True,
+        )
+
+        await _after_write([product_id], [category])
 
         return {
             "message": "Product created successfully",
@@ -208,238 +334,535 @@ async def create_product(
             }
         }
 
+    except ImageRejected as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+def _update_product(conn, id, fields, **children):
+    old_category, removed_urls = update_product(conn, id, fields, **children)
+    record_changes(conn, UPSERT, [(id, fields.get("category") or old_category)])
+    refresh_documents(conn, [id], [old_category])
+    bump_shared_version(conn)
+    return old_category, removed_urls
+
+async def _apply_update(id, fields, details, sub_category, main_image, images, keep_images):
+    try:
+        stored = await store_uploads([main_image, *(images or [])])
+        variants = await generate_all_variants(stored)
+
+        old_category, removed_urls = await run_db(
+            _update_product,
+            id,
+            fields,
+            details=normalize_items(details) if details is not None else None,
+            sub_categories=normalize_items(sub_category) if sub_category is not None else None,
+            main_image=stored[0].url if stored[0] else None,
+            new_images=[s.url for s in stored[1:] if s],
+            keep_images=normalize_items(keep_images) if keep_images is not None else None,
+            variants=variants,
+            write=True,
+        )
+
+        # Replaced images are removed by the image GC once nothing references them
+        if removed_urls:
+            image_gc.wake()
+        await _after_write([id], [old_category, fields.get("category") or old_category])
+
+        return {"message": "Product updated successfully"}
+
+    except ProductNotFound:
+        raise HTTPException(status_code=404, detail="Product not found.")
+    except ImageRejected as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+
 @router.put('/products/{id}')
-async def update_product(
+async def update_product_put(
     id: str,
     title: str = Form(...),
     price: float = Form(...),
-    details: List[str] = Form(default=[]),
+    details: Optional[List[str]] = Form(None, description="Replaces the details when sent"),
     category: str = Form(..., description="Product category"),
     width: Optional[float] = Form(None, description="Product width (optional)"),
     height: Optional[float] = Form(None, description="Product height (optional)"),
     depth: Optional[float] = Form(None, description="Product depth (optional)"),
     stock: Optional[bool] = Form(None, description="Product stock (optional)"),
-    sub_category: List[str] = Form(None, description="Product sub-category"),
+    sub_category: Optional[List[str]] = Form(None, description="Replaces the sub-categories when sent"),
     main_image: Optional[UploadFile] = File(default=None, description="New main image (optional)"),
-    images: List[UploadFile] = File(default=[], description="Additional images (optional)")
+    images: List[UploadFile] = File(default=[], description="Additional images (optional)"),
+    keep_images: Optional[List[str]] = Form(None, description="Gallery urls to keep; the others are removed"),
 ):
-    try:
-        if not os.path.exists(IMAGES_DIR):
-            os.makedirs(IMAGES_DIR, exist_ok=True)
-
-        with engine.begin() as conn:
-            result = conn.execute(
-                text("""
-                    UPDATE Products SET 
-                        title = :title,
-                        price = :price,
-                        category = :category,
-                        height = :height,
-                        width = :width,
-                        depth = :depth,
-                        stock = :stock
-                    WHERE id = :id
-                """),
-                {"id": id, "title": title, "price": price, "details": details, "category": category, "height": height, "width": width, "depth": depth, "stock": stock}
-            )
-            
-            if result.rowcount == 0:
-                raise HTTPException(status_code=404, detail="Product not found.")
-
-            # Update details
-            result = conn.execute(
-                text("UPDATE details SET detail_text = :detail_text WHERE product_id = :id"),
-                {"id": id, "detail_text": details}
-            )
-
-            # Update sub-category
-            result = conn.execute(
-                text("UPDATE sub_categorys SET sub_category_name = :sub_category_name WHERE product_id = :id"),
-                {"id": id, "sub_category_name": sub_category}
-            )
+    fields = {"title": title, "price": price, "category": category, "height": height, "width": width, "depth": depth, "stock": stock}
+    return await _apply_update(id, fields, details, sub_category, main_image, images, keep_images)
 
-            if main_image:
-                ext = os.path.splitext(main_image.filename or "file.jpg")[1]
-                fname = f"{uuid.uuid4()}{ext}"
-                path = os.path.join(IMAGES_DIR, fname)
-                with open(path, "wb") as buf:
-                    shutil.copyfileobj(main_image.file, buf)
-                url_main = f"{DOMAIN_URL}/{fname}"
-
-                conn.execute(
-                    text("""
-                        INSERT INTO products_main_imgs (id, product_id, url)
-                        VALUES (:uuid, :product_id, :url)
-                        ON DUPLICATE KEY UPDATE url = :url
-                    """),
-                    {"uuid": str(uuid.uuid4()), "product_id": id, "url": url_main}
-                )
-
-            for img in images:
-                if not hasattr(img, "filename") or img.filename == "":
-                    continue
-
-                ext = os.path.splitext(str(img.filename or "file.jpg"))[1]
-                filename = f"{uuid.uuid4()}{ext}"
-                filepath = os.path.join(IMAGES_DIR, filename)
-                with open(filepath, "wb") as buffer:
-                    shutil.copyfileobj(img.file, buffer)
-                public_url = f"{DOMAIN_URL}/{filename}"
-
-                conn.execute(
-                    text("""
-                        INSERT INTO products_imgs (id, product_id, url)
-                        VALUES (:id, :product_id, :url)
-                    """),
-                    {"id": str(uuid.uuid4()), "product_id": id, "url": public_url}
-                )
-
-        return {"message": "Product updated successfully"}
+@router.patch('/products/{id}')
+async def update_product_patch(
+    id: str,
+    title: Optional[str] = Form(None),
+    price: Optional[float] = Form(None),
+    details: Optional[List[str]] = Form(None, description="Replaces the details when sent (send an empty value to clear)"),
+    category: Optional[str] = Form(None),
+    width: Optional[float] = Form(None),
+    height: Optional[float] = Form(None),
+    depth: Optional[float] = Form(None),
+    stock: Optional[bool] = Form(None),
+    sub_category: Optional[List[str]] = Form(None, description="Replaces the sub-categories when sent"),
+    main_image: Optional[UploadFile] = File(default=None, description="New main image"),
+    images: List[UploadFile] = File(default=[], description="Images appended to the gallery"),
+    keep_images: Optional[List[str]] = Form(None, description="Gallery urls to keep; the others are removed"),
+):
+    # Only what is sent is written; untouched child tables are not even read
+    fields = {"title": title, "price": price, "category": category, "height": height, "width": width, "depth": depth, "stock": stock}
+    fields = {k: v for k, v in fields.items() if v is not None}
+    return await _apply_update(id, fields, details, sub_category, main_image, images, keep_images)
 
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
-    
 @router.get('/category/{category}')
-def get_products_by_category(category: str):
+async def get_products_by_category(
+    category: str,
+    request: Request,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE, description="Page size"),
+    cursor: Optional[str] = Query(None, description="Cursor returned in X-Next-Cursor"),
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return"),
+    image_size: str = Query(DEFAULT_LIST_IMAGE_SIZE, description="original, thumb, card or full"),
+):
     try:
-        with engine.connect() as conn:
-            res = conn.execute(
-                text("SELECT * FROM Products WHERE category = :category"), {"category": category}
-            ).mappings().all()
-            if not res:
-                raise HTTPException(status_code=404, detail="No products found for this category.")
-            products = []
-            for row in res:
-                product_id = row["id"]
-                main = conn.execute(
-                    text("SELECT url FROM products_main_imgs WHERE product_id = :id"), {"id": product_id}
-                ).fetchone()
-                images = conn.execute(
-                    text("SELECT url FROM products_imgs WHERE product_id = :id"), {"id": product_id}
-                ).scalars().all()
-                details_list = conn.execute(
-                    text("SELECT detail_text FROM details WHERE product_id = :id"),
-                    {"id": product_id}
-                ).scalars().all()
-
-                sub_categorys = conn.execute(
-                    text("SELECT sub_category_name FROM sub_categorys WHERE product_id = :id"),
-                    {"id": product_id}
-                ).scalars().all()
-
-                product = dict(row)
-                product["main_image"] = main[0] if main else None
-                product["images"] = images
-                product["details_list"] = details_list
-                product["sub_categorys"] = sub_categorys
-                products.append(product)
-            return products
-
+        return await _read_page(
+            request, category=category, limit=limit, cursor=cursor, fields=fields, image_size=image_size
+        )
+
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get('/category/{category}/{id}')
-def getProductByIdInCategory(category: str, id: str):
+async def getProductByIdInCategory(category: str, id: str, request: Request):
     try:
-        with engine.connect() as conn:
-            res = conn.execute(
-                text("""
-                    SELECT * 
-                    FROM Products 
-                    WHERE category = :category AND id = :id
-                """),
-                {"category": category, "id": id}
-            ).mappings().first()
-
-            if not res:
-                raise HTTPException(status_code=404, detail="No product found for this category and id.")
-
-            product_id = res["id"]
-
-            main = conn.execute(
-                text("SELECT url FROM products_main_imgs WHERE product_id = :id"),
-                {"id": product_id}
-            ).fetchone()
-
-            images = conn.execute(
-                text("SELECT url FROM products_imgs WHERE product_id = :id"),
-                {"id": product_id}
-            ).scalars().all()
-
-            details_list = conn.execute(
-                text("SELECT detail_text FROM details WHERE product_id = :id"),
-                {"id": product_id}
-            ).scalars().all()
-
-            sub_categorys = conn.execute(
-                text("SELECT sub_category_name FROM sub_categorys WHERE product_id = :id"),
-                {"id": product_id}
-            ).scalars().all()
-
-            product = dict(res)
-            product["main_image"] = main[0] if main else None
-            product["images"] = images
-            product["details_list"] = details_list
-            product["sub_categorys"] = sub_categorys
-
-            return product
+        not_modified = await _revalidate(request)
+        if not_modified:
+            return not_modified
+        found = await read_flight.do(("product", id), _load_product, id)
+        if found is None or found[0] != category:
+            raise HTTPException(status_code=404, detail="No product found for this category and id.")
+
+        return _read_response(request, found[1], found[2], found[3])
 
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@router.delete('/products/{id}')
-def delete_product(id: str):
+def _product_documents(conn, ids, image_size, fresh=False):
+    """{id: (category, product JSON text)} for those of `ids` that exist.
+
+    `fresh` skips the catalog cache, which another worker may still hold stale.
+    """
+    documents = {}
+    if READ_MODEL and image_size in READ_MODEL_SIZES:
+        documents = get_product_documents(conn, ids, image_size)
+    remaining = [i for i in ids if i not in documents]
+    if not remaining:
+        products = {}
+    elif fresh:
+        products = fetch_products_by_ids(conn, remaining)
+    else:
+        products = get_cached_products(conn, remaining)
+    for product_id, product in products.items():
+        documents[product_id] = (product["category"], dumps(apply_image_size(product, image_size)).decode("utf-8"))
+    return documents
+
+def _lookup_batch(conn, refs, image_size):
+    """Resolve `refs` in request order with a fixed number of IN queries.
+
+    Returns the JSON body and the shared version it was read at.
+    """
+    version = catalog_cache.sync_shared_version(conn)
+    documents = _product_documents(conn, list(dict.fromkeys(ref.id for ref in refs)), image_size)
+
+    parts, missing = [], []
+    for ref in refs:
+        category, body = documents.get(ref.id, (None, None))
+        if body is None or (ref.category is not None and ref.category != category):
+            # Reported in place, with the message the single-product routes give
+            detail = "Product not found." if ref.category is None else "No product found for this category and id."
+            body = dumps({"id": ref.id, "category": ref.category, "detail": detail}).decode("utf-8")
+            missing.append(ref.id)
+        parts.append(body)
+    body = '{"items":[' + ",".join(parts) + '],"missing":' + dumps(missing).decode("utf-8") + "}"
+    return body, version
+
+async def _load_batch(refs, image_size):
+    body, version = await run_db(_lookup_batch, refs, image_size)
+    return (*_encode(body), version)
+
+@router.get('/batch')
+async def get_products_batch(
+    request: Request,
+    ids: List[str] = Query(..., description="Product ids, repeated or comma-separated"),
+    image_size: str = Query("original", description="original, thumb, card or full"),
+):
     try:
-        urls = []
-        with engine.connect() as conn:
-            urls += conn.execute(
-                text("SELECT url FROM products_imgs WHERE product_id = :id"),
-                {"id": id}
-            ).scalars().all()
-            main = conn.execute(
-                text("SELECT url FROM products_main_imgs WHERE product_id = :id"),
-                {"id": id}
-            ).fetchone()
-            if main:
-                urls.append(main[0])
-
-        for u in urls:
-            fn = u.split("/images/")[-1]
-            path = os.path.join(IMAGES_DIR, fn)
-            if os.path.exists(path):
-                os.remove(path)
-
-        with engine.begin() as conn:
-            conn.execute(
-                text("DELETE FROM details WHERE product_id = :id"),
-                {"id": id}
-            )
+        refs = [ProductRef(id=i.strip()) for value in ids for i in value.split(",") if i.strip()]
+        if not refs or len(refs) > MAX_BATCH_SIZE:
+            raise HTTPException(status_code=400, detail=f"Between 1 and {MAX_BATCH_SIZE} ids per request")
+        if image_size not in IMAGE_SIZES:
+            raise HTTPException(status_code=400, detail=f"Unknown image size: {image_size}")
+        not_modified = await _revalidate(request)
+        if not_modified:
+            return not_modified
+        key = ("batch", tuple(ref.id for ref in refs), image_size)
+        body, body_etag, version = await read_flight.do(key, _load_batch, refs, image_size)
+        return _read_response(request, body, body_etag, version)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
 
-            conn.execute(
-                text("DELETE FROM sub_categorys WHERE product_id = :id"),
-                {"id": id}
-            )
+@router.post('/batch')
+async def post_products_batch(lookup: BatchLookup, request: Request):
+    # Same lookup for carts that also pin each product to a category
+    try:
+        if lookup.image_size not in IMAGE_SIZES:
+            raise HTTPException(status_code=400, detail=f"Unknown image size: {lookup.image_size}")
+        refs = [ProductRef(id=item) if isinstance(item, str) else item for item in lookup.items]
+        body, _ = await run_db(_lookup_batch, refs, lookup.image_size)
+        return Response(body, media_type="application/json")
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
 
-            conn.execute(
-                text("DELETE FROM products_imgs WHERE product_id = :id"),
-                {"id": id}
+def _changes_page(conn, since, limit, image_size):
+    """One page of the change feed as JSON text; returns (body, entries, next since).
+
+    Upserts carry the product as it is now, read past the catalog cache so a
+    client never advances its cursor over a stale copy. Products gone by now
+    come out as tombstones.
+    """
+    changes, next_since, more = read_changes(conn, since, limit)
+    upserts = [c.product_id for c in changes if c.op == UPSERT]
+    documents = _product_documents(conn, upserts, image_size, fresh=True) if upserts else {}
+    parts = []
+    for change in changes:
+        document = documents.get(change.product_id) if change.op == UPSERT else None
+        if document is None:
+            parts.append(dumps({
+                "seq": change.seq, "op": DELETE, "id": change.product_id, "category": change.category,
+            }).decode("utf-8"))
+        else:
+            parts.append(
+                f'{{"seq":{change.seq},"op":"{UPSERT}","id":{dumps(change.product_id).decode("utf-8")},'
+                f'"product":{document[1]}}}'
             )
-            conn.execute(
-                text("DELETE FROM products_main_imgs WHERE product_id = :id"),
-                {"id": id}
+    body = (
+        '{"changes":[' + ",".join(parts) + f'],"next":{next_since},"more":{"true" if more else "false"}}}'
+    )
+    return body, len(parts), next_since
+
+async def _load_changes(since, limit, image_size):
+    return await run_db(_changes_page, since, limit, image_size)
+
+_CHANGES_GONE = "Changes after this point were pruned; reload the catalog and resume from /products/changes/head"
+
+@router.get('/changes/head')
+async def get_changes_head():
+    # Take this before downloading the full catalog, then poll /changes?since=<seq>
+    try:
+        return {"seq": await run_db(head)}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get('/changes')
+async def get_changes(
+    since: int = Query(0, ge=0, description="`next` of the previous page (0 for the whole log)"),
+    limit: int = Query(CHANGES_PAGE_SIZE, ge=1, le=CHANGES_PAGE_SIZE, description="Log entries per page"),
+    wait: float = Query(0, ge=0, le=CHANGES_MAX_WAIT, description="Seconds to wait for a change when there is none (long-poll)"),
+    image_size: str = Query("original", description="original, thumb, card or full"),
+):
+    try:
+        if image_size not in IMAGE_SIZES:
+            raise HTTPException(status_code=400, detail=f"Unknown image size: {image_size}")
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + wait
+        while True:
+            body, entries, _ = await read_flight.do(
+                ("changes", since, limit, image_size), _load_changes, since, limit, image_size
             )
+            remaining = deadline - loop.time()
+            if entries or remaining <= 0:
+                return Response(body, media_type="application/json", headers={"Cache-Control": "no-store"})
+            await change_notifier.wait(min(remaining, CHANGES_POLL_INTERVAL))
+    except ChangesGone:
+        raise HTTPException(status_code=410, detail=_CHANGES_GONE)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
 
-            result = conn.execute(
-                text("DELETE FROM Products WHERE id = :id"),
-                {"id": id}
+async def _change_events(since, image_size):
+    loop = asyncio.get_running_loop()
+    idle_since = loop.time()
+    while True:
+        try:
+            body, entries, next_since = await read_flight.do(
+                ("changes", since, CHANGES_PAGE_SIZE, image_size), _load_changes, since, CHANGES_PAGE_SIZE, image_size
             )
-            if result.rowcount == 0:
-                raise HTTPException(status_code=404, detail="Product not found.")
+        except ChangesGone:
+            yield f"event: gone\ndata: {dumps({'detail': _CHANGES_GONE}).decode('utf-8')}\n\n".encode("utf-8")
+            return
+        except Exception as e:
+            logger.exception("Change stream failed")
+            yield f"event: error\ndata: {dumps({'detail': str(e)}).decode('utf-8')}\n\n".encode("utf-8")
+            return
+        if entries:
+            # The id lets EventSource resume with Last-Event-ID after a reconnect
+            yield f"id: {next_since}\nevent: changes\ndata: {body}\n\n".encode("utf-8")
+            since = next_since
+            idle_since = loop.time()
+            continue
+        if loop.time() - idle_since >= CHANGES_KEEPALIVE:
+            yield b": keepalive\n\n"
+            idle_since = loop.time()
+        await change_notifier.wait(CHANGES_POLL_INTERVAL)
+
+@router.get('/changes/stream')
+async def stream_changes(
+    request: Request,
+    since: int = Query(0, ge=0, description="Last seq applied; Last-Event-ID takes precedence"),
+    image_size: str = Query("original", description="original, thumb, card or full"),
+):
+    # Server-sent events: one `changes` event per page, in the same format as /changes
+    if image_size not in IMAGE_SIZES:
+        raise HTTPException(status_code=400, detail=f"Unknown image size: {image_size}")
+    last_event_id = request.headers.get("last-event-id")
+    if last_event_id:
+        try:
+            since = int(last_event_id)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Last-Event-ID must be a change sequence number")
+    return StreamingResponse(
+        _change_events(since, image_size),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-store", "X-Accel-Buffering": "no"},
+    )
+
+def _delete_product(conn, id):
+    """Delete the product and its rows in one transaction; returns its category.
+
+    Image files are not touched here: the image GC removes them once no other
+    product references them, so a failed delete never leaves broken rows.
+    """
+    old_category = conn.execute(
+        text("SELECT category FROM Products WHERE id = :id"), {"id": id}
+    ).scalar()
+    if old_category is None:
+        raise HTTPException(status_code=404, detail="Product not found.")
+
+    conn.execute(
+        text("DELETE FROM details WHERE product_id = :id"),
+        {"id": id}
+    )
+
+    conn.execute(
+        text("DELETE FROM sub_categorys WHERE product_id = :id"),
+        {"id": id}
+    )
+
+    conn.execute(
+        text("DELETE FROM products_imgs WHERE product_id = :id"),
+        {"id": id}
+    )
+    conn.execute(
+        text("DELETE FROM products_main_imgs WHERE product_id = :id"),
+        {"id": id}
+    )
+    conn.execute(
+        text("DELETE FROM products_img_variants WHERE product_id = :id"),
+        {"id": id}
+    )
+
+    conn.execute(
+        text("DELETE FROM Products WHERE id = :id"),
+        {"id": id}
+    )
+
+    record_changes(conn, DELETE, [(id, old_category)])
+    refresh_documents(conn, [id], [old_category])
+    bump_shared_version(conn)
+    return old_category
+
+@router.delete('/products/{id}')
+async def delete_product(id: str):
+    try:
+        old_category = await run_db(_delete_product, id, write=True)
+
+        image_gc.wake()
+        await _after_write([id], [old_category], deleted=True)
 
         return {"message": "Product, details and associated images deleted successfully"}
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+def _import_chunk(conn, products):
+    ids = insert_products(conn, products)
+    record_changes(conn, UPSERT, zip(ids, [p.category for p in products]))
+    # Category blobs are rebuilt once the whole import is done
+    refresh_documents(conn, ids, rebuild_categories=False)
+    bump_shared_version(conn)
+    return ids
+
+@router.post('/bulk/import')
+async def bulk_import(file: UploadFile = File(..., description="CSV or NDJSON catalog")):
+    fmt = detect_format(file.filename, file.content_type)
+    if fmt is None:
+        raise HTTPException(status_code=415, detail="Expected a .csv or .ndjson file")
+    rows = iter_rows(file.file, fmt)
+
+    # One NDJSON progress line per chunk, then a summary line
+    async def progress():
+        processed = inserted = failed = 0
+        categories = set()
+        while True:
+            chunk = await run_in_threadpool(next_chunk, rows)
+            if not chunk:
+                break
+            valid, errors = await run_in_threadpool(validate_chunk, chunk)
+            if valid:
+                try:
+                    ids = await run_db(_import_chunk, valid, write=True)
+                    await _after_write(ids, [p.category for p in valid])
+                    categories.update(p.category for p in valid)
+                    inserted += len(ids)
+                except Exception as e:
+                    errors.append({
+                        "rows": [chunk[0][0], chunk[-1][0]],
+                        "error": f"Database error, chunk rolled back: {str(e)}",
+                    })
+                    failed += len(valid)
+            processed += len(chunk)
+            failed += len(chunk) - len(valid)
+            yield json.dumps({
+                "processed": processed, "inserted": inserted, "failed": failed, "errors": errors
+            }, ensure_ascii=False) + "\n"
+        if READ_MODEL and categories:
+            try:
+                await run_db(refresh_category_documents, categories, write=True)
+            except Exception:
+                logger.exception("Could not rebuild the category documents; run the read model rebuild")
+        yield json.dumps({"done": True, "processed": processed, "inserted": inserted, "failed": failed}) + "\n"
+
+    return StreamingResponse(progress(), media_type="application/x-ndjson")
+
+@router.get('/bulk/export')
+async def bulk_export():
+    # Keyset pages through the catalog so only one page is in memory at a time
+    async def lines():
+        cursor = None
+        while True:
+            products, cursor = await run_db(list_product_page, limit=BULK_EXPORT_PAGE_SIZE, cursor=cursor)
+            if products:
+                yield b"".join(dumps(p) + b"\n" for p in products)
+            if not cursor:
+                break
+
+    return StreamingResponse(
+        lines(),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": 'attachment; filename="catalog.ndjson"'},
+    )
+
+@router.get('/search')
+async def search_products(
+    q: str = Query(..., min_length=1, description="Words to look for; the last one may be a prefix"),
+    limit: int = Query(20, ge=1, le=MAX_PAGE_SIZE),
+    prefix: bool = Query(True, description="Match the last word as a prefix (autocomplete)"),
+    image_size: str = Query(DEFAULT_LIST_IMAGE_SIZE, description="original, thumb, card or full"),
+):
+    try:
+        if image_size not in IMAGE_SIZES:
+            raise HTTPException(status_code=400, detail=f"Unknown image size: {image_size}")
+        if CATALOG_CACHE_SHARED:
+            await run_db(catalog_cache.sync_shared_version)
+        await _refresh_indexes()
+
+        hits = search_index.search(q, limit=limit, prefix=prefix)
+        products = await run_db(get_cached_products, [pid for pid, _ in hits]) if hits else {}
+        return CatalogJSONResponse([
+            {**apply_image_size(products[pid], image_size), "score": round(score, 4)}
+            for pid, score in hits if pid in products
+        ])
+
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+@router.get('/filter')
+async def filter_products(
+    category: Optional[str] = Query(None),
+    sub_category: Optional[List[str]] = Query(None, description="Repeat to match any of several"),
+    min_price: Optional[float] = Query(None, ge=0),
+    max_price: Optional[float] = Query(None, ge=0),
+    in_stock: Optional[bool] = Query(None),
+    min_height: Optional[float] = Query(None),
+    max_height: Optional[float] = Query(None),
+    min_width: Optional[float] = Query(None),
+    max_width: Optional[float] = Query(None),
+    min_depth: Optional[float] = Query(None),
+    max_depth: Optional[float] = Query(None),
+    sort: str = Query("id", description=", ".join(SORT_KEYS)),
+    limit: int = Query(24, ge=1, le=MAX_PAGE_SIZE),
+    offset: int = Query(0, ge=0),
+    image_size: str = Query(DEFAULT_LIST_IMAGE_SIZE, description="original, thumb, card or full"),
+):
+    try:
+        if image_size not in IMAGE_SIZES:
+            raise HTTPException(status_code=400, detail=f"Unknown image size: {image_size}")
+        if CATALOG_CACHE_SHARED:
+            await run_db(catalog_cache.sync_shared_version)
+        await _refresh_indexes()
+
+        ranges = {
+            "height": (min_height, max_height),
+            "width": (min_width, max_width),
+            "depth": (min_depth, max_depth),
+        }
+        ids, total, facets = facet_index.filter(
+            category=category,
+            sub_categories=normalize_items(sub_category),
+            min_price=min_price,
+            max_price=max_price,
+            in_stock=in_stock,
+            dimensions={k: v for k, v in ranges.items() if v != (None, None)},
+            sort=sort,
+            limit=limit,
+            offset=offset,
+        )
+        products = await run_db(get_cached_products, ids) if ids else {}
+        next_offset = offset + limit if offset + limit < total else None
+        return CatalogJSONResponse({
+            "total": total,
+            "next_offset": next_offset,
+            "items": [apply_image_size(products[pid], image_size) for pid in ids if pid in products],
+            "facets": facets,
+        })
+
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get('/cache/stats')
+def get_cache_stats():
+    return catalog_cache.stats()
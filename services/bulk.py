@@ -0,0 +1,150 @@
+import csv
+import io
+import json
+import os
+import uuid
+
+from dotenv import load_dotenv
+from pydantic import ValidationError
+from sqlalchemy import text
+
+from models.product import ProductCreate
+
+load_dotenv()
+
+# Rows validated and written per transaction
+BULK_IMPORT_CHUNK_SIZE = int(os.getenv("BULK_IMPORT_CHUNK_SIZE") or "1000")
+BULK_EXPORT_PAGE_SIZE = int(os.getenv("BULK_EXPORT_PAGE_SIZE") or "500")
+
+IMPORT_FORMATS = ("csv", "ndjson")
+
+
+def normalize_items(values):
+    # Form lists and CSV cells may hold one comma-separated string
+    if isinstance(values, str):
+        values = [values]
+    normalized = []
+    for d in values or []:
+        if isinstance(d, str) and "," in d:
+            normalized.extend([item.strip() for item in d.split(",") if item.strip()])
+        elif d:
+            normalized.append(d.strip())
+    return normalized
+
+
+def detect_format(filename, content_type):
+    name = (filename or "").lower()
+    if name.endswith((".ndjson", ".jsonl")) or "ndjson" in (content_type or ""):
+        return "ndjson"
+    if name.endswith(".csv") or "csv" in (content_type or ""):
+        return "csv"
+    return None
+
+
+def iter_rows(fileobj, fmt):
+    """Yield (row number, raw dict) from a CSV or NDJSON file without reading it all."""
+    stream = io.TextIOWrapper(fileobj, encoding="utf-8-sig", newline="")
+    try:
+        if fmt == "csv":
+            reader = csv.DictReader(stream)
+            for number, row in enumerate(reader, start=2):
+                yield number, row
+        else:
+            for number, line in enumerate(stream, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    row = json.loads(line)
+                except ValueError as e:
+                    yield number, e
+                    continue
+                yield number, row if isinstance(row, dict) else ValueError("Expected a JSON object")
+    finally:
+        stream.detach()
+
+
+def next_chunk(rows, size=BULK_IMPORT_CHUNK_SIZE):
+    chunk = []
+    for item in rows:
+        chunk.append(item)
+        if len(chunk) >= size:
+            break
+    return chunk
+
+
+def validate_row(raw):
+    """ProductCreate for one raw row; CSV cells are strings, so blanks mean missing."""
+    if isinstance(raw, Exception):
+        raise raw
+    data = {k.strip(): (v.strip() if isinstance(v, str) else v) for k, v in raw.items() if k}
+    data = {k: v for k, v in data.items() if v not in ("", None)}
+    if isinstance(data.get("sub_category"), list):
+        data["sub_category"] = ",".join(data["sub_category"])
+    data["details"] = normalize_items(data.get("details"))
+    data.setdefault("sub_category", "")
+    return ProductCreate(**data)
+
+
+def validate_chunk(chunk):
+    valid = []
+    errors = []
+    for number, raw in chunk:
+        try:
+            valid.append(validate_row(raw))
+        except ValidationError as e:
+            detail = "; ".join(f"{'.'.join(str(p) for p in err['loc'])}: {err['msg']}" for err in e.errors())
+            errors.append({"row": number, "error": detail})
+        except Exception as e:
+            errors.append({"row": number, "error": str(e)})
+    return valid, errors
+
+
+def insert_products(conn, products):
+    """Insert validated products with one executemany per table. Returns the new ids."""
+    product_rows, detail_rows, sub_category_rows = [], [], []
+    for product in products:
+        product_id = str(uuid.uuid4())
+        product_rows.append({
+            "id": product_id,
+            "title": product.title,
+            "price": product.price,
+            "category": product.category,
+            "height": product.height,
+            "width": product.width,
+            "depth": product.depth,
+            "stock": product.stock,
+        })
+        detail_rows += [
+            {"id": str(uuid.uuid4()), "product_id": product_id, "detail_text": d}
+            for d in normalize_items(product.details)
+        ]
+        sub_category_rows += [
+            {"id": str(uuid.uuid4()), "product_id": product_id, "sub_category_name": d}
+            for d in normalize_items(product.sub_category)
+        ]
+
+    if product_rows:
+        conn.execute(
+            text("""
+                INSERT INTO Products (id, title, price, category, height, width, depth, stock)
+                VALUES (:id, :title, :price, :category, :height, :width, :depth, :stock)
+            """),
+            product_rows
+        )
+    if detail_rows:
+        conn.execute(
+            text("""
+                INSERT INTO details (id, product_id, detail_text)
+                VALUES (:id, :product_id, :detail_text)
+            """),
+            detail_rows
+        )
+    if sub_category_rows:
+        conn.execute(
+            text("""
+                INSERT INTO sub_categorys (id, product_id, sub_category_name)
+                VALUES (:id, :product_id, :sub_category_name)
+            """),
+            sub_category_rows
+        )
+    return [row["id"] for row in product_rows]
@@ -0,0 +1,271 @@
+import os
+import threading
+import time
+from bisect import bisect_right
+from collections import OrderedDict
+
+from dotenv import load_dotenv
+from sqlalchemy import text
+
+from services.change_feed import changed_products, head
+from services.hydration import (
+    fetch_products_by_ids, list_product_page, parse_fields, decode_cursor, encode_cursor
+)
+
+load_dotenv()
+
+CATALOG_CACHE_TTL = float(os.getenv("CATALOG_CACHE_TTL") or "300")
+CATALOG_CACHE_MAX_ENTRIES = int(os.getenv("CATALOG_CACHE_MAX_ENTRIES") or "20000")
+# Share invalidation between uvicorn workers through the catalog_version table
+CATALOG_CACHE_SHARED = os.getenv("CATALOG_CACHE_SHARED", "0") == "1"
+# Minimum seconds between two reads of the shared version stamp (0 = every request)
+CATALOG_CACHE_VERSION_CHECK = float(os.getenv("CATALOG_CACHE_VERSION_CHECK") or "0")
+# Change-log rows one sync drops entries for; past that the whole cache goes
+CATALOG_CACHE_SYNC_MAX_CHANGES = int(os.getenv("CATALOG_CACHE_SYNC_MAX_CHANGES") or "1000")
+# Load the whole catalog into the cache at startup
+CATALOG_PRELOAD = os.getenv("CATALOG_PRELOAD", "1") == "1"
+PRELOAD_PAGE_SIZE = 1000
+
+_MISSING = object()
+
+
+class CatalogCache:
+    """TTL + LRU cache of hydrated products and per-category id lists."""
+
+    def __init__(self, ttl=CATALOG_CACHE_TTL, max_entries=CATALOG_CACHE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.version = 0
+        self.shared_version = None
+        # Last change-log row whose product this worker has dropped
+        self.change_seq = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._listeners = []
+        self._last_version_check = 0.0
+
+    @property
+    def enabled(self):
+        return self.ttl > 0 and self.max_entries > 0
+
+    def get(self, key, default=None):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key, _MISSING)
+            if entry is _MISSING or entry[0] < now:
+                if entry is not _MISSING:
+                    del self._entries[key]
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, value, version=None):
+        # Results loaded before an invalidation must not be stored after it
+        with self._lock:
+            if version is not None and version != self.version:
+                return
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, *keys, changed=None):
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+            self.version += 1
+            self.invalidations += 1
+        self._notify(keys, changed)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.version += 1
+            self.invalidations += 1
+        self._notify(None, None)
+
+    def add_listener(self, callback):
+        """Register `callback(keys, changed)`.
+
+        keys is None when the whole cache was dropped; `changed` lists the
+        product ids another worker wrote (None for this worker's own invalidations).
+        """
+        self._listeners.append(callback)
+
+    def _notify(self, keys, changed):
+        for callback in self._listeners:
+            callback(keys, changed)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "shared": CATALOG_CACHE_SHARED,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl": self.ttl,
+                "version": self.version,
+                "shared_version": self.shared_version,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+            }
+
+    def sync_shared_version(self, conn):
+        """Drop what other workers wrote once they bumped the version stamp in the database.
+
+        Returns the version the reads that follow see (None unless CATALOG_CACHE_SHARED=1).
+        """
+        if not CATALOG_CACHE_SHARED:
+            return None
+        now = time.monotonic()
+        if CATALOG_CACHE_VERSION_CHECK and now - self._last_version_check < CATALOG_CACHE_VERSION_CHECK:
+            return self.shared_version
+        self._last_version_check = now
+        current = conn.execute(text("SELECT version FROM catalog_version WHERE id = 1")).scalar()
+        if current != self.shared_version:
+            if self.shared_version is None:
+                self.change_seq = head(conn)
+            else:
+                self._drop_changed(conn)
+            self.shared_version = current
+        return current
+
+    def _drop_changed(self, conn):
+        """Drop the products logged since the last sync; everything when the log cannot tell."""
+        changes = None
+        if self.change_seq is not None:
+            changes = changed_products(conn, self.change_seq, CATALOG_CACHE_SYNC_MAX_CHANGES)
+        if changes is None:
+            self.change_seq = head(conn)
+            self.clear()
+            return
+        rows, self.change_seq = changes
+        if not rows:
+            # Logged before the stamp moved and dropped on an earlier sync
+            return
+        changed = list(dict.fromkeys(product_id for product_id, _ in rows))
+        with self._lock:
+            # Every id list: the log has the new category only, not the one a product left.
+            # They are one query each to load again, unlike the hydrated products.
+            keys = [key for key in self._entries if key[0] == "ids"]
+        keys += [product_key(product_id) for product_id in changed]
+        self.invalidate(*keys, changed=changed)
+
+
+catalog_cache = CatalogCache()
+
+
+def product_key(product_id):
+    return ("product", product_id)
+
+
+def category_key(category):
+    return ("ids", category)
+
+
+def bump_shared_version(conn):
+    """Called inside write transactions so the other workers notice the change."""
+    if CATALOG_CACHE_SHARED:
+        conn.execute(text("UPDATE catalog_version SET version = version + 1 WHERE id = 1"))
+
+
+def invalidate_products(product_ids, categories):
+    """Drop the products and the id lists they appear in (the full list and their categories)."""
+    keys = [product_key(i) for i in product_ids] + [category_key(None)]
+    keys += [category_key(c) for c in set(categories) if c is not None]
+    catalog_cache.invalidate(*keys)
+
+
+def get_cached_products(conn, ids):
+    """Hydrated products for `ids` as a dict, loading only the cache misses from the database."""
+    if not catalog_cache.enabled:
+        return fetch_products_by_ids(conn, ids)
+    version = catalog_cache.version
+    found = {}
+    missing = []
+    for product_id in ids:
+        product = catalog_cache.get(product_key(product_id))
+        if product is None:
+            missing.append(product_id)
+        else:
+            found[product_id] = product
+    if missing:
+        loaded = fetch_products_by_ids(conn, missing)
+        for product_id, product in loaded.items():
+            catalog_cache.put(product_key(product_id), product, version)
+        found.update(loaded)
+    return found
+
+
+def get_product_ids(conn, category=None):
+    """Sorted ids of the whole catalog or of one category."""
+    key = category_key(category)
+    ids = catalog_cache.get(key) if catalog_cache.enabled else None
+    if ids is None:
+        version = catalog_cache.version
+        if category is None:
+            result = conn.execute(text("SELECT id FROM Products ORDER BY id"))
+        else:
+            result = conn.execute(
+                text("SELECT id FROM Products WHERE category = :category ORDER BY id"),
+                {"category": category}
+            )
+        ids = result.scalars().all()
+        if catalog_cache.enabled:
+            catalog_cache.put(key, ids, version)
+    return ids
+
+
+def list_cached_page(conn, category=None, limit=None, cursor=None, fields=None):
+    """Cached counterpart of hydration.list_product_page with the same result shape."""
+    columns, children = parse_fields(fields)
+    ids = get_product_ids(conn, category)
+    start = bisect_right(ids, decode_cursor(cursor)) if cursor else 0
+    end = len(ids) if limit is None else start + limit
+    page_ids = ids[start:end]
+    next_cursor = encode_cursor(page_ids[-1]) if page_ids and end < len(ids) else None
+
+    products = get_cached_products(conn, page_ids)
+    page = [products[i] for i in page_ids if i in products]
+    if columns is not None:
+        keep = columns + children
+        page = [{k: p[k] for k in keep if k in p} for p in page]
+    return page, next_cursor
+
+
+def preload_catalog(conn):
+    """Read the whole catalog once and cache its products and id lists; returns the products.
+
+    Only as many products as the cache holds (next to the id lists) are kept.
+    """
+    version = catalog_cache.version
+    products, cursor = [], None
+    while True:
+        page, cursor = list_product_page(conn, limit=PRELOAD_PAGE_SIZE, cursor=cursor)
+        products.extend(page)
+        if not cursor:
+            break
+    if not catalog_cache.enabled:
+        return products
+
+    by_category = {}
+    for product in products:
+        by_category.setdefault(product["category"], []).append(product["id"])
+    catalog_cache.put(category_key(None), [p["id"] for p in products], version)
+    for category, ids in by_category.items():
+        catalog_cache.put(category_key(category), ids, version)
+    room = max(catalog_cache.max_entries - len(by_category) - 1, 0)
+    for product in products[:room]:
+        catalog_cache.put(product_key(product["id"]), product, version)
+    return products
@@ -0,0 +1,159 @@
+"""Append-only log of catalog writes, read by GET /products/changes.
+
+Every create, update, delete and import appends one row per product in the
+same transaction as the write. Sequence numbers come from a counter row that
+the transaction keeps locked until it commits, so they become visible in
+order and a client that has seen `seq` never misses a lower one later.
+
+    python -m services.change_feed prune --keep-days 30
+"""
+import argparse
+import asyncio
+import os
+from datetime import datetime, timedelta, timezone
+
+from dotenv import load_dotenv
+from sqlalchemy import text
+
+load_dotenv()
+
+# Longest a long-poll or stream waits between two reads of the log; also how
+# soon writes made by other workers are noticed
+CHANGES_POLL_INTERVAL = float(os.getenv("CHANGES_POLL_INTERVAL") or "2")
+CHANGES_MAX_WAIT = float(os.getenv("CHANGES_MAX_WAIT") or "30")
+CHANGES_PAGE_SIZE = int(os.getenv("CHANGES_PAGE_SIZE") or "500")
+# Seconds between keep-alive comments on idle event streams
+CHANGES_KEEPALIVE = float(os.getenv("CHANGES_KEEPALIVE") or "15")
+
+UPSERT = "upsert"
+DELETE = "delete"
+
+
+class ChangesGone(Exception):
+    """The changes after `since` were pruned; the client has to download the catalog again."""
+
+
+def record_changes(conn, op, products):
+    """Append `op` for each (product_id, category) in `products`; returns the last sequence number."""
+    products = list(products)
+    if not products:
+        return None
+    # The UPDATE locks the counter row until commit, which keeps sequence numbers in commit order
+    conn.execute(
+        text("UPDATE catalog_change_seq SET seq = seq + :n WHERE id = 1"), {"n": len(products)}
+    )
+    last = conn.execute(text("SELECT seq FROM catalog_change_seq WHERE id = 1")).scalar()
+    first = last - len(products) + 1
+    conn.execute(
+        text("""
+            INSERT INTO catalog_changes (seq, product_id, category, op, changed_at)
+            VALUES (:seq, :product_id, :category, :op, :changed_at)
+        """),
+        [
+            {
+                "seq": first + i,
+                "product_id": product_id,
+                "category": category,
+                "op": op,
+                "changed_at": datetime.now(timezone.utc).replace(tzinfo=None),
+            }
+            for i, (product_id, category) in enumerate(products)
+        ],
+    )
+    return last
+
+
+def head(conn):
+    """Sequence number of the last recorded change (0 before any)."""
+    return conn.execute(text("SELECT seq FROM catalog_change_seq WHERE id = 1")).scalar() or 0
+
+
+def read_changes(conn, since, limit=CHANGES_PAGE_SIZE):
+    """Changes after `since`, oldest first, at most `limit` log rows.
+
+    Returns (changes, next_since, more). Each product appears once, with its
+    latest change in the page: the product itself is read at its current
+    state, so earlier entries would add nothing. Raises ChangesGone when
+    rows after `since` have been pruned.
+    """
+    rows = conn.execute(
+        text("""
+            SELECT seq, product_id, category, op FROM catalog_changes
+            WHERE seq > :since ORDER BY seq LIMIT :limit
+        """),
+        {"since": since, "limit": limit},
+    ).all()
+    if not rows or rows[0].seq != since + 1:
+        oldest = conn.execute(text("SELECT MIN(seq) FROM catalog_changes")).scalar()
+        if (oldest is None and since < head(conn)) or (oldest is not None and since < oldest - 1):
+            raise ChangesGone(since)
+    latest = {}
+    for row in rows:
+        latest.pop(row.product_id, None)
+        latest[row.product_id] = row
+    next_since = rows[-1].seq if rows else since
+    return list(latest.values()), next_since, len(rows) == limit
+
+
+def changed_products(conn, since, limit):
+    """(product_id, category) of the log rows after `since`, and the last seq read.
+
+    Returns None when more than `limit` rows follow `since` or some were pruned:
+    the caller cannot tell what changed and has to assume everything did.
+    """
+    rows = conn.execute(
+        text("SELECT seq, product_id, category FROM catalog_changes WHERE seq > :since ORDER BY seq LIMIT :limit"),
+        {"since": since, "limit": limit + 1},
+    ).all()
+    if len(rows) > limit or (rows and rows[0].seq != since + 1) or (not rows and since != head(conn)):
+        return None
+    return [(row.product_id, row.category) for row in rows], (rows[-1].seq if rows else since)
+
+
+def prune(conn, before):
+    """Delete log rows written before `before` (naive UTC); returns how many went."""
+    return conn.execute(
+        text("DELETE FROM catalog_changes WHERE changed_at < :before"), {"before": before}
+    ).rowcount
+
+
+class ChangeNotifier:
+    """Wakes long-polls and streams of this worker as soon as it commits a write."""
+
+    def __init__(self):
+        self._event = None
+
+    def notify(self):
+        if self._event is not None:
+            self._event.set()
+            self._event = None
+
+    async def wait(self, timeout):
+        """Wait for a local write, or `timeout` seconds (writes of other workers are polled)."""
+        if self._event is None:
+            self._event = asyncio.Event()
+        try:
+            await asyncio.wait_for(self._event.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+
+change_notifier = ChangeNotifier()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Maintain the catalog change log.")
+    parser.add_argument("command", choices=["prune"])
+    parser.add_argument("--keep-days", type=float, required=True, help="Clients behind the pruned rows get 410")
+    args = parser.parse_args()
+
+    from Database.dbGetConnection import engine
+
+    before = datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(days=args.keep_days)
+    with engine.begin() as conn:
+        removed = prune(conn, before)
+    print(f"Removed {removed} change log rows older than {before:%Y-%m-%d %H:%M} UTC")
+
+
+if __name__ == "__main__":
+    main()
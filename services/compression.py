@@ -0,0 +1,225 @@
+import gzip
+import os
+import threading
+import zlib
+from collections import OrderedDict
+
+from dotenv import load_dotenv
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import Headers, MutableHeaders
+
+try:
+    import brotli
+except ImportError:  # Brotli is optional; without it only gzip is offered
+    brotli = None
+
+load_dotenv()
+
+COMPRESSION = os.getenv("COMPRESSION", "1") == "1"
+# Bodies smaller than this go out as they are
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE") or "1024")
+COMPRESSION_GZIP_LEVEL = int(os.getenv("COMPRESSION_GZIP_LEVEL") or "6")
+COMPRESSION_BROTLI_QUALITY = int(os.getenv("COMPRESSION_BROTLI_QUALITY") or "4")
+# Compressed bodies kept per ETag so repeated list responses are compressed once (0 disables)
+COMPRESSION_CACHE_MAX_BYTES = int(os.getenv("COMPRESSION_CACHE_MAX_BYTES") or str(64 * 1024 * 1024))
+
+COMPRESSIBLE_TYPES = (
+    "application/json", "application/x-ndjson", "application/javascript", "application/xml",
+    "image/svg+xml", "text/",
+)
+# Larger bodies are compressed in the threadpool instead of on the event loop
+THREADPOOL_THRESHOLD = 64 * 1024
+
+
+def supported_encodings():
+    return ("br", "gzip") if brotli is not None else ("gzip",)
+
+
+def choose_encoding(accept_encoding):
+    """The preferred encoding we support from an Accept-Encoding header, or None."""
+    if not accept_encoding:
+        return None
+    weights = {}
+    for item in accept_encoding.split(","):
+        name, _, params = item.strip().partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        weights[name.strip().lower()] = q
+    best, best_q = None, 0.0
+    for encoding in supported_encodings():
+        q = weights.get(encoding, weights.get("*", 0.0))
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+
+def compress(body, encoding):
+    if encoding == "br":
+        return brotli.compress(body, quality=COMPRESSION_BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=COMPRESSION_GZIP_LEVEL, mtime=0)
+
+
+class StreamCompressor:
+    """Incremental compressor for streamed bodies; every chunk is flushed so it reaches the client."""
+
+    def __init__(self, encoding):
+        if encoding == "br":
+            self._brotli = brotli.Compressor(quality=COMPRESSION_BROTLI_QUALITY)
+            self._zlib = None
+        else:
+            self._brotli = None
+            self._zlib = zlib.compressobj(COMPRESSION_GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def chunk(self, data, last=False):
+        if self._brotli is not None:
+            out = self._brotli.process(data)
+            return out + (self._brotli.finish() if last else self._brotli.flush())
+        out = self._zlib.compress(data)
+        return out + self._zlib.flush(zlib.Z_FINISH if last else zlib.Z_SYNC_FLUSH)
+
+
+class CompressedCache:
+    """LRU of compressed bodies keyed by (ETag, encoding, size), bounded in bytes."""
+
+    def __init__(self, max_bytes=COMPRESSION_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            body = self._entries.get(key)
+            if body is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return body
+
+    def put(self, key, body):
+        if len(body) > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                return
+            self._entries[key] = body
+            self.size += len(body)
+            while self.size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.size -= len(evicted)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self.size,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+compressed_cache = CompressedCache()
+
+
+def _compressible(headers):
+    if "content-encoding" in headers:
+        return False
+    content_type = headers.get("content-type", "")
+    return any(content_type.startswith(t) for t in COMPRESSIBLE_TYPES)
+
+
+class CompressionMiddleware:
+    """Brotli/gzip negotiation for JSON and text responses.
+
+    Plain ASGI like MetricsMiddleware: complete bodies are compressed in one
+    go (and cached when they carry an ETag), streamed bodies chunk by chunk.
+    Images and other binary responses pass through untouched.
+    """
+
+    def __init__(self, app, minimum_size=COMPRESSION_MIN_SIZE, cache=compressed_cache):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.cache = cache
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not COMPRESSION or scope["method"] == "HEAD":
+            await self.app(scope, receive, send)
+            return
+        encoding = choose_encoding(Headers(scope=scope).get("accept-encoding"))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start = None
+        passthrough = False
+        stream = None
+
+        async def compressing_send(message):
+            nonlocal start, passthrough, stream
+            kind = message["type"]
+            if passthrough or kind not in ("http.response.start", "http.response.body"):
+                if start is not None and not passthrough:
+                    await send(start)
+                    passthrough = True
+                await send(message)
+                return
+
+            if kind == "http.response.start":
+                headers = Headers(raw=message.get("headers", []))
+                if message["status"] in (204, 206, 304) or not _compressible(headers):
+                    passthrough = True
+                    await send(message)
+                else:
+                    start = message
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            if stream is not None:
+                await send({"type": kind, "body": stream.chunk(body, last=not more_body), "more_body": more_body})
+                return
+
+            headers = MutableHeaders(raw=list(start.get("headers", [])))
+            if not more_body and len(body) < self.minimum_size:
+                passthrough = True
+                await send(start)
+                await send(message)
+                return
+
+            headers["Content-Encoding"] = encoding
+            headers.add_vary_header("Accept-Encoding")
+            etag = headers.get("etag")
+            if etag and not etag.startswith("W/"):
+                # The compressed bytes differ from the identity ones
+                headers["ETag"] = f"W/{etag}"
+            if more_body:
+                del headers["Content-Length"]
+                stream = StreamCompressor(encoding)
+                await send({**start, "headers": headers.raw})
+                await send({"type": kind, "body": stream.chunk(body), "more_body": True})
+                return
+
+            key = (etag, encoding, len(body)) if etag and self.cache.max_bytes else None
+            compressed = self.cache.get(key) if key else None
+            if compressed is None:
+                if len(body) > THREADPOOL_THRESHOLD:
+                    compressed = await run_in_threadpool(compress, body, encoding)
+                else:
+                    compressed = compress(body, encoding)
+                if key:
+                    self.cache.put(key, compressed)
+            headers["Content-Length"] = str(len(compressed))
+            passthrough = True
+            await send({**start, "headers": headers.raw})
+            await send({"type": kind, "body": compressed, "more_body": False})
+
+        await self.app(scope, receive, compressing_send)
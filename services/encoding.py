@@ -0,0 +1,37 @@
+import json
+from decimal import Decimal
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:  # orjson is optional; without it the stdlib encoder is used
+    orjson = None
+
+
+def _default(obj):
+    # Types orjson does not handle natively, converted the way jsonable_encoder does
+    if isinstance(obj, Decimal):
+        return int(obj) if obj.as_tuple().exponent >= 0 else float(obj)
+    return jsonable_encoder(obj)
+
+
+def dumps(content):
+    """Compact UTF-8 JSON bytes, equivalent to what JSONResponse gives for plain data."""
+    if orjson is not None:
+        return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(
+        jsonable_encoder(content), ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")
+    ).encode("utf-8")
+
+
+class CatalogJSONResponse(JSONResponse):
+    """JSONResponse encoded with orjson.
+
+    Content handed to it directly skips jsonable_encoder, which is most of the
+    cost of serializing a large product list.
+    """
+
+    def render(self, content):
+        return dumps(content)
@@ -0,0 +1,309 @@
+import os
+import threading
+from bisect import bisect_left, bisect_right, insort
+
+from dotenv import load_dotenv
+
+from services.search_index import fold
+
+load_dotenv()
+
+# Upper bounds of the price facet buckets; the last bucket is open-ended
+PRICE_BUCKET_BOUNDS = [
+    float(b) for b in (os.getenv("FACET_PRICE_BUCKETS") or "5000,10000,25000,50000,100000").split(",")
+]
+SORT_KEYS = ("id", "price_asc", "price_desc", "title_asc", "title_desc")
+# Entries of a sorted order covered by each cached prefix bitmap
+RANGE_BLOCK = 1024
+DIMENSIONS = ("height", "width", "depth")
+
+
+def _bucket_labels(bounds):
+    labels = []
+    low = 0.0
+    for high in bounds:
+        labels.append((f"{low:g}-{high:g}", low, high))
+        low = high
+    labels.append((f"{low:g}+", low, None))
+    return labels
+
+
+PRICE_BUCKETS = _bucket_labels(PRICE_BUCKET_BOUNDS)
+
+
+def _price_bucket(price):
+    return bisect_right(PRICE_BUCKET_BOUNDS, price)
+
+
+def _bitmap(ordinals, size):
+    """Bitmap int with the given bit positions set, built through a bytearray."""
+    buf = bytearray((size >> 3) + 1)
+    for o in ordinals:
+        buf[o >> 3] |= 1 << (o & 7)
+    return int.from_bytes(buf, "little")
+
+
+def _ordinals(bitmap):
+    ordinals = []
+    buf = bitmap.to_bytes((bitmap.bit_length() >> 3) + 1, "little")
+    for i, byte in enumerate(buf):
+        while byte:
+            low = byte & -byte
+            ordinals.append((i << 3) + low.bit_length() - 1)
+            byte ^= low
+    return ordinals
+
+
+class FacetIndex:
+    """Per-facet bitmaps over the catalog for filtering and facet counts.
+
+    Every product gets a small integer ordinal; each category, sub-category,
+    price bucket and the in-stock flag keep an int whose set bits are the
+    ordinals of the matching products, so combining filters is an `&` and a
+    facet count is `bit_count()`. Sort orders are kept as sorted lists.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._reset()
+        self.ready = False
+        self.stale = False
+
+    def _reset(self):
+        self._ordinal = {}
+        self._ids = []
+        self._docs = {}
+        self._all = 0
+        self._in_stock = 0
+        self._categories = {}
+        self._sub_categories = {}
+        self._price_buckets = [0] * len(PRICE_BUCKETS)
+        self._orders = {name: [] for name in ("id", "price", "title", *DIMENSIONS)}
+        self._prefix_cache = {}
+
+    def __len__(self):
+        return len(self._docs)
+
+    @staticmethod
+    def _doc(product):
+        return {
+            "id": product["id"],
+            "price": float(product.get("price") or 0),
+            "title": fold(product.get("title") or ""),
+            "category": product.get("category"),
+            "sub_categorys": tuple(dict.fromkeys(product.get("sub_categorys") or [])),
+            "stock": bool(product.get("stock")),
+            **{name: float(product[name]) if product.get(name) is not None else None for name in DIMENSIONS},
+        }
+
+    @staticmethod
+    def _sort_keys(doc, o):
+        # Products without a dimension are left out of that order and never match its range
+        return {name: (doc[name], o) for name in ("id", "price", "title", *DIMENSIONS) if doc[name] is not None}
+
+    def _add_locked(self, doc):
+        o = self._ordinal.get(doc["id"])
+        if o is None:
+            o = self._ordinal[doc["id"]] = len(self._ids)
+            self._ids.append(doc["id"])
+        bit = 1 << o
+        self._docs[o] = doc
+        self._all |= bit
+        if doc["stock"]:
+            self._in_stock |= bit
+        self._categories[doc["category"]] = self._categories.get(doc["category"], 0) | bit
+        for name in doc["sub_categorys"]:
+            self._sub_categories[name] = self._sub_categories.get(name, 0) | bit
+        self._price_buckets[_price_bucket(doc["price"])] |= bit
+        for name, key in self._sort_keys(doc, o).items():
+            insort(self._orders[name], key)
+        self._prefix_cache = {}
+
+    def _remove_locked(self, product_id):
+        o = self._ordinal.get(product_id)
+        doc = self._docs.pop(o, None) if o is not None else None
+        if doc is None:
+            return
+        mask = ~(1 << o)
+        self._all &= mask
+        self._in_stock &= mask
+        self._categories[doc["category"]] &= mask
+        if not self._categories[doc["category"]]:
+            del self._categories[doc["category"]]
+        for name in doc["sub_categorys"]:
+            self._sub_categories[name] &= mask
+            if not self._sub_categories[name]:
+                del self._sub_categories[name]
+        self._price_buckets[_price_bucket(doc["price"])] &= mask
+        for name, key in self._sort_keys(doc, o).items():
+            order = self._orders[name]
+            del order[bisect_left(order, key)]
+        self._prefix_cache = {}
+
+    def index(self, product):
+        doc = self._doc(product)
+        with self._lock:
+            self._remove_locked(doc["id"])
+            self._add_locked(doc)
+
+    def remove(self, product_id):
+        with self._lock:
+            self._remove_locked(product_id)
+
+    def rebuild(self, products):
+        # Collect ordinals per facet and build each bitmap and order once;
+        # growing the ints bit by bit would be quadratic
+        docs = [self._doc(p) for p in {p["id"]: p for p in products}.values()]
+        ids = [doc["id"] for doc in docs]
+        size = len(ids)
+        categories, sub_categories = {}, {}
+        buckets = [[] for _ in PRICE_BUCKETS]
+        for o, doc in enumerate(docs):
+            categories.setdefault(doc["category"], []).append(o)
+            for name in doc["sub_categorys"]:
+                sub_categories.setdefault(name, []).append(o)
+            buckets[_price_bucket(doc["price"])].append(o)
+        orders = {name: [] for name in ("id", "price", "title", *DIMENSIONS)}
+        for o, doc in enumerate(docs):
+            for name, key in self._sort_keys(doc, o).items():
+                orders[name].append(key)
+        for order in orders.values():
+            order.sort()
+
+        with self._lock:
+            self._ordinal = {pid: o for o, pid in enumerate(ids)}
+            self._ids = ids
+            self._docs = dict(enumerate(docs))
+            self._all = (1 << size) - 1
+            self._in_stock = _bitmap((o for o, doc in enumerate(docs) if doc["stock"]), size)
+            self._categories = {k: _bitmap(v, size) for k, v in categories.items()}
+            self._sub_categories = {k: _bitmap(v, size) for k, v in sub_categories.items()}
+            self._price_buckets = [_bitmap(v, size) for v in buckets]
+            self._orders = orders
+            self._prefix_cache = {}
+            self._prefixes("price")
+            self.ready = True
+            self.stale = False
+
+    @staticmethod
+    def _bounds(order, low, high):
+        lo = bisect_left(order, (low, -1)) if low is not None else 0
+        hi = bisect_left(order, (high, float("inf"))) if high is not None else len(order)
+        return slice(lo, hi)
+
+    def _prefixes(self, name):
+        """prefixes[k] is the bitmap of the first k * RANGE_BLOCK entries of an order.
+
+        Built on first use and dropped by any write, so a range costs two
+        bitmap operations plus at most two partial blocks.
+        """
+        prefixes = self._prefix_cache.get(name)
+        if prefixes is None:
+            order = self._orders[name]
+            size = len(self._ids)
+            prefixes = [0]
+            for start in range(0, len(order) - RANGE_BLOCK + 1, RANGE_BLOCK):
+                block = _bitmap((o for _, o in order[start:start + RANGE_BLOCK]), size)
+                prefixes.append(prefixes[-1] | block)
+            self._prefix_cache[name] = prefixes
+        return prefixes
+
+    def _range(self, name, low, high):
+        """Bitmap of the products whose `name` lies in [low, high]; either bound may be None."""
+        order = self._orders[name]
+        span = self._bounds(order, low, high)
+        lo, hi = span.start, span.stop
+        size = len(self._ids)
+        first, last = -(-lo // RANGE_BLOCK), hi // RANGE_BLOCK
+        if first >= last:
+            return _bitmap((o for _, o in order[lo:hi]), size)
+        prefixes = self._prefixes(name)
+        edges = order[lo:first * RANGE_BLOCK] + order[last * RANGE_BLOCK:hi]
+        return (prefixes[last] & ~prefixes[first]) | _bitmap((o for _, o in edges), size)
+
+    def filter(self, category=None, sub_categories=None, min_price=None, max_price=None,
+               in_stock=None, dimensions=None, sort="id", limit=24, offset=0):
+        """Matching ids (one page), the total, and facet counts for the current filters.
+
+        Facet counts are disjunctive: the sub-category and price counts ignore
+        their own filter, so the client can offer the alternatives.
+        """
+        if sort not in SORT_KEYS:
+            raise ValueError(f"Unknown sort: {sort}")
+        with self._lock:
+            base = self._all
+            if category is not None:
+                base &= self._categories.get(category, 0)
+            if in_stock is not None:
+                base = base & self._in_stock if in_stock else base & ~self._in_stock
+            for name, (low, high) in (dimensions or {}).items():
+                if name not in DIMENSIONS:
+                    raise ValueError(f"Unknown dimension: {name}")
+                base &= self._range(name, low, high)
+
+            by_sub_category = base
+            if sub_categories:
+                selected = 0
+                for name in sub_categories:
+                    selected |= self._sub_categories.get(name, 0)
+                by_sub_category &= selected
+            by_price = base
+            if min_price is not None or max_price is not None:
+                by_price &= self._range("price", min_price, max_price)
+            result = by_sub_category & by_price
+
+            facets = {
+                "sub_category": {
+                    name: count for name, bits in sorted(self._sub_categories.items())
+                    if (count := (by_price & bits).bit_count())
+                },
+                "price": [
+                    {"label": label, "min": low, "max": high, "count": (by_sub_category & bits).bit_count()}
+                    for (label, low, high), bits in zip(PRICE_BUCKETS, self._price_buckets)
+                ],
+                "in_stock": (result & self._in_stock).bit_count(),
+            }
+            if category is None:
+                facets["category"] = {
+                    name: count for name, bits in sorted(self._categories.items(), key=lambda c: str(c[0]))
+                    if (count := (result & bits).bit_count())
+                }
+
+            total = result.bit_count()
+            wanted = offset + limit
+            name, descending = {
+                "id": ("id", False),
+                "price_asc": ("price", False),
+                "price_desc": ("price", True),
+                "title_asc": ("title", False),
+                "title_desc": ("title", True),
+            }[sort]
+            order = self._orders[name]
+            if name == "price" and (min_price is not None or max_price is not None):
+                # Everything outside the price range is known not to match
+                order = order[self._bounds(order, min_price, max_price)]
+            # Walking the global order visits about wanted / density entries;
+            # extracting scans the bitmap bytes and sorts every match
+            walk_cost = wanted * len(order) / max(total, 1)
+            if walk_cost > len(self._ids) / 8 + total * 2:
+                # Sparse matches: pull them out of the bitmap and sort only those
+                ordinals = _ordinals(result)
+                position = {o: self._docs[o][name] for o in ordinals}
+                ordinals.sort(key=lambda o: (position[o], o), reverse=descending)
+                page = ordinals[offset:wanted]
+            else:
+                # Dense matches: walk the global order until the page is full
+                buf = result.to_bytes((len(self._ids) >> 3) + 1, "little")
+                page = []
+                seen = 0
+                for _, o in (reversed(order) if descending else order):
+                    if buf[o >> 3] >> (o & 7) & 1:
+                        if seen >= offset:
+                            page.append(o)
+                            if len(page) >= limit:
+                                break
+                        seen += 1
+            return [self._ids[o] for o in page], total, facets
+
+
+facet_index = FacetIndex()
@@ -0,0 +1,71 @@
+import hashlib
+import os
+
+from dotenv import load_dotenv
+from fastapi import Request, Response
+from services.catalog_cache import CATALOG_CACHE_SHARED
+
+load_dotenv()
+
+# Sent with every catalog read so the frontend and the CDN can reuse responses
+HTTP_CACHE_CONTROL = os.getenv("HTTP_CACHE_CONTROL") or "public, max-age=60, stale-while-revalidate=600"
+
+
+def make_etag(*parts):
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(part if isinstance(part, bytes) else str(part).encode())
+        digest.update(b"\0")
+    return f'"{digest.hexdigest()[:32]}"'
+
+
+def etag_matches(if_none_match, etag):
+    if not if_none_match:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates or f"W/{etag}" in candidates
+
+
+def catalog_etag(request: Request, version):
+    """Validator derived from a shared catalog version, usable before any hydration.
+
+    `version` is the one the response was loaded at, as returned by
+    sync_shared_version. Only available with CATALOG_CACHE_SHARED=1: a
+    per-worker counter would keep answering 304 on workers that never saw the write.
+    """
+    if not CATALOG_CACHE_SHARED or version is None:
+        return None
+    return make_etag("v", version, request.url.path, request.url.query)
+
+
+def not_modified(etag, headers=None):
+    return Response(status_code=304, headers={
+        **(headers or {}),
+        "ETag": etag,
+        "Cache-Control": HTTP_CACHE_CONTROL,
+    })
+
+
+def check_not_modified(request: Request, version):
+    """Return (etag, 304 response or None) using the version validator when there is one."""
+    etag = catalog_etag(request, version)
+    if etag and etag_matches(request.headers.get("if-none-match"), etag):
+        return etag, not_modified(etag)
+    return etag, None
+
+
+def conditional_bytes(request: Request, body, etag=None, headers=None):
+    """JSON response with ETag/Cache-Control; answers 304 when the client copy is current.
+
+    `body` is already serialized; without a version validator the ETag is a
+    hash of it.
+    """
+    body = body.encode() if isinstance(body, str) else body
+    etag = etag or make_etag(body)
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return not_modified(etag, headers)
+    return Response(body, media_type="application/json", headers={
+        **(headers or {}),
+        "ETag": etag,
+        "Cache-Control": HTTP_CACHE_CONTROL,
+    })
@@ -0,0 +1,145 @@
+import base64
+import binascii
+
+from sqlalchemy import text, bindparam
+
+# Maximum number of ids sent in a single IN (...) list
+IN_CHUNK_SIZE = 1000
+
+CHILD_QUERIES = {
+    "main_image": text(
+        "SELECT product_id, url FROM products_main_imgs WHERE product_id IN :ids"
+    ).bindparams(bindparam("ids", expanding=True)),
+    "images": text(
+        "SELECT product_id, url FROM products_imgs WHERE product_id IN :ids"
+    ).bindparams(bindparam("ids", expanding=True)),
+    "details_list": text(
+        "SELECT product_id, detail_text FROM details WHERE product_id IN :ids"
+    ).bindparams(bindparam("ids", expanding=True)),
+    "sub_categorys": text(
+        "SELECT product_id, sub_category_name FROM sub_categorys WHERE product_id IN :ids"
+    ).bindparams(bindparam("ids", expanding=True)),
+    "image_variants": text("""
+        SELECT product_id, source_url, variant_size, variant_format, url
+        FROM products_img_variants WHERE product_id IN :ids
+    """).bindparams(bindparam("ids", expanding=True)),
+}
+
+PRODUCTS_BY_IDS = text(
+    "SELECT * FROM Products WHERE id IN :ids"
+).bindparams(bindparam("ids", expanding=True))
+
+
+def _chunks(ids, size=IN_CHUNK_SIZE):
+    for i in range(0, len(ids), size):
+        yield ids[i:i + size]
+
+
+def load_children(conn, ids, children=None):
+    """Load the child tables for a set of product ids, one query per table and chunk."""
+    children = CHILD_QUERIES.keys() if children is None else children
+    loaded = {}
+    for name in children:
+        grouped = {}
+        for chunk in _chunks(ids):
+            for row in conn.execute(CHILD_QUERIES[name], {"ids": chunk}):
+                value = row[1] if len(row) == 2 else tuple(row[1:])
+                grouped.setdefault(row[0], []).append(value)
+        loaded[name] = grouped
+    return loaded
+
+
+def hydrate_products(conn, rows, children=None):
+    """Turn `Products` rows into the API dicts, attaching images, details and sub-categories."""
+    rows = list(rows)
+    if not rows:
+        return []
+    ids = list(dict.fromkeys(row["id"] for row in rows))
+    loaded = load_children(conn, ids, children)
+
+    products = []
+    for row in rows:
+        data = dict(row)
+        hid = data["id"]
+        for name, grouped in loaded.items():
+            values = grouped.get(hid, [])
+            if name == "main_image":
+                data[name] = values[0] if values else None
+            elif name == "image_variants":
+                # {source_url: {size: {format: url}}}
+                variants = {}
+                for source_url, size, fmt, url in values:
+                    variants.setdefault(source_url, {}).setdefault(size, {})[fmt] = url
+                data[name] = variants
+            else:
+                data[name] = values
+        products.append(data)
+    return products
+
+
+def fetch_products_by_ids(conn, ids, children=None):
+    """Hydrate the given product ids, returned as a dict keyed by id (missing ids are absent)."""
+    ids = list(dict.fromkeys(ids))
+    rows = []
+    for chunk in _chunks(ids):
+        rows.extend(conn.execute(PRODUCTS_BY_IDS, {"ids": chunk}).mappings().all())
+    return {p["id"]: p for p in hydrate_products(conn, rows, children)}
+
+
+# Columns of `Products` that can be requested through `fields=`
+PRODUCT_COLUMNS = ("id", "title", "price", "category", "height", "width", "depth", "stock")
+MAX_PAGE_SIZE = 200
+
+
+def parse_fields(fields):
+    """Split a `fields=` projection into (Products columns, child tables); None means everything."""
+    if not fields:
+        return None, None
+    requested = [f.strip() for f in fields.split(",") if f.strip()]
+    unknown = [f for f in requested if f not in PRODUCT_COLUMNS and f not in CHILD_QUERIES]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+    columns = ["id"] + [f for f in PRODUCT_COLUMNS if f in requested and f != "id"]
+    children = [f for f in CHILD_QUERIES if f in requested]
+    return columns, children
+
+
+def encode_cursor(product_id):
+    return base64.urlsafe_b64encode(product_id.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    try:
+        padded = (cursor + "=" * (-len(cursor) % 4)).encode()
+        return base64.b64decode(padded, altchars=b"-_", validate=True).decode()
+    except (binascii.Error, UnicodeDecodeError):
+        raise ValueError("Invalid cursor")
+
+
+def list_product_page(conn, category=None, limit=None, cursor=None, fields=None):
+    """Keyset page of hydrated products ordered by id. Returns (products, next_cursor)."""
+    columns, children = parse_fields(fields)
+    clauses = []
+    params = {}
+    if category is not None:
+        clauses.append("category = :category")
+        params["category"] = category
+    if cursor:
+        clauses.append("id > :after")
+        params["after"] = decode_cursor(cursor)
+
+    sql = f"SELECT {'*' if columns is None else ', '.join(columns)} FROM Products"
+    if clauses:
+        sql += " WHERE " + " AND ".join(clauses)
+    sql += " ORDER BY id"
+    if limit is not None:
+        # One extra row tells us whether there is a next page
+        sql += " LIMIT :limit"
+        params["limit"] = limit + 1
+
+    rows = conn.execute(text(sql), params).mappings().all()
+    next_cursor = None
+    if limit is not None and len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1]["id"])
+    return hydrate_products(conn, rows, children), next_cursor
@@ -0,0 +1,253 @@
+"""Remove image files no product references any more.
+
+Uploads are content-addressed, so one file can back several products and a
+file is only garbage once no row in products_main_imgs, products_imgs or
+products_img_variants points at it. Files are never removed inline by a
+request; a background task marks the referenced files, then sweeps the rest
+in batches:
+
+    python -m services.image_gc collect [--dry-run] [--force]
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import time
+from collections import Counter
+from datetime import datetime, timezone
+
+from dotenv import load_dotenv
+from sqlalchemy import text, bindparam
+from starlette.concurrency import run_in_threadpool
+
+from Database.dbGetConnection import run_db
+from services.images import IMAGES_DIR, DOMAIN_URL, url_to_fname
+from services.image_variants import VARIANTS_DIR
+
+load_dotenv()
+
+logger = logging.getLogger("uvicorn.error")
+
+IMAGE_GC = os.getenv("IMAGE_GC", "1") == "1"
+# Seconds between scheduled runs; writes that drop image references also wake the task
+IMAGE_GC_INTERVAL = float(os.getenv("IMAGE_GC_INTERVAL") or "3600")
+# Minimum seconds between two runs, so a burst of deletes triggers one sweep
+IMAGE_GC_MIN_INTERVAL = float(os.getenv("IMAGE_GC_MIN_INTERVAL") or "60")
+# Files modified more recently than this are kept: an upload may not have committed its rows yet
+IMAGE_GC_GRACE_SECONDS = float(os.getenv("IMAGE_GC_GRACE_SECONDS") or "3600")
+IMAGE_GC_BATCH_SIZE = int(os.getenv("IMAGE_GC_BATCH_SIZE") or "500")
+# A sweep that would remove more than this share of the files is not run: the
+# worker is most likely pointed at the wrong (empty, staging) database
+IMAGE_GC_MAX_UNREFERENCED_SHARE = float(os.getenv("IMAGE_GC_MAX_UNREFERENCED_SHARE") or "0.5")
+
+IMAGE_TABLES = ("products_main_imgs", "products_imgs", "products_img_variants")
+
+
+def reference_counts(conn):
+    """Counter of image paths (relative to IMAGES_DIR) to the rows referencing them."""
+    counts = Counter()
+    for table in IMAGE_TABLES:
+        for url in conn.execute(text(f"SELECT url FROM {table}")).scalars():
+            counts[url_to_fname(url)] += 1
+    return counts
+
+
+def still_referenced(conn, fnames):
+    """Those of `fnames` referenced now (re-checked right before a batch is removed)."""
+    urls = {f"{DOMAIN_URL}/{fname}": fname for fname in fnames}
+    query = text(" UNION ".join(f"SELECT url FROM {table} WHERE url IN :urls" for table in IMAGE_TABLES))
+    query = query.bindparams(bindparam("urls", expanding=True))
+    return {urls[url] for url in conn.execute(query, {"urls": list(urls)}).scalars()}
+
+
+def scan(counts, grace=IMAGE_GC_GRACE_SECONDS):
+    """Walk the originals and pre-generated variants.
+
+    Returns the unreferenced files old enough to remove as (fname, path, size),
+    and totals for the report. The on-demand variant cache has its own LRU
+    eviction and is not scanned.
+    """
+    cutoff = time.time() - grace
+    stats = {"files": 0, "bytes": 0, "shared_files": 0, "deduplicated_bytes": 0, "recent_unreferenced": 0}
+    garbage = []
+    for directory, prefix in ((IMAGES_DIR, ""), (VARIANTS_DIR, "variants/")):
+        try:
+            entries = list(os.scandir(directory))
+        except FileNotFoundError:
+            continue
+        for entry in entries:
+            if entry.name.startswith(".") or not entry.is_file():
+                continue
+            st = entry.stat()
+            fname = prefix + entry.name
+            stats["files"] += 1
+            stats["bytes"] += st.st_size
+            refs = counts.get(fname, 0)
+            if refs > 1:
+                stats["shared_files"] += 1
+                stats["deduplicated_bytes"] += st.st_size * (refs - 1)
+            if refs:
+                continue
+            if st.st_mtime > cutoff:
+                stats["recent_unreferenced"] += 1
+                continue
+            garbage.append((fname, entry.path, st.st_size))
+    return garbage, stats
+
+
+def _remove(files):
+    reclaimed = 0
+    for _, path, size in files:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            continue
+        reclaimed += size
+    return reclaimed
+
+
+class ImageGC:
+    """Background mark-and-sweep of the images directory.
+
+    Per process; with several workers each runs its own sweep, which is
+    harmless (removing a missing file is a no-op) but can be limited to one
+    worker with IMAGE_GC=0 on the others.
+    """
+
+    def __init__(self, interval=IMAGE_GC_INTERVAL, min_interval=IMAGE_GC_MIN_INTERVAL,
+                 grace=IMAGE_GC_GRACE_SECONDS, batch_size=IMAGE_GC_BATCH_SIZE,
+                 max_unreferenced_share=IMAGE_GC_MAX_UNREFERENCED_SHARE):
+        self.interval = interval
+        self.min_interval = min_interval
+        self.grace = grace
+        self.batch_size = batch_size
+        self.max_unreferenced_share = max_unreferenced_share
+        self.last_run = None
+        self.totals = {"runs": 0, "removed_files": 0, "reclaimed_bytes": 0}
+        self._task = None
+        self._wake = None
+        self._lock = asyncio.Lock()
+
+    async def start(self):
+        if not IMAGE_GC or self.interval <= 0:
+            return
+        self._wake = asyncio.Event()
+        self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def wake(self):
+        """Ask for a sweep soon, e.g. after a write dropped image references."""
+        if self._wake is not None:
+            self._wake.set()
+
+    async def _loop(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            try:
+                await self.run()
+            except Exception:
+                logger.exception("Image GC run failed")
+            await asyncio.sleep(self.min_interval)
+
+    def _refusal(self, counts, garbage, stats):
+        """Why this sweep must not remove anything, or None."""
+        if not stats["files"]:
+            return None
+        if not counts:
+            return "no image references found in the database but files exist"
+        share = len(garbage) / stats["files"]
+        if share > self.max_unreferenced_share:
+            return (f"{share:.0%} of the files are unreferenced "
+                    f"(IMAGE_GC_MAX_UNREFERENCED_SHARE={self.max_unreferenced_share})")
+        return None
+
+    async def run(self, dry_run=False, force=False):
+        """One mark-and-sweep pass; returns its report.
+
+        `force` skips the safety stop on sweeps that would remove most files.
+        """
+        async with self._lock:
+            started = time.perf_counter()
+            report = {"started_at": datetime.now(timezone.utc).isoformat(), "dry_run": dry_run}
+            counts = await run_db(reference_counts)
+            garbage, stats = await run_in_threadpool(scan, counts, self.grace)
+            report.update(referenced_files=len(counts), **stats, unreferenced=len(garbage))
+            refusal = None if force else self._refusal(counts, garbage, stats)
+            if refusal:
+                logger.warning("Image GC sweep skipped: %s", refusal)
+                report.update(skipped=refusal, removed_files=0, reclaimed_bytes=0,
+                              seconds=round(time.perf_counter() - started, 3))
+                self.last_run = report
+                return report
+
+            removed = reclaimed = 0
+            for i in range(0, len(garbage), self.batch_size):
+                batch = garbage[i:i + self.batch_size]
+                # Referenced since the mark phase (e.g. an import pointing at an existing url)
+                live = await run_db(still_referenced, [fname for fname, _, _ in batch])
+                batch = [item for item in batch if item[0] not in live]
+                if dry_run:
+                    removed += len(batch)
+                    reclaimed += sum(size for _, _, size in batch)
+                    continue
+                reclaimed += await run_in_threadpool(_remove, batch)
+                removed += len(batch)
+
+            report.update(
+                removed_files=removed,
+                reclaimed_bytes=reclaimed,
+                seconds=round(time.perf_counter() - started, 3),
+            )
+            if not dry_run:
+                self.totals["runs"] += 1
+                self.totals["removed_files"] += removed
+                self.totals["reclaimed_bytes"] += reclaimed
+                if removed:
+                    logger.info("Image GC removed %d files, reclaimed %.1f MB", removed, reclaimed / 1e6)
+            self.last_run = report
+            return report
+
+    def stats(self):
+        return {
+            "enabled": self._task is not None,
+            "interval": self.interval,
+            "grace_seconds": self.grace,
+            "totals": dict(self.totals),
+            "last_run": self.last_run,
+        }
+
+
+image_gc = ImageGC()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Remove image files no product references.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    collect = sub.add_parser("collect", help="Run one mark-and-sweep pass and print its report")
+    collect.add_argument("--dry-run", action="store_true", help="Report what would be removed")
+    collect.add_argument("--grace", type=float, default=IMAGE_GC_GRACE_SECONDS,
+                         help="Keep unreferenced files modified within this many seconds")
+    collect.add_argument("--force", action="store_true",
+                         help="Sweep even when most files look unreferenced (see IMAGE_GC_MAX_UNREFERENCED_SHARE)")
+    args = parser.parse_args()
+
+    gc = ImageGC(grace=args.grace)
+    report = asyncio.run(gc.run(dry_run=args.dry_run, force=args.force))
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,203 @@
+import logging
+import os
+import threading
+import uuid
+from dataclasses import dataclass
+
+from dotenv import load_dotenv
+from starlette.concurrency import run_in_threadpool
+
+from services.images import IMAGES_DIR, DOMAIN_URL, ImageRejected, remove_files
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # Pillow is optional; without it only originals are served
+    Image = None
+
+load_dotenv()
+
+logger = logging.getLogger("uvicorn.error")
+
+# Longest side in pixels for each pre-generated size
+VARIANT_SIZES = {"thumb": 200, "card": 480, "full": 1600}
+VARIANT_FORMATS = ("jpg", "webp")
+IMAGE_SIZES = ("original", *VARIANT_SIZES)
+DEFAULT_LIST_IMAGE_SIZE = os.getenv("DEFAULT_LIST_IMAGE_SIZE") or "thumb"
+
+# Variants made at upload time; referenced from products_img_variants
+VARIANTS_DIR = os.path.join(IMAGES_DIR, "variants")
+# Variants made on demand for older uploads; evicted least-recently-used first
+VARIANT_CACHE_DIR = os.path.join(IMAGES_DIR, "cache")
+VARIANT_CACHE_MAX_BYTES = int(os.getenv("IMAGE_VARIANT_CACHE_MAX_BYTES") or str(512 * 1024 * 1024))
+VARIANT_QUALITY = {"jpg": 82, "webp": 80}
+
+_eviction_lock = threading.Lock()
+
+
+@dataclass
+class StoredVariant:
+    source_url: str
+    size: str
+    format: str
+    path: str
+    url: str
+
+
+def variant_fname(source_fname, size, fmt):
+    stem = os.path.splitext(source_fname)[0]
+    return f"{stem}_{size}.{fmt}"
+
+
+def _encode(img, size, fmt, path):
+    variant = img.copy()
+    box = VARIANT_SIZES[size]
+    variant.thumbnail((box, box), Image.LANCZOS)
+    if fmt == "jpg":
+        if variant.mode not in ("RGB", "L"):
+            background = Image.new("RGB", variant.size, (255, 255, 255))
+            background.paste(variant, mask=variant.convert("RGBA").split()[-1])
+            variant = background
+        variant.save(path, "JPEG", quality=VARIANT_QUALITY[fmt], optimize=True, progressive=True)
+    else:
+        variant.save(path, "WEBP", quality=VARIANT_QUALITY[fmt], method=4)
+
+
+def _write_variant(img, size, fmt, path):
+    # Same write-then-rename scheme as the originals
+    tmp_path = f"{path}.{uuid.uuid4().hex}.part"
+    try:
+        _encode(img, size, fmt, tmp_path)
+        os.replace(tmp_path, path)
+    finally:
+        remove_files([tmp_path])
+
+
+def _open(path):
+    img = Image.open(path)
+    img.seek(0)
+    return ImageOps.exif_transpose(img)
+
+
+def generate_variants(stored_image):
+    """Create every size/format for one stored original. Returns StoredVariant list.
+
+    Variants are named after the (content-addressed) original, so those of an
+    image stored before are reused instead of encoded again.
+    """
+    if Image is None:
+        return []
+    os.makedirs(VARIANTS_DIR, exist_ok=True)
+    variants = [
+        StoredVariant(
+            source_url=stored_image.url,
+            size=size,
+            format=fmt,
+            path=os.path.join(VARIANTS_DIR, variant_fname(stored_image.fname, size, fmt)),
+            url=f"{DOMAIN_URL}/variants/{variant_fname(stored_image.fname, size, fmt)}",
+        )
+        for size in VARIANT_SIZES
+        for fmt in VARIANT_FORMATS
+    ]
+    missing = []
+    for variant in variants:
+        if os.path.exists(variant.path):
+            # Keeps the image GC off it until the new reference is committed
+            os.utime(variant.path)
+        else:
+            missing.append(variant)
+    if not missing:
+        return variants
+    try:
+        img = _open(stored_image.path)
+        img.load()
+    except Exception:
+        raise ImageRejected(415, f"Unreadable image: {stored_image.fname}")
+    # Files written before a failure are left to the image GC
+    with img:
+        for variant in missing:
+            _write_variant(img, variant.size, variant.format, variant.path)
+    return variants
+
+
+async def generate_all_variants(stored_images):
+    """Generate variants for the originals of one request off the event loop."""
+    variants = []
+    for stored in stored_images:
+        if stored is not None:
+            variants.extend(await run_in_threadpool(generate_variants, stored))
+    return variants
+
+
+def variant_path(source_fname, size, fmt):
+    """Path of a servable variant, generating it into the LRU cache when needed.
+
+    Returns None when the original is missing, cannot be decoded or Pillow is
+    not installed.
+    """
+    fname = variant_fname(source_fname, size, fmt)
+    pregenerated = os.path.join(VARIANTS_DIR, fname)
+    if os.path.exists(pregenerated):
+        return pregenerated
+
+    cached = os.path.join(VARIANT_CACHE_DIR, fname)
+    if os.path.exists(cached):
+        # mtime doubles as the last-access time for eviction
+        os.utime(cached)
+        return cached
+
+    source = os.path.join(IMAGES_DIR, source_fname)
+    if Image is None or not os.path.exists(source):
+        return None
+    os.makedirs(VARIANT_CACHE_DIR, exist_ok=True)
+    try:
+        with _open(source) as img:
+            img.load()
+            _write_variant(img, size, fmt, cached)
+    except (OSError, Image.DecompressionBombError) as e:
+        # Truncated or not an image at all (UnidentifiedImageError is an OSError)
+        logger.warning("Cannot make the %s variant of %s: %s", size, source_fname, e)
+        return None
+    evict_variant_cache()
+    return cached
+
+
+def evict_variant_cache(max_bytes=VARIANT_CACHE_MAX_BYTES):
+    """Delete the least recently used on-demand variants until the cache fits."""
+    with _eviction_lock:
+        try:
+            entries = [e for e in os.scandir(VARIANT_CACHE_DIR) if e.is_file() and not e.name.endswith(".part")]
+        except FileNotFoundError:
+            return 0
+        stats = [(e.stat(), e.path) for e in entries]
+        total = sum(st.st_size for st, _ in stats)
+        removed = 0
+        for st, path in sorted(stats, key=lambda item: item[0].st_mtime):
+            if total <= max_bytes:
+                break
+            remove_files([path])
+            total -= st.st_size
+            removed += 1
+        return removed
+
+
+def apply_image_size(product, size, keep_variants=False):
+    """List form of a product: image urls point at the given variant size (when one exists).
+
+    `main_image_webp` is set whenever `main_image` is (None without a WebP
+    variant). The `image_variants` map is dropped unless `keep_variants`.
+    """
+    variants = product.get("image_variants") or {}
+    product = {k: v for k, v in product.items() if keep_variants or k != "image_variants"}
+
+    def pick(url, fmt="jpg"):
+        if size == "original":
+            return None
+        return variants.get(url, {}).get(size, {}).get(fmt)
+
+    if "main_image" in product:
+        main = product["main_image"]
+        product["main_image"] = (pick(main) or main) if main else main
+        product["main_image_webp"] = pick(main, "webp") if main else None
+    if product.get("images"):
+        product["images"] = [pick(u) or u for u in product["images"]]
+    return product
@@ -0,0 +1,154 @@
+import asyncio
+import hashlib
+import os
+import uuid
+from dataclasses import dataclass
+
+import anyio
+from dotenv import load_dotenv
+from fastapi import UploadFile
+from starlette.concurrency import run_in_threadpool
+
+from services.metrics import IMAGE_UPLOADS
+
+load_dotenv()
+
+IMAGES_DIR = os.getenv("IMAGES_DIR") or "images/"
+# Public prefix stored in front of every image filename
+DOMAIN_URL = (
+    os.getenv("IMAGES_BASE_URL") or "mdpuf8ksxirarnlhtl6pxo2xylsjmtq8-barelectro-api.bargiuelectro.com/images"
+).rstrip("/")
+
+MAX_IMAGE_BYTES = int(os.getenv("MAX_IMAGE_BYTES") or str(10 * 1024 * 1024))
+IMAGE_UPLOAD_CONCURRENCY = int(os.getenv("IMAGE_UPLOAD_CONCURRENCY") or "4")
+IMAGE_CHUNK_SIZE = 1024 * 1024
+
+
+class ImageRejected(Exception):
+    def __init__(self, status_code, detail):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+@dataclass
+class StoredImage:
+    fname: str
+    path: str
+    url: str
+    size: int
+    # False when an identical file was already stored and is reused
+    created: bool = True
+
+
+def sniff_image_type(head: bytes):
+    """Extension for the image format found in the first bytes, or None."""
+    if head.startswith(b"\xff\xd8\xff"):
+        return ".jpg"
+    if head.startswith(b"\x89PNG\r\n\x1a\n"):
+        return ".png"
+    if head[:6] in (b"GIF87a", b"GIF89a"):
+        return ".gif"
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return ".webp"
+    if head[4:12] in (b"ftypavif", b"ftypavis"):
+        return ".avif"
+    return None
+
+
+def has_file(upload):
+    return upload is not None and bool(getattr(upload, "filename", ""))
+
+
+def _publish(tmp_path, path):
+    """Move a finished upload to its content-addressed name; False if that file already existed."""
+    if os.path.exists(path):
+        # Same bytes already stored: reuse them, and touch the file so the image GC
+        # leaves it alone until this request has committed its reference
+        os.utime(path)
+        remove_files([tmp_path])
+        return False
+    os.replace(tmp_path, path)
+    return True
+
+
+async def store_upload(upload: UploadFile) -> StoredImage:
+    """Stream one upload to IMAGES_DIR in chunks, checking type and size as it goes.
+
+    The file is named after the SHA-256 of its content, computed while
+    streaming, so the same photo uploaded again is stored once. It is written
+    under a temporary name, fsynced and then renamed, so a StoredImage always
+    points at a complete file.
+    """
+    first = await upload.read(IMAGE_CHUNK_SIZE)
+    ext = sniff_image_type(first[:16])
+    if ext is None:
+        raise ImageRejected(415, f"Unsupported image type: {upload.filename}")
+
+    tmp_path = os.path.join(IMAGES_DIR, f"upload-{uuid.uuid4().hex}.part")
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        async with await anyio.open_file(tmp_path, "wb") as out:
+            chunk = first
+            while chunk:
+                size += len(chunk)
+                if size > MAX_IMAGE_BYTES:
+                    raise ImageRejected(413, f"Image too large: {upload.filename}")
+                digest.update(chunk)
+                await out.write(chunk)
+                chunk = await upload.read(IMAGE_CHUNK_SIZE)
+            await out.flush()
+            await anyio.to_thread.run_sync(os.fsync, out.wrapped.fileno())
+        fname = f"{digest.hexdigest()}{ext}"
+        path = os.path.join(IMAGES_DIR, fname)
+        created = await anyio.to_thread.run_sync(_publish, tmp_path, path)
+        IMAGE_UPLOADS.inc(1, "created" if created else "deduplicated")
+    except BaseException:
+        await run_in_threadpool(remove_files, [tmp_path])
+        raise
+    return StoredImage(fname=fname, path=path, url=f"{DOMAIN_URL}/{fname}", size=size, created=created)
+
+
+async def store_uploads(uploads):
+    """Store several uploads concurrently; returns one StoredImage (or None) per upload.
+
+    If any upload fails the error is re-raised. Files already stored stay
+    until the image GC finds them unreferenced: with content-addressed names a
+    concurrent request may be about to reference the same file.
+    """
+    os.makedirs(IMAGES_DIR, exist_ok=True)
+    semaphore = asyncio.Semaphore(IMAGE_UPLOAD_CONCURRENCY)
+
+    async def store(upload):
+        if not has_file(upload):
+            return None
+        async with semaphore:
+            return await store_upload(upload)
+
+    results = await asyncio.gather(*(store(u) for u in uploads), return_exceptions=True)
+    errors = [r for r in results if isinstance(r, BaseException)]
+    if errors:
+        raise errors[0]
+    return results
+
+
+def remove_files(paths):
+    for path in paths:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def url_to_fname(url):
+    """Path of an image url relative to IMAGES_DIR, whatever prefix it was saved under.
+
+    Originals sit directly in IMAGES_DIR and pre-generated variants in its
+    variants/ folder, so the last path segment (and whether its parent is
+    variants) is enough; IMAGES_BASE_URL may have changed since the row was written.
+    """
+    parts = url.split("?", 1)[0].split("#", 1)[0].rstrip("/").split("/")
+    if len(parts) > 1 and parts[-2] == "variants":
+        return f"variants/{parts[-1]}"
+    return parts[-1]
@@ -0,0 +1,374 @@
+import asyncio
+import json
+import logging
+import os
+import random
+import time
+import uuid
+from email.errors import MessageError
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+
+import aiosmtplib
+from dotenv import load_dotenv
+from starlette.concurrency import run_in_threadpool
+
+load_dotenv()
+
+logger = logging.getLogger("uvicorn.error")
+
+SMTP_HOST = os.getenv("SMTP_HOST") or "smtp.gmail.com"
+SMTP_PORT = int(os.getenv("SMTP_PORT") or "465")
+# ssl (implicit TLS, the default on 465), starttls (default elsewhere) or none
+SMTP_SECURITY = os.getenv("SMTP_SECURITY") or ("ssl" if SMTP_PORT == 465 else "starttls")
+SMTP_TIMEOUT = float(os.getenv("SMTP_TIMEOUT") or "30")
+# An idle connection is closed after this many seconds and reopened on the next message
+SMTP_IDLE_TIMEOUT = float(os.getenv("SMTP_IDLE_TIMEOUT") or "60")
+
+MAIL_WORKERS = int(os.getenv("MAIL_WORKERS") or "2")
+MAIL_MAX_ATTEMPTS = int(os.getenv("MAIL_MAX_ATTEMPTS") or "8")
+MAIL_RETRY_BASE = float(os.getenv("MAIL_RETRY_BASE") or "2")
+MAIL_RETRY_MAX = float(os.getenv("MAIL_RETRY_MAX") or "300")
+MAIL_SHUTDOWN_TIMEOUT = float(os.getenv("MAIL_SHUTDOWN_TIMEOUT") or "10")
+# Every accepted message is a file here until it is delivered; failed/ keeps
+# the ones that ran out of attempts or were rejected by the server
+MAIL_SPOOL_DIR = os.getenv("MAIL_SPOOL_DIR") or "spool/mail/"
+MAIL_FAILED_DIR = os.path.join(MAIL_SPOOL_DIR, "failed")
+# Seconds between scans for messages no worker has claimed: released by a
+# worker that stopped, left by one that crashed, or spooled while none ran (0 disables)
+MAIL_SPOOL_SCAN_INTERVAL = float(os.getenv("MAIL_SPOOL_SCAN_INTERVAL") or "60")
+
+
+class MailNotConfigured(Exception):
+    pass
+
+
+def mail_settings():
+    sender_email = os.environ.get("SENDER_EMAIL")
+    sender_password = os.environ.get("SENDER_PASSWORD")
+    receiver_email = os.environ.get("RECEIVER_EMAIL")
+
+    if not sender_email:
+        raise MailNotConfigured("El email del remitente no está configurado")
+    if not sender_password:
+        raise MailNotConfigured("La contraseña del remitente no está configurada")
+    if not receiver_email:
+        raise MailNotConfigured("El email del receptor no está configurado")
+    return sender_email, sender_password, receiver_email
+
+
+def build_message(record, sender_email, receiver_email):
+    msg = MIMEMultipart()
+    msg['From'] = sender_email
+    msg['To'] = receiver_email
+    msg['Subject'] = record["subject"]
+    if record.get("reply_to"):
+        msg['Reply-To'] = record["reply_to"]
+    msg.attach(MIMEText(record["body"], 'plain'))
+    return msg
+
+
+def _spool_path(message_id, owner=None):
+    # <id>.json until a worker claims it for delivery, then <id>.<pid>.sending
+    name = f"{message_id}.json" if owner is None else f"{message_id}.{owner}.sending"
+    return os.path.join(MAIL_SPOOL_DIR, name)
+
+
+def _write_record(record, owner=None):
+    # Write-then-rename so a crash never leaves a half-written message behind
+    os.makedirs(MAIL_SPOOL_DIR, exist_ok=True)
+    path = _spool_path(record["id"], owner)
+    tmp_path = f"{path}.part"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(record, f, ensure_ascii=False)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def _remove_record(message_id):
+    try:
+        os.remove(_spool_path(message_id, os.getpid()))
+    except FileNotFoundError:
+        pass
+
+
+def _fail_record(record):
+    os.makedirs(MAIL_FAILED_DIR, exist_ok=True)
+    _write_record(record, os.getpid())
+    os.replace(_spool_path(record["id"], os.getpid()), os.path.join(MAIL_FAILED_DIR, f"{record['id']}.json"))
+
+
+def _process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _claim_spool(recover_own=False):
+    """Claim the spooled messages no live process is sending and return them.
+
+    Claiming renames the file, which is atomic: when several workers scan the
+    spool at once each message goes to exactly one of them. Claims left by a
+    process that is gone are taken over; `recover_own` also takes those
+    carrying this pid (left by an earlier run, e.g. pid 1 in a container).
+    """
+    pid = os.getpid()
+    try:
+        entries = sorted(os.scandir(MAIL_SPOOL_DIR), key=lambda e: e.name)
+    except FileNotFoundError:
+        return []
+    records = []
+    for entry in entries:
+        parts = entry.name.split(".")
+        if len(parts) == 2 and parts[1] == "json":
+            pass
+        elif len(parts) == 3 and parts[2] == "sending" and parts[1].isdigit():
+            owner = int(parts[1])
+            if (owner == pid and not recover_own) or (owner != pid and _process_alive(owner)):
+                continue
+        else:
+            continue
+        path = _spool_path(parts[0], pid)
+        try:
+            os.rename(entry.path, path)
+        except FileNotFoundError:
+            # Another worker claimed it first
+            continue
+        try:
+            with open(path, encoding="utf-8") as f:
+                records.append(json.load(f))
+        except (OSError, ValueError):
+            logger.exception("Skipping unreadable spooled message %s", path)
+    return records
+
+
+def _release_spool():
+    """Hand the messages this process claimed but did not send back to the spool."""
+    suffix = f".{os.getpid()}.sending"
+    try:
+        entries = list(os.scandir(MAIL_SPOOL_DIR))
+    except FileNotFoundError:
+        return
+    for entry in entries:
+        if entry.name.endswith(suffix):
+            os.replace(entry.path, _spool_path(entry.name[:-len(suffix)]))
+
+
+def _is_permanent(error):
+    # 5xx replies other than authentication mean the message itself was refused;
+    # a message that cannot be rendered (e.g. a header with a line break) never will be
+    if isinstance(error, (aiosmtplib.SMTPRecipientsRefused, MessageError)):
+        return True
+    if isinstance(error, aiosmtplib.SMTPAuthenticationError):
+        return False
+    return isinstance(error, aiosmtplib.SMTPResponseException) and 500 <= error.code < 600
+
+
+class SMTPConnection:
+    """One authenticated SMTP session kept open across messages."""
+
+    def __init__(self):
+        self._client = None
+        self._last_used = 0.0
+
+    async def _connect(self, sender_email, sender_password):
+        client = aiosmtplib.SMTP(
+            hostname=SMTP_HOST,
+            port=SMTP_PORT,
+            use_tls=SMTP_SECURITY == "ssl",
+            start_tls=SMTP_SECURITY == "starttls",
+            timeout=SMTP_TIMEOUT,
+        )
+        await client.connect()
+        try:
+            await client.login(sender_email, sender_password)
+        except Exception:
+            client.close()
+            raise
+        return client
+
+    async def send(self, msg, sender_email, sender_password):
+        if self._client is not None and (
+            not self._client.is_connected or time.monotonic() - self._last_used > SMTP_IDLE_TIMEOUT
+        ):
+            await self.close()
+        if self._client is None:
+            self._client = await self._connect(sender_email, sender_password)
+        try:
+            await self._client.send_message(msg)
+        except Exception:
+            # The session state is unknown after a failure; start over next time
+            await self.close()
+            raise
+        self._last_used = time.monotonic()
+
+    async def close(self):
+        client, self._client = self._client, None
+        if client is None:
+            return
+        try:
+            if client.is_connected:
+                await client.quit()
+        except Exception:
+            client.close()
+
+
+class MailQueue:
+    """Spooled contact-form delivery with a small pool of SMTP workers.
+
+    `enqueue` persists the message before returning, so accepted messages
+    survive a restart; workers send them over reused connections and retry
+    transient failures with exponential backoff. Each uvicorn worker runs its
+    own queue; a spooled message is claimed by one of them before it is sent.
+    """
+
+    def __init__(self, workers=MAIL_WORKERS, scan_interval=MAIL_SPOOL_SCAN_INTERVAL):
+        self._size = workers
+        self._scan_interval = scan_interval
+        self._queue = None
+        self._workers = []
+        self._scanner = None
+        self._retries = set()
+        self.sent = 0
+        self.retried = 0
+        self.failed = 0
+
+    @property
+    def running(self):
+        return bool(self._workers)
+
+    async def start(self):
+        if self.running:
+            return
+        self._queue = asyncio.Queue()
+        for record in await run_in_threadpool(_claim_spool, True):
+            self._queue.put_nowait(record)
+        if self._queue.qsize():
+            logger.info("Resuming %d spooled contact messages", self._queue.qsize())
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self._size)]
+        if self._scan_interval > 0:
+            self._scanner = asyncio.create_task(self._scan())
+
+    async def stop(self, timeout=MAIL_SHUTDOWN_TIMEOUT):
+        """Keep delivering for up to `timeout`; whatever is left stays in the spool."""
+        if not self.running:
+            return
+        if self._scanner is not None:
+            self._scanner.cancel()
+            await asyncio.gather(self._scanner, return_exceptions=True)
+            self._scanner = None
+        for handle in self._retries:
+            handle.cancel()
+        self._retries.clear()
+        for _ in self._workers:
+            self._queue.put_nowait(None)
+        done, pending = await asyncio.wait(self._workers, timeout=timeout)
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+        self._workers = []
+        # Another worker (or the next start) sends what is left
+        await run_in_threadpool(_release_spool)
+
+    async def enqueue(self, subject, body, reply_to=None):
+        """Spool a message; raises ValueError if it could never be sent as given."""
+        sender_email, _, receiver_email = mail_settings()
+        record = {
+            "id": uuid.uuid4().hex,
+            "subject": subject,
+            "body": body,
+            "reply_to": reply_to,
+            "attempts": 0,
+            "created": time.time(),
+        }
+        try:
+            build_message(record, sender_email, receiver_email).as_string()
+        except MessageError as e:
+            raise ValueError(f"Invalid message headers: {e}") from e
+        if self.running:
+            await run_in_threadpool(_write_record, record, os.getpid())
+            self._queue.put_nowait(record)
+        else:
+            await run_in_threadpool(_write_record, record)
+        return record["id"]
+
+    def stats(self):
+        return {
+            "queued": self._queue.qsize() if self._queue else 0,
+            "waiting_retry": len(self._retries),
+            "workers": len(self._workers),
+            "sent": self.sent,
+            "retried": self.retried,
+            "failed": self.failed,
+        }
+
+    def _schedule_retry(self, record):
+        delay = min(MAIL_RETRY_BASE * 2 ** (record["attempts"] - 1), MAIL_RETRY_MAX)
+        delay *= random.uniform(0.8, 1.2)
+
+        def requeue():
+            self._retries.discard(handle)
+            self._queue.put_nowait(record)
+
+        handle = asyncio.get_running_loop().call_later(delay, requeue)
+        self._retries.add(handle)
+        return delay
+
+    async def _deliver(self, connection, record):
+        try:
+            sender_email, sender_password, receiver_email = mail_settings()
+            msg = build_message(record, sender_email, receiver_email)
+            await connection.send(msg, sender_email, sender_password)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            record["attempts"] += 1
+            record["last_error"] = str(e)
+            if _is_permanent(e) or record["attempts"] >= MAIL_MAX_ATTEMPTS:
+                self.failed += 1
+                logger.error("Contact message %s not delivered: %s", record["id"], e)
+                await run_in_threadpool(_fail_record, record)
+                return
+            self.retried += 1
+            await run_in_threadpool(_write_record, record, os.getpid())
+            delay = self._schedule_retry(record)
+            logger.warning("Contact message %s failed (%s); retrying in %.0fs", record["id"], e, delay)
+            return
+        self.sent += 1
+        await run_in_threadpool(_remove_record, record["id"])
+
+    async def _scan(self):
+        while True:
+            await asyncio.sleep(self._scan_interval)
+            try:
+                records = await run_in_threadpool(_claim_spool)
+            except Exception:
+                logger.exception("Could not scan the mail spool")
+                continue
+            for record in records:
+                self._queue.put_nowait(record)
+            if records:
+                logger.info("Picked up %d spooled contact messages", len(records))
+
+    async def _worker(self):
+        connection = SMTPConnection()
+        try:
+            while True:
+                try:
+                    record = await asyncio.wait_for(self._queue.get(), timeout=SMTP_IDLE_TIMEOUT)
+                except asyncio.TimeoutError:
+                    await connection.close()
+                    continue
+                if record is None:
+                    return
+                await self._deliver(connection, record)
+        finally:
+            await connection.close()
+
+
+mail_queue = MailQueue()
@@ -0,0 +1,272 @@
+import logging
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger("uvicorn.error")
+
+# Server-Timing lets the browser devtools show app/db time for each response
+METRICS_SERVER_TIMING = os.getenv("METRICS_SERVER_TIMING", "1") == "1"
+# Requests slower than this are logged with their SQL; 0 (default) disables the log
+SLOW_REQUEST_MS = float(os.getenv("SLOW_REQUEST_MS") or "0")
+SLOW_REQUEST_MAX_STATEMENTS = int(os.getenv("SLOW_REQUEST_MAX_STATEMENTS") or "50")
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 25, 50, 100, 500, 1000, 5000)
+
+
+class RequestStats:
+    """What one request spent in the database; shared with the threadpool through a ContextVar."""
+
+    __slots__ = ("queries", "db_time", "pool_wait", "statements")
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.pool_wait = 0.0
+        self.statements = [] if SLOW_REQUEST_MS else None
+
+
+_current = ContextVar("request_stats", default=None)
+
+
+def _labels_text(names, values):
+    if not names:
+        return ""
+    pairs = ",".join(
+        '{}="{}"'.format(n, str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for n, v in zip(names, values)
+    )
+    return "{" + pairs + "}"
+
+
+class Counter:
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, *values):
+        with self._lock:
+            self._values[values] = self._values.get(values, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for values, total in items:
+            lines.append(f"{self.name}{_labels_text(self.labels, values)} {total}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help, buckets, labels=()):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(buckets)
+        self.labels = labels
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *values):
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(values)
+            if series is None:
+                series = self._series[values] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][i] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = sorted((k, (list(v[0]), v[1], v[2])) for k, v in self._series.items())
+        for values, (counts, total, count) in items:
+            cumulative = 0
+            for bound, n in zip((*self.buckets, "+Inf"), counts):
+                cumulative += n
+                names = (*self.labels, "le")
+                lines.append(f"{self.name}_bucket{_labels_text(names, (*values, bound))} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels_text(self.labels, values)} {total}")
+            lines.append(f"{self.name}_count{_labels_text(self.labels, values)} {count}")
+        return lines
+
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds", "Time to the last response byte.",
+    LATENCY_BUCKETS, ("method", "route", "status"),
+)
+REQUEST_QUERIES = Histogram(
+    "http_request_db_queries", "SQL statements executed per request.",
+    QUERY_COUNT_BUCKETS, ("route",),
+)
+REQUEST_DB_TIME = Histogram(
+    "http_request_db_seconds", "Time spent executing SQL per request.",
+    LATENCY_BUCKETS, ("route",),
+)
+POOL_WAIT = Histogram(
+    "db_pool_checkout_seconds", "Time to obtain a pooled connection (including pre-ping).",
+    LATENCY_BUCKETS,
+)
+BYTES_IN = Counter("http_request_bytes_total", "Request body bytes received.", ("route",))
+BYTES_OUT = Counter("http_response_bytes_total", "Response body bytes sent.", ("route",))
+SINGLE_FLIGHT_CALLS = Counter(
+    "single_flight_calls_total", "Coalesced loads by kind; role is leader, follower, timeout or error.",
+    ("kind", "role"),
+)
+IMAGE_UPLOADS = Counter(
+    "image_uploads_total", "Stored uploads; result is created or deduplicated (same content already on disk).",
+    ("result",),
+)
+
+_collectors = []
+
+
+def add_collector(fn):
+    """Register `fn() -> [(name, type, help, value)]`, evaluated on every scrape."""
+    _collectors.append(fn)
+    return fn
+
+
+def render_metrics():
+    lines = []
+    for metric in (
+        REQUEST_LATENCY, REQUEST_QUERIES, REQUEST_DB_TIME, POOL_WAIT, BYTES_IN, BYTES_OUT, SINGLE_FLIGHT_CALLS,
+        IMAGE_UPLOADS,
+    ):
+        lines.extend(metric.render())
+    for collector in _collectors:
+        try:
+            samples = collector()
+        except Exception:
+            logger.exception("Metrics collector failed")
+            continue
+        for name, kind, help, value in samples:
+            if value is None:
+                continue
+            lines += [f"# HELP {name} {help}", f"# TYPE {name} {kind}", f"{name} {value}"]
+    return "\n".join(lines) + "\n"
+
+
+# SQLAlchemy event hooks, attached to the engines in Database/dbGetConnection.py
+
+def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+
+def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["query_start"].pop()
+    stats = _current.get()
+    if stats is None:
+        return
+    stats.queries += 1
+    stats.db_time += elapsed
+    if stats.statements is not None and len(stats.statements) < SLOW_REQUEST_MAX_STATEMENTS:
+        stats.statements.append((elapsed, " ".join(statement.split())))
+
+
+def record_pool_wait(seconds):
+    POOL_WAIT.observe(seconds)
+    stats = _current.get()
+    if stats is not None:
+        stats.pool_wait += seconds
+
+
+def _route_label(scope):
+    """Route template with its include prefix, e.g. /products/products/{id}.
+
+    Unmatched paths share one label so scanners cannot blow up the series count.
+    """
+    route = scope.get("route")
+    template = getattr(route, "path_format", None)
+    if template is None:
+        return "unmatched"
+    try:
+        suffix = template.format(**scope.get("path_params", {}))
+    except (KeyError, IndexError, ValueError):
+        return template
+    path = scope.get("path", "")
+    return path[: len(path) - len(suffix)] + template if path.endswith(suffix) else template
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording latency, SQL work and bytes per route.
+
+    Plain ASGI rather than BaseHTTPMiddleware so streamed and file responses
+    pass through untouched.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats()
+        token = _current.set(stats)
+        start = time.perf_counter()
+        status = 500
+        bytes_in = 0
+        bytes_out = 0
+        declared_length = None
+
+        async def counting_receive():
+            nonlocal bytes_in
+            message = await receive()
+            if message["type"] == "http.request":
+                bytes_in += len(message.get("body", b""))
+            return message
+
+        async def timed_send(message):
+            nonlocal status, bytes_out, declared_length
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                headers = list(message.get("headers", []))
+                for name, value in headers:
+                    if name == b"content-length":
+                        declared_length = int(value)
+                if METRICS_SERVER_TIMING:
+                    elapsed = (time.perf_counter() - start) * 1000
+                    timing = (
+                        f'app;dur={elapsed:.1f}, db;dur={stats.db_time * 1000:.1f};desc="{stats.queries} queries", '
+                        f"pool;dur={stats.pool_wait * 1000:.1f}"
+                    )
+                    headers.append((b"server-timing", timing.encode()))
+                message = {**message, "headers": headers}
+            elif message["type"] == "http.response.body":
+                bytes_out += len(message.get("body", b""))
+            elif message["type"] == "http.response.pathsend" and declared_length is not None:
+                bytes_out += declared_length
+            await send(message)
+
+        try:
+            await self.app(scope, counting_receive, timed_send)
+        finally:
+            _current.reset(token)
+            elapsed = time.perf_counter() - start
+            route = _route_label(scope)
+            REQUEST_LATENCY.observe(elapsed, scope["method"], route, status)
+            REQUEST_QUERIES.observe(stats.queries, route)
+            REQUEST_DB_TIME.observe(stats.db_time, route)
+            if bytes_in:
+                BYTES_IN.inc(bytes_in, route)
+            if bytes_out:
+                BYTES_OUT.inc(bytes_out, route)
+            if SLOW_REQUEST_MS and elapsed * 1000 >= SLOW_REQUEST_MS:
+                statements = "".join(f"\n  {t * 1000:.1f}ms {sql}" for t, sql in stats.statements)
+                logger.warning(
+                    "Slow request %s %s: %.0fms, %d queries, %.0fms in SQL, %.0fms pool wait%s",
+                    scope["method"], scope["path"], elapsed * 1000, stats.queries,
+                    stats.db_time * 1000, stats.pool_wait * 1000, statements,
+                )
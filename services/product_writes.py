@@ -0,0 +1,233 @@
+import uuid
+from collections import Counter
+
+from sqlalchemy import text, bindparam
+
+# Child tables keyed by the name the API uses, with the column holding the value
+CHILD_TABLES = {
+    "details": ("details", "detail_text"),
+    "sub_categorys": ("sub_categorys", "sub_category_name"),
+    "images": ("products_imgs", "url"),
+}
+PRODUCT_WRITE_COLUMNS = ("title", "price", "category", "height", "width", "depth", "stock")
+
+
+class ProductNotFound(LookupError):
+    pass
+
+
+def _delete_by_ids(conn, table, ids):
+    if ids:
+        conn.execute(
+            text(f"DELETE FROM {table} WHERE id IN :ids").bindparams(bindparam("ids", expanding=True)),
+            {"ids": list(ids)},
+        )
+
+
+def insert_children(conn, name, product_id, values):
+    """Insert every value of one child table with a single executemany."""
+    table, column = CHILD_TABLES[name]
+    if values:
+        conn.execute(
+            text(f"INSERT INTO {table} (id, product_id, {column}) VALUES (:id, :product_id, :value)"),
+            [{"id": str(uuid.uuid4()), "product_id": product_id, "value": v} for v in values],
+        )
+
+
+def insert_variants(conn, product_id, variants):
+    """Insert variant rows, skipping repeats and those the product already has.
+
+    Uploads are content-addressed, so the same photo sent again (or twice in
+    one request) yields the same source url and the same variants.
+    """
+    variants = list({(v.source_url, v.size, v.format): v for v in variants}.values())
+    if variants:
+        stored = set(conn.execute(
+            text("""
+                SELECT source_url, variant_size, variant_format FROM products_img_variants
+                WHERE product_id = :id AND source_url IN :urls
+            """).bindparams(bindparam("urls", expanding=True)),
+            {"id": product_id, "urls": list({v.source_url for v in variants})},
+        ).all())
+        variants = [v for v in variants if (v.source_url, v.size, v.format) not in stored]
+    if variants:
+        conn.execute(
+            text("""
+                INSERT INTO products_img_variants (id, product_id, source_url, variant_size, variant_format, url)
+                VALUES (:id, :product_id, :source_url, :variant_size, :variant_format, :url)
+            """),
+            [
+                {
+                    "id": str(uuid.uuid4()),
+                    "product_id": product_id,
+                    "source_url": v.source_url,
+                    "variant_size": v.size,
+                    "variant_format": v.format,
+                    "url": v.url,
+                }
+                for v in variants
+            ]
+        )
+
+
+def diff_rows(stored, target):
+    """Row ids to delete and values to insert so `stored` [(id, value)] holds `target`.
+
+    Values are compared as a multiset, so unchanged rows keep their ids and
+    repeated values are respected.
+    """
+    wanted = Counter(target)
+    delete_ids = []
+    for row_id, value in stored:
+        if wanted[value] > 0:
+            wanted[value] -= 1
+        else:
+            delete_ids.append(row_id)
+    inserts = []
+    for value in target:
+        if wanted[value] > 0:
+            wanted[value] -= 1
+            inserts.append(value)
+    return delete_ids, inserts
+
+
+def sync_children(conn, name, product_id, target=None, keep=None, append=()):
+    """Bring one child table of a product in line and return the values removed.
+
+    Either `target` is the complete new list, or the stored values are
+    filtered by `keep` (None keeps all) and `append` is added after them.
+    At most one SELECT, one DELETE and one executemany INSERT are issued.
+    """
+    table, column = CHILD_TABLES[name]
+    stored = conn.execute(
+        text(f"SELECT id, {column} FROM {table} WHERE product_id = :id ORDER BY id"),
+        {"id": product_id},
+    ).all()
+    if target is None:
+        keep = None if keep is None else set(keep)
+        target = [value for _, value in stored if keep is None or value in keep] + list(append)
+    delete_ids, inserts = diff_rows(stored, target)
+    _delete_by_ids(conn, table, delete_ids)
+    insert_children(conn, name, product_id, inserts)
+    removed = set(delete_ids)
+    return [value for row_id, value in stored if row_id in removed]
+
+
+def set_main_image(conn, product_id, url):
+    """Point the product's main image at `url`; returns the url it replaced, if any."""
+    old = conn.execute(
+        text("SELECT url FROM products_main_imgs WHERE product_id = :id"), {"id": product_id}
+    ).scalar()
+    if old is None:
+        conn.execute(
+            text("INSERT INTO products_main_imgs (id, product_id, url) VALUES (:id, :product_id, :url)"),
+            {"id": str(uuid.uuid4()), "product_id": product_id, "url": url},
+        )
+    elif old != url:
+        conn.execute(
+            text("UPDATE products_main_imgs SET url = :url WHERE product_id = :id"),
+            {"id": product_id, "url": url},
+        )
+    return old if old != url else None
+
+
+def _orphaned_urls(conn, urls):
+    """Those of `urls` no product references any more."""
+    if not urls:
+        return []
+    query = text("""
+        SELECT url FROM products_main_imgs WHERE url IN :urls
+        UNION SELECT url FROM products_imgs WHERE url IN :urls
+    """).bindparams(bindparam("urls", expanding=True))
+    referenced = set(conn.execute(query, {"urls": list(urls)}).scalars())
+    return [u for u in urls if u not in referenced]
+
+
+def _variant_sources(conn, product_id, urls):
+    """`urls` with variant urls (as sent by listings) mapped back to their originals."""
+    sources = dict(conn.execute(
+        text("SELECT url, source_url FROM products_img_variants WHERE product_id = :id AND url IN :urls")
+        .bindparams(bindparam("urls", expanding=True)),
+        {"id": product_id, "urls": list(urls)},
+    ).all())
+    return [sources.get(u, u) for u in urls]
+
+
+def _drop_variants(conn, product_id, source_urls):
+    """Delete the variant rows made from those of `source_urls` the product no longer uses.
+
+    Returns (source_url, url) pairs. A replaced gallery image can still be the
+    main image (or another gallery entry) with the same content-addressed url.
+    """
+    in_use = set(conn.execute(
+        text("""
+            SELECT url FROM products_main_imgs WHERE product_id = :id AND url IN :urls
+            UNION SELECT url FROM products_imgs WHERE product_id = :id AND url IN :urls
+        """).bindparams(bindparam("urls", expanding=True)),
+        {"id": product_id, "urls": list(source_urls)},
+    ).scalars())
+    source_urls = [u for u in source_urls if u not in in_use]
+    if not source_urls:
+        return []
+    params = {"id": product_id, "urls": list(source_urls)}
+    rows = conn.execute(
+        text("SELECT source_url, url FROM products_img_variants WHERE product_id = :id AND source_url IN :urls")
+        .bindparams(bindparam("urls", expanding=True)),
+        params,
+    ).all()
+    if rows:
+        conn.execute(
+            text("DELETE FROM products_img_variants WHERE product_id = :id AND source_url IN :urls")
+            .bindparams(bindparam("urls", expanding=True)),
+            params,
+        )
+    return [tuple(row) for row in rows]
+
+
+def update_product(conn, product_id, fields, details=None, sub_categories=None, main_image=None,
+                   new_images=(), keep_images=None, variants=()):
+    """Apply a (partial) update; only what is passed is touched.
+
+    `fields` holds the Products columns to change. `details` and
+    `sub_categories` replace those lists when not None. `main_image` replaces
+    the main image; `new_images` are appended to the gallery and, when given,
+    `keep_images` lists the stored gallery urls to keep. Returns the previous
+    category and the image urls (originals and variants) that are no longer
+    referenced; the image GC removes their files.
+    """
+    old_category = conn.execute(
+        text("SELECT category FROM Products WHERE id = :id"), {"id": product_id}
+    ).scalar()
+    if old_category is None:
+        raise ProductNotFound(product_id)
+
+    columns = [c for c in PRODUCT_WRITE_COLUMNS if c in fields]
+    if columns:
+        conn.execute(
+            text(f"UPDATE Products SET {', '.join(f'{c} = :{c}' for c in columns)} WHERE id = :id"),
+            {"id": product_id, **{c: fields[c] for c in columns}},
+        )
+
+    if details is not None:
+        sync_children(conn, "details", product_id, target=details)
+    if sub_categories is not None:
+        sync_children(conn, "sub_categorys", product_id, target=sub_categories)
+
+    replaced = []
+    if keep_images:
+        keep_images = _variant_sources(conn, product_id, keep_images)
+    if keep_images is not None or new_images:
+        replaced += sync_children(conn, "images", product_id, keep=keep_images, append=new_images)
+    if main_image is not None:
+        old_main = set_main_image(conn, product_id, main_image)
+        if old_main:
+            replaced.append(old_main)
+
+    removed = []
+    if replaced:
+        variants_dropped = _drop_variants(conn, product_id, replaced)
+        orphaned = _orphaned_urls(conn, replaced)
+        # Variant files are named after their source, so they go with it
+        removed = orphaned + [url for source, url in variants_dropped if source in orphaned]
+    insert_variants(conn, product_id, variants)
+    return old_category, removed
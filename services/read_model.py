@@ -0,0 +1,183 @@
+"""Pre-serialized product documents and per-category list blobs.
+
+    python -m services.read_model rebuild      # backfill every document
+    python -m services.read_model rebuild --category Cables
+
+With READ_MODEL=1 the write endpoints regenerate the affected documents
+inside their own transaction, and the read endpoints send the stored bytes
+as they are.
+"""
+import argparse
+import os
+
+from dotenv import load_dotenv
+from sqlalchemy import text, bindparam
+
+from services.encoding import dumps
+from services.hydration import fetch_products_by_ids, list_product_page
+from services.image_variants import apply_image_size, DEFAULT_LIST_IMAGE_SIZE, IMAGE_SIZES
+
+load_dotenv()
+
+READ_MODEL = os.getenv("READ_MODEL", "0") == "1"
+# Image sizes list documents are kept for (without the image_variants map)
+READ_MODEL_SIZES = tuple(dict.fromkeys(
+    ["original", *[s.strip() for s in (os.getenv("READ_MODEL_SIZES") or DEFAULT_LIST_IMAGE_SIZE).split(",")]]
+))
+# Key of the document GET /products/{id} returns: the product as stored, variants included
+DETAIL_DOCUMENT = "detail"
+REBUILD_PAGE_SIZE = 1000
+
+for _size in READ_MODEL_SIZES:
+    if _size not in IMAGE_SIZES:
+        raise ValueError(f"Unknown image size in READ_MODEL_SIZES: {_size}")
+
+
+def encode(content):
+    # Same bytes the catalog reads send for this content
+    return dumps(content).decode("utf-8")
+
+
+def _for_update(conn):
+    # Locking read so concurrent writers to one category rebuild from committed rows
+    return " FOR UPDATE" if conn.dialect.name == "mysql" else ""
+
+
+def _write_product_documents(conn, products):
+    rows = [
+        {
+            "product_id": product["id"],
+            "image_size": size,
+            "category": product["category"],
+            "document": encode(product if size == DETAIL_DOCUMENT else apply_image_size(product, size)),
+        }
+        for product in products
+        for size in (DETAIL_DOCUMENT, *READ_MODEL_SIZES)
+    ]
+    if rows:
+        conn.execute(
+            text("INSERT INTO product_documents (product_id, image_size, category, document) "
+                 "VALUES (:product_id, :image_size, :category, :document)"),
+            rows,
+        )
+
+
+def _delete_product_documents(conn, product_ids):
+    conn.execute(
+        text("DELETE FROM product_documents WHERE product_id IN :ids").bindparams(bindparam("ids", expanding=True)),
+        {"ids": list(product_ids)},
+    )
+
+
+def refresh_category_documents(conn, categories):
+    """Rebuild the list blob of each category (per image size) from its product documents."""
+    for category in dict.fromkeys(c for c in categories if c is not None):
+        conn.execute(text("DELETE FROM category_documents WHERE category = :category"), {"category": category})
+        for size in READ_MODEL_SIZES:
+            documents = conn.execute(
+                text("SELECT document FROM product_documents WHERE category = :category AND image_size = :size "
+                     "ORDER BY product_id" + _for_update(conn)),
+                {"category": category, "size": size},
+            ).scalars().all()
+            if documents:
+                conn.execute(
+                    text("INSERT INTO category_documents (category, image_size, product_count, document) "
+                         "VALUES (:category, :size, :count, :document)"),
+                    {"category": category, "size": size, "count": len(documents),
+                     "document": "[" + ",".join(documents) + "]"},
+                )
+
+
+def refresh_documents(conn, product_ids, categories=(), rebuild_categories=True):
+    """Regenerate the documents of `product_ids` in the caller's transaction.
+
+    `categories` are the categories the products were in before the write;
+    their blobs are rebuilt along with the current ones. With
+    `rebuild_categories=False` the blobs are only dropped (reads fall back to
+    the regular path) so a bulk import can rebuild them once at the end.
+    """
+    if not READ_MODEL or not product_ids:
+        return
+    products = fetch_products_by_ids(conn, list(product_ids))
+    _delete_product_documents(conn, product_ids)
+    _write_product_documents(conn, products.values())
+    affected = [*categories, *(p["category"] for p in products.values())]
+    if rebuild_categories:
+        refresh_category_documents(conn, affected)
+    else:
+        drop_category_documents(conn, affected)
+
+
+def drop_category_documents(conn, categories):
+    categories = list(dict.fromkeys(c for c in categories if c is not None))
+    if READ_MODEL and categories:
+        conn.execute(
+            text("DELETE FROM category_documents WHERE category IN :categories")
+            .bindparams(bindparam("categories", expanding=True)),
+            {"categories": categories},
+        )
+
+
+def get_product_document(conn, product_id):
+    return conn.execute(
+        text("SELECT category, document FROM product_documents WHERE product_id = :id AND image_size = :size"),
+        {"id": product_id, "size": DETAIL_DOCUMENT},
+    ).first()
+
+
+def get_product_documents(conn, product_ids, image_size="original"):
+    """{product_id: (category, document)} for those of `product_ids` that have a document."""
+    rows = conn.execute(
+        text("SELECT product_id, category, document FROM product_documents "
+             "WHERE product_id IN :ids AND image_size = :size").bindparams(bindparam("ids", expanding=True)),
+        {"ids": list(product_ids), "size": image_size},
+    ).all()
+    return {row.product_id: (row.category, row.document) for row in rows}
+
+
+def get_category_document(conn, category, image_size):
+    return conn.execute(
+        text("SELECT document FROM category_documents WHERE category = :category AND image_size = :size"),
+        {"category": category, "size": image_size},
+    ).scalar()
+
+
+def rebuild(engine, category=None):
+    """Backfill documents page by page, then every category blob. Returns the product count."""
+    count = 0
+    cursor = None
+    while True:
+        with engine.begin() as conn:
+            page, cursor = list_product_page(conn, category=category, limit=REBUILD_PAGE_SIZE, cursor=cursor)
+            if page:
+                _delete_product_documents(conn, [p["id"] for p in page])
+                _write_product_documents(conn, page)
+            count += len(page)
+        if not cursor:
+            break
+    with engine.begin() as conn:
+        if category is None:
+            # Drop documents of products that no longer exist
+            conn.execute(text("DELETE FROM product_documents WHERE product_id NOT IN (SELECT id FROM Products)"))
+            conn.execute(text("DELETE FROM category_documents"))
+            categories = conn.execute(text("SELECT DISTINCT category FROM Products")).scalars().all()
+        else:
+            categories = [category]
+        refresh_category_documents(conn, categories)
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Maintain the pre-serialized product documents.")
+    parser.add_argument("command", choices=["rebuild"])
+    parser.add_argument("--category", default=None, help="Only rebuild this category")
+    args = parser.parse_args()
+
+    from Database.dbGetConnection import engine
+
+    count = rebuild(engine, category=args.category)
+    print(f"Rebuilt documents for {count} products")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,233 @@
+import heapq
+import math
+import re
+import threading
+import unicodedata
+from bisect import bisect_left, insort
+
+# Weight of a token depending on the field it was found in
+FIELD_WEIGHTS = {"title": 3.0, "sub_categorys": 2.0, "details_list": 1.0}
+# Prefix matches score lower than whole-word matches
+PREFIX_FACTOR = 0.6
+MAX_PREFIX_EXPANSIONS = 64
+
+STOPWORDS = {
+    "a", "al", "con", "de", "del", "el", "en", "la", "las", "lo", "los",
+    "o", "para", "por", "se", "sin", "su", "un", "una", "y",
+}
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def fold(value):
+    """Lowercase and strip accents: 'Lámpara Eléctrica' -> 'lampara electrica'."""
+    if value.isascii():
+        return value.lower()
+    decomposed = unicodedata.normalize("NFKD", value)
+    return "".join(c for c in decomposed if not unicodedata.combining(c)).lower()
+
+
+_VOWELS = set("aeiou")
+
+
+def stem(token):
+    """Light Spanish plural folding: singular and plural share one stem.
+
+    The plural 's' goes, then an 'e' after a consonant, so 'cable' and
+    'cables' give 'cabl', 'interruptores' gives 'interruptor' and 'lamparas'
+    gives 'lampara'.
+    """
+    if len(token) > 3 and token.endswith("s"):
+        token = token[:-1]
+    if len(token) > 3 and token.endswith("e") and token[-2].isalpha() and token[-2] not in _VOWELS:
+        token = token[:-1]
+    return token
+
+
+def tokenize(value):
+    return [stem(t) for t in _TOKEN_RE.findall(fold(value or "")) if t not in STOPWORDS]
+
+
+class SearchIndex:
+    """Inverted index over title, details and sub-categories of the catalog.
+
+    Every token keeps a dict of product id -> weight for lookups and the same
+    posting as a list sorted by descending weight, so queries can stop as soon
+    as the remaining entries cannot reach the current top results.
+    """
+
+    def __init__(self):
+        self._postings = {}
+        self._ranked = {}
+        self._doc_tokens = {}
+        self._tokens = []
+        self._lock = threading.RLock()
+        self.ready = False
+        self.stale = False
+
+    def __len__(self):
+        return len(self._doc_tokens)
+
+    def _weights(self, product):
+        weights = {}
+        for token in tokenize(product.get("title")):
+            weights[token] = weights.get(token, 0.0) + FIELD_WEIGHTS["title"]
+        for field in ("sub_categorys", "details_list"):
+            for value in product.get(field) or []:
+                for token in tokenize(value):
+                    weights[token] = weights.get(token, 0.0) + FIELD_WEIGHTS[field]
+        return weights
+
+    def _remove_locked(self, product_id):
+        for token in self._doc_tokens.pop(product_id, ()):
+            posting = self._postings.get(token)
+            if posting is None or product_id not in posting:
+                continue
+            ranked = self._ranked[token]
+            i = bisect_left(ranked, (-posting.pop(product_id), product_id))
+            del ranked[i]
+            if not posting:
+                del self._postings[token]
+                del self._ranked[token]
+                i = bisect_left(self._tokens, token)
+                if i < len(self._tokens) and self._tokens[i] == token:
+                    del self._tokens[i]
+
+    def index(self, product):
+        weights = self._weights(product)
+        product_id = product["id"]
+        with self._lock:
+            self._remove_locked(product_id)
+            for token, weight in weights.items():
+                posting = self._postings.get(token)
+                if posting is None:
+                    posting = self._postings[token] = {}
+                    self._ranked[token] = []
+                    insort(self._tokens, token)
+                posting[product_id] = weight
+                insort(self._ranked[token], (-weight, product_id))
+            self._doc_tokens[product_id] = tuple(weights)
+
+    def remove(self, product_id):
+        with self._lock:
+            self._remove_locked(product_id)
+
+    def rebuild(self, products):
+        postings = {}
+        doc_tokens = {}
+        for product in products:
+            weights = self._weights(product)
+            for token, weight in weights.items():
+                postings.setdefault(token, {})[product["id"]] = weight
+            doc_tokens[product["id"]] = tuple(weights)
+        ranked = {
+            token: sorted((-weight, pid) for pid, weight in posting.items())
+            for token, posting in postings.items()
+        }
+        with self._lock:
+            self._postings = postings
+            self._ranked = ranked
+            self._doc_tokens = doc_tokens
+            self._tokens = sorted(postings)
+            self.ready = True
+            self.stale = False
+
+    def _expand(self, token, prefix):
+        """(token, factor) pairs a query token matches."""
+        matches = []
+        if token in self._postings:
+            matches.append((token, 1.0))
+        if prefix:
+            i = bisect_left(self._tokens, token)
+            while i < len(self._tokens) and len(matches) < MAX_PREFIX_EXPANSIONS:
+                candidate = self._tokens[i]
+                if not candidate.startswith(token):
+                    break
+                if candidate != token:
+                    matches.append((candidate, PREFIX_FACTOR))
+                i += 1
+        return matches
+
+    def _stream(self, scaled):
+        """(score, id) pairs of one query term, best first, each id once."""
+        def scaled_stream(ranked, scale):
+            return ((negative * scale, pid) for negative, pid in ranked)
+
+        streams = [scaled_stream(self._ranked[token], scale) for token, scale in scaled]
+        seen = set()
+        for negative, pid in heapq.merge(*streams):
+            if pid not in seen:
+                seen.add(pid)
+                yield -negative, pid
+
+    def search(self, query, limit=20, prefix=True):
+        """Ranked (product_id, score) pairs matching every query token.
+
+        With `prefix`, the last token also matches longer words (autocomplete),
+        as typed and stemmed, so 'lamp' and 'lamparas' both find 'Lámpara';
+        the others must match whole words.
+        """
+        words = _TOKEN_RE.findall(fold(query or ""))
+        if not words:
+            return []
+        # Each query term is the forms it may take in the index
+        last = words[-1]
+        terms_forms = [(stem(t),) for t in words[:-1] if t not in STOPWORDS]
+        if prefix:
+            # A trailing stopword may still be the start of a longer word
+            terms_forms.append(tuple(dict.fromkeys((last, stem(last)))))
+        elif last not in STOPWORDS:
+            terms_forms.append((stem(last),))
+        terms_forms = list(dict.fromkeys(terms_forms))
+        if not terms_forms:
+            return []
+
+        with self._lock:
+            total = max(len(self._doc_tokens), 1)
+            terms = []
+            for n, forms in enumerate(terms_forms):
+                expand = prefix and n == len(terms_forms) - 1
+                found = {}
+                for form in forms:
+                    for match, factor in self._expand(form, expand):
+                        found[match] = max(factor, found.get(match, 0.0))
+                matches = list(found.items())
+                if not matches:
+                    return []
+                scaled = [
+                    (m, math.log(1 + total / len(self._postings[m])) * factor)
+                    for m, factor in matches
+                ]
+                size = sum(len(self._postings[m]) for m, _ in scaled)
+                best = max(-self._ranked[m][0][0] * scale for m, scale in scaled)
+                terms.append((size, scaled, best))
+
+            # Drive the query from the rarest term, best entries first, and look
+            # the candidates up in the other terms
+            terms.sort(key=lambda term: term[0])
+            _, driving, _ = terms[0]
+            others = [scaled for _, scaled, _ in terms[1:]]
+            others_best = sum(best for _, _, best in terms[1:])
+
+            top = []
+            for score, pid in self._stream(driving):
+                if len(top) >= limit and top[0][0] >= score + others_best:
+                    break
+                for scaled in others:
+                    best = 0.0
+                    for token, scale in scaled:
+                        weight = self._postings[token].get(pid)
+                        if weight is not None and weight * scale > best:
+                            best = weight * scale
+                    if not best:
+                        break
+                    score += best
+                else:
+                    if len(top) < limit:
+                        heapq.heappush(top, (score, pid))
+                    elif (score, pid) > top[0]:
+                        heapq.heapreplace(top, (score, pid))
+        return [(pid, score) for score, pid in sorted(top, key=lambda item: (-item[0], item[1]))]
+
+
+search_index = SearchIndex()
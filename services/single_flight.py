@@ -0,0 +1,119 @@
+import asyncio
+import logging
+import os
+import threading
+from collections import OrderedDict
+
+from dotenv import load_dotenv
+
+from services.metrics import SINGLE_FLIGHT_CALLS
+
+load_dotenv()
+
+logger = logging.getLogger("uvicorn.error")
+
+SINGLE_FLIGHT = os.getenv("SINGLE_FLIGHT", "1") == "1"
+# Seconds a request waits on someone else's load before running its own
+SINGLE_FLIGHT_WAIT = float(os.getenv("SINGLE_FLIGHT_WAIT") or "10")
+# Keys whose counters are kept for /admin/single-flight (least recently used are dropped)
+SINGLE_FLIGHT_TRACKED_KEYS = int(os.getenv("SINGLE_FLIGHT_TRACKED_KEYS") or "500")
+
+
+class SingleFlight:
+    """Let concurrent callers with the same key share one in-flight load.
+
+    The first caller (the leader) runs the load; callers arriving while it
+    runs await the same result, or get the same exception. A follower waits
+    at most `wait` seconds and then loads on its own. If the leader is
+    cancelled, the followers elect a new one instead of failing.
+    Per process: each uvicorn worker coalesces its own requests.
+    """
+
+    def __init__(self, wait=SINGLE_FLIGHT_WAIT, tracked_keys=SINGLE_FLIGHT_TRACKED_KEYS, enabled=SINGLE_FLIGHT):
+        self.wait = wait
+        self.tracked_keys = tracked_keys
+        self.enabled = enabled
+        self._inflight = {}
+        self._keys = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _count(self, key, role):
+        SINGLE_FLIGHT_CALLS.inc(1, key[0], role)
+        with self._lock:
+            counts = self._keys.pop(key, None) or {"leader": 0, "follower": 0, "timeout": 0, "error": 0}
+            counts[role] += 1
+            self._keys[key] = counts
+            while len(self._keys) > self.tracked_keys:
+                self._keys.popitem(last=False)
+
+    async def do(self, key, fn, *args, **kwargs):
+        """Await `fn(*args, **kwargs)`, shared with concurrent calls for `key`.
+
+        `key` is a tuple whose first item names the kind of load (used as
+        the metrics label).
+        """
+        if not self.enabled:
+            return await fn(*args, **kwargs)
+        while True:
+            future = self._inflight.get(key)
+            if future is None:
+                break
+            self._count(key, "follower")
+            try:
+                return await asyncio.wait_for(asyncio.shield(future), self.wait)
+            except asyncio.TimeoutError:
+                self._count(key, "timeout")
+                logger.warning("Single-flight wait for %r exceeded %ss; loading separately", key, self.wait)
+                return await fn(*args, **kwargs)
+            except asyncio.CancelledError:
+                if not future.cancelled():
+                    raise
+                # The leader was cancelled; take over the load
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        self._count(key, "leader")
+        try:
+            result = await fn(*args, **kwargs)
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            self._count(key, "error")
+            future.set_exception(e)
+            # Nobody may be waiting; keep asyncio from logging "exception never retrieved"
+            future.exception()
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
+
+    def forget(self):
+        """Make calls from now on start a fresh load (after a write).
+
+        Loads already running still complete for the callers waiting on them.
+        """
+        self._inflight.clear()
+
+    def stats(self, top=20):
+        with self._lock:
+            keys = list(self._keys.items())
+        totals = {"leader": 0, "follower": 0, "timeout": 0, "error": 0}
+        for _, counts in keys:
+            for role, value in counts.items():
+                totals[role] += value
+        hottest = sorted(keys, key=lambda item: item[1]["follower"], reverse=True)[:top]
+        return {
+            "enabled": self.enabled,
+            "wait": self.wait,
+            "in_flight": len(self._inflight),
+            "tracked_keys": len(keys),
+            "tracked_totals": totals,
+            "hottest": [{"key": list(key), **counts} for key, counts in hottest],
+        }
+
+
+read_flight = SingleFlight()
@@ -0,0 +1,141 @@
+import asyncio
+import logging
+import os
+import time
+import uuid
+
+# Taken before the imports below so the startup log covers loading the app
+_imported_at = time.perf_counter()
+
+from dotenv import load_dotenv
+
+from Database.dbGetConnection import DB_POOL_SIZE, DB_POOL_WARMUP
+from services.images import IMAGES_DIR
+from services.image_variants import DEFAULT_LIST_IMAGE_SIZE, IMAGE_SIZES
+from services.mail_queue import mail_settings, MailNotConfigured
+
+load_dotenv()
+
+logger = logging.getLogger("uvicorn.error")
+
+# Seconds between retries of startup steps that failed (e.g. the database was not up yet)
+STARTUP_RETRY_SECONDS = float(os.getenv("STARTUP_RETRY_SECONDS") or "5")
+
+class ConfigError(RuntimeError):
+    pass
+
+
+def check_images_dir(path):
+    """Create IMAGES_DIR if needed and make sure this process can write to it."""
+    os.makedirs(path, exist_ok=True)
+    probe = os.path.join(path, f".write-test-{uuid.uuid4().hex}")
+    with open(probe, "wb") as f:
+        f.write(b"ok")
+    os.remove(probe)
+
+
+def validate_config():
+    """Check the settings once at startup; raises ConfigError listing every problem.
+
+    Returns warnings for settings that only disable a feature.
+    """
+    errors, warnings = [], []
+    if not os.getenv("DATABASE_URL"):
+        missing = [name for name in ("HOST", "DATABASE") if not os.getenv(name)]
+        if missing:
+            errors.append(f"DATABASE_URL or {', '.join(missing)} must be set")
+    try:
+        check_images_dir(IMAGES_DIR)
+    except OSError as e:
+        errors.append(f"IMAGES_DIR {IMAGES_DIR!r} is not writable: {e}")
+    if DEFAULT_LIST_IMAGE_SIZE not in IMAGE_SIZES:
+        errors.append(f"DEFAULT_LIST_IMAGE_SIZE must be one of {', '.join(IMAGE_SIZES)}")
+    if DB_POOL_WARMUP > DB_POOL_SIZE:
+        warnings.append(f"DB_POOL_WARMUP ({DB_POOL_WARMUP}) is capped at DB_POOL_SIZE ({DB_POOL_SIZE})")
+    try:
+        mail_settings()
+    except MailNotConfigured as e:
+        warnings.append(f"Contact mail disabled: {e}")
+    if not os.getenv("ADMIN_TOKEN"):
+        warnings.append("Admin endpoints disabled: ADMIN_TOKEN is not set")
+
+    if errors:
+        raise ConfigError("Invalid configuration: " + "; ".join(errors))
+    for warning in warnings:
+        logger.warning(warning)
+    return warnings
+
+
+class Startup:
+    """Timed startup steps; the worker is ready once every step has succeeded.
+
+    A failed step does not stop the worker: it is retried in the background
+    and /health/ready answers 503 until it goes through.
+    """
+
+    def __init__(self):
+        self.began = None
+        self.steps = {}
+        self.pending = []
+        self.ready = False
+        self.ready_seconds = None
+        self._retry_task = None
+
+    def begin(self):
+        self.began = time.perf_counter()
+        self.steps["imports"] = round(self.began - _imported_at, 3)
+
+    async def run(self, name, fn, retry=False):
+        started = time.perf_counter()
+        try:
+            await fn()
+        except Exception as e:
+            if retry:
+                logger.warning("Startup step %r still failing: %s", name, e)
+            else:
+                logger.exception("Startup step %r failed; retrying every %ss", name, STARTUP_RETRY_SECONDS)
+            self.pending.append((name, fn))
+            return False
+        self.steps[name] = round(time.perf_counter() - started, 3)
+        return True
+
+    def finish(self):
+        if self.pending:
+            self._retry_task = asyncio.create_task(self._retry())
+        else:
+            self._mark_ready()
+
+    def _mark_ready(self):
+        self.ready = True
+        self.ready_seconds = round(time.perf_counter() - _imported_at, 3)
+        logger.info(
+            "Ready in %.2fs (%s)", self.ready_seconds,
+            ", ".join(f"{name} {seconds:.2f}s" for name, seconds in self.steps.items()),
+        )
+
+    async def _retry(self):
+        while self.pending:
+            await asyncio.sleep(STARTUP_RETRY_SECONDS)
+            pending, self.pending = self.pending, []
+            for name, fn in pending:
+                await self.run(name, fn, retry=True)
+        self._mark_ready()
+
+    async def stop(self):
+        if self._retry_task is not None:
+            self._retry_task.cancel()
+            try:
+                await self._retry_task
+            except asyncio.CancelledError:
+                pass
+
+    def status(self):
+        return {
+            "ready": self.ready,
+            "ready_seconds": self.ready_seconds,
+            "steps": dict(self.steps),
+            "pending": [name for name, _ in self.pending],
+        }
+
+
+startup = Startup()
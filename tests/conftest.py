@@ -0,0 +1,86 @@
+"""Shared fixtures: a seeded SQLite catalog and the app pointed at it.
+
+Settings are read when the modules are imported, so the environment is set
+here, before anything from the app is imported.
+"""
+import os
+import tempfile
+import uuid
+
+import pytest
+
+WORKDIR = tempfile.mkdtemp(prefix="catalog-tests-")
+DATABASE_URL = f"sqlite:///{os.path.join(WORKDIR, 'catalog.db')}"
+IMAGES_DIR = os.path.join(WORKDIR, "images") + "/"
+IMAGES_BASE_URL = "http://testserver/images"
+
+os.environ.update({
+    "DATABASE_URL": DATABASE_URL,
+    "IMAGES_DIR": IMAGES_DIR,
+    "IMAGES_BASE_URL": IMAGES_BASE_URL,
+    "MAIL_SPOOL_DIR": os.path.join(WORKDIR, "spool") + "/",
+    "IMAGE_GC": "0",
+})
+
+from sqlalchemy import event  # noqa: E402
+
+from benchmarks.seed import seed  # noqa: E402
+from Database.dbGetConnection import engine  # noqa: E402
+from services.product_writes import insert_children, set_main_image  # noqa: E402
+
+CATALOG_SIZE = 60
+
+
+@pytest.fixture(scope="session")
+def catalog():
+    """Ids of the seeded products."""
+    return seed(DATABASE_URL, CATALOG_SIZE, IMAGES_DIR, IMAGES_BASE_URL, image_files=10)
+
+
+@pytest.fixture(scope="session")
+def app(catalog):
+    from main import app
+
+    return app
+
+
+@pytest.fixture(scope="module")
+def client(app):
+    from fastapi.testclient import TestClient
+
+    with TestClient(app) as client:
+        yield client
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture
+def statements():
+    """SQL of every statement sent to the database while the test runs."""
+    executed = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        executed.append(statement)
+
+    event.listen(engine, "before_cursor_execute", record)
+    yield executed
+    event.remove(engine, "before_cursor_execute", record)
+
+
+@pytest.fixture
+def product(catalog):
+    """A product of its own, with three details, two sub-categories and two gallery images."""
+    product_id = str(uuid.uuid4())
+    with engine.begin() as conn:
+        conn.exec_driver_sql(
+            "INSERT INTO Products (id, title, price, category, stock) VALUES (?, ?, ?, ?, ?)",
+            (product_id, "Lámpara de prueba", 100.0, "Iluminación", 1),
+        )
+        insert_children(conn, "details", product_id, ["220V", "IP65", "Garantía 1 año"])
+        insert_children(conn, "sub_categorys", product_id, ["Lámpara A", "Led B"])
+        insert_children(conn, "images", product_id, [f"{IMAGES_BASE_URL}/bench-00001.jpg", f"{IMAGES_BASE_URL}/bench-00002.jpg"])
+        set_main_image(conn, product_id, f"{IMAGES_BASE_URL}/bench-00000.jpg")
+    return product_id
@@ -0,0 +1,41 @@
+"""The /admin endpoints need the admin token."""
+import pytest
+
+import routers.admin as admin
+
+TOKEN = "admin-secret"
+
+
+@pytest.fixture
+def token(monkeypatch):
+    monkeypatch.setattr(admin, "ADMIN_TOKEN", TOKEN)
+
+
+@pytest.mark.parametrize("method, url", [
+    ("get", "/admin/db/pool"), ("get", "/admin/single-flight"),
+    ("get", "/admin/images/gc"), ("post", "/admin/images/gc?dry_run=true"),
+])
+def test_admin_endpoints_need_the_token(client, token, method, url):
+    assert getattr(client, method)(url).status_code == 401
+    assert getattr(client, method)(url, headers={"Authorization": "Bearer wrong"}).status_code == 401
+    assert getattr(client, method)(url, headers={"Authorization": f"Bearer {TOKEN}"}).status_code == 200
+    assert getattr(client, method)(url, headers={"X-Admin-Token": TOKEN}).status_code == 200
+
+
+def test_admin_endpoints_are_disabled_without_a_token(client, monkeypatch):
+    monkeypatch.setattr(admin, "ADMIN_TOKEN", "")
+    assert client.get("/admin/db/pool").status_code == 403
+    assert client.get("/admin/db/pool", headers={"Authorization": "Bearer "}).status_code == 403
+
+
+def test_gc_cannot_be_forced_over_http(client, token, monkeypatch):
+    runs = []
+
+    async def run(dry_run=False, force=False):
+        runs.append(force)
+        return {"dry_run": dry_run}
+
+    monkeypatch.setattr(admin.image_gc, "run", run)
+    response = client.post("/admin/images/gc?dry_run=true&force=true", headers={"Authorization": f"Bearer {TOKEN}"})
+    assert response.status_code == 200
+    assert runs == [False]
@@ -0,0 +1,87 @@
+"""Catalog cache shared between workers (CATALOG_CACHE_SHARED=1)."""
+import pytest
+from sqlalchemy import text
+
+import routers.products as products
+import services.catalog_cache as cache_module
+from Database.dbGetConnection import engine
+from services.catalog_cache import CatalogCache, bump_shared_version, category_key, product_key
+from services.change_feed import UPSERT, record_changes
+from services.search_index import search_index
+
+
+@pytest.fixture
+def shared(monkeypatch):
+    for module in (products, cache_module):
+        monkeypatch.setattr(module, "CATALOG_CACHE_SHARED", True)
+    monkeypatch.setattr(cache_module, "CATALOG_CACHE_VERSION_CHECK", 0)
+
+
+def _other_worker_writes(*changes):
+    with engine.begin() as conn:
+        bump_shared_version(conn)
+        record_changes(conn, UPSERT, changes)
+
+
+def _sync(cache):
+    with engine.connect() as conn:
+        return cache.sync_shared_version(conn)
+
+
+@pytest.fixture
+def cache(catalog, shared):
+    cache = CatalogCache()
+    _sync(cache)
+    cache.events = []
+    cache.add_listener(lambda keys, changed: cache.events.append((keys, changed)))
+    for product_id in catalog[:3]:
+        cache.put(product_key(product_id), {"id": product_id})
+    cache.put(category_key(None), list(catalog))
+    cache.put(category_key("Iluminación"), list(catalog))
+    return cache
+
+
+def test_sync_drops_only_what_another_worker_wrote(cache, catalog):
+    before = _sync(cache)
+    _other_worker_writes((catalog[0], "Iluminación"))
+
+    assert _sync(cache) == before + 1
+    assert cache.get(product_key(catalog[0])) is None
+    assert cache.get(product_key(catalog[1])) == {"id": catalog[1]}
+    assert cache.get(product_key(catalog[2])) == {"id": catalog[2]}
+    assert cache.get(category_key("Iluminación")) is None
+    assert cache.get(category_key(None)) is None
+    assert cache.events[-1][1] == [catalog[0]]
+
+    # Nothing new: nothing more is dropped
+    cache.put(product_key(catalog[0]), {"id": catalog[0]})
+    _sync(cache)
+    assert cache.get(product_key(catalog[0])) == {"id": catalog[0]}
+    assert len(cache.events) == 1
+
+
+def test_sync_drops_everything_when_the_log_cannot_tell(cache, catalog, monkeypatch):
+    monkeypatch.setattr(cache_module, "CATALOG_CACHE_SYNC_MAX_CHANGES", 1)
+    _other_worker_writes((catalog[0], "Iluminación"), (catalog[1], "Iluminación"))
+
+    _sync(cache)
+    assert cache.stats()["entries"] == 0
+    assert cache.events == [(None, None)]
+    # Caught up with the log again
+    _other_worker_writes((catalog[2], "Iluminación"))
+    _sync(cache)
+    assert cache.events[-1][1] == [catalog[2]]
+
+
+def test_search_sees_a_product_another_worker_wrote(client, product, shared, monkeypatch):
+    rebuilds = []
+    monkeypatch.setattr(search_index, "rebuild", lambda docs: rebuilds.append(docs))
+    assert client.get("/products/search", params={"q": "zzqx"}).json() == []
+    with engine.begin() as conn:
+        conn.execute(text("UPDATE Products SET title = 'Reflector zzqx' WHERE id = :id"), {"id": product})
+    _other_worker_writes((product, "Iluminación"))
+
+    response = client.get("/products/search", params={"q": "zzqx"})
+    assert [p["id"] for p in response.json()] == [product]
+    # Re-indexed on its own, without a rebuild
+    assert rebuilds == []
@@ -0,0 +1,128 @@
+"""ETag / If-None-Match handling of the catalog reads."""
+import pytest
+
+import routers.products as products
+import services.catalog_cache as cache_module
+import services.http_cache as http_cache
+from services.catalog_cache import catalog_cache
+from services.http_cache import make_etag
+
+CATEGORY = "/products/category/Iluminación"
+IDENTITY = {"Accept-Encoding": "identity"}
+
+
+def _get(client, url, etag=None, **headers):
+    if etag:
+        headers["If-None-Match"] = etag
+    return client.get(url, headers={**IDENTITY, **headers})
+
+
+@pytest.mark.parametrize("url", ["/products/products", CATEGORY, "/products/batch?ids={id}"])
+def test_matching_if_none_match_is_304(client, catalog, url):
+    url = url.format(id=catalog[0])
+    first = _get(client, url)
+    assert first.status_code == 200
+    etag = first.headers["ETag"]
+    assert first.headers["Cache-Control"]
+
+    again = _get(client, url, etag)
+    assert again.status_code == 304
+    assert again.content == b""
+    assert again.headers["ETag"] == etag
+    # Also when the client only kept the weak form, or sends several
+    assert _get(client, url, f"W/{etag}").status_code == 304
+    assert _get(client, url, f'"stale", {etag}').status_code == 304
+    assert _get(client, url, '"stale"').status_code == 200
+
+
+def test_product_304(client, catalog):
+    url = f"/products/products/{catalog[1]}"
+    etag = _get(client, url).headers["ETag"]
+    assert _get(client, url, etag).status_code == 304
+
+
+def _create(client):
+    response = client.post("/products/products/create_product", data={
+        "title": "Foco nuevo", "price": "10", "category": "Iluminación", "details_items": ["12V"],
+    })
+    assert response.status_code == 200
+    return response.json()["product"]["id"]
+
+
+def test_etag_changes_after_create(client):
+    before = _get(client, CATEGORY).headers["ETag"]
+    product = _create(client)
+    response = _get(client, CATEGORY, before)
+    assert response.status_code == 200
+    assert response.headers["ETag"] != before
+    assert product in response.text
+
+
+def test_etag_changes_after_update(client):
+    product = _create(client)
+    url = f"/products/products/{product}"
+    product_etag = _get(client, url).headers["ETag"]
+    page_etag = _get(client, CATEGORY).headers["ETag"]
+
+    assert client.patch(url, data={"price": "99.5"}).status_code == 200
+
+    response = _get(client, url, product_etag)
+    assert response.status_code == 200
+    assert response.headers["ETag"] != product_etag
+    assert response.json()["price"] == 99.5
+    assert _get(client, CATEGORY, page_etag).status_code == 200
+
+
+def test_etag_changes_after_delete(client):
+    product = _create(client)
+    url = f"/products/products/{product}"
+    page = _get(client, CATEGORY)
+    assert product in page.text
+    page_etag = page.headers["ETag"]
+    assert _get(client, url).status_code == 200
+
+    assert client.delete(url).status_code == 200
+
+    response = _get(client, CATEGORY, page_etag)
+    assert response.status_code == 200
+    assert response.headers["ETag"] != page_etag
+    assert product not in response.text
+    assert _get(client, url).status_code == 404
+
+
+def test_compressed_responses_carry_a_weak_etag(client):
+    plain = _get(client, "/products/products")
+    assert "Content-Encoding" not in plain.headers
+    strong = plain.headers["ETag"]
+    assert not strong.startswith("W/")
+
+    compressed = client.get("/products/products", headers={"Accept-Encoding": "gzip"})
+    assert compressed.headers["Content-Encoding"] == "gzip"
+    assert compressed.headers["ETag"] == f"W/{strong}"
+    assert compressed.content == plain.content
+
+    # The weak tag a browser keeps after a compressed response still revalidates
+    again = client.get("/products/products", headers={"Accept-Encoding": "gzip", "If-None-Match": compressed.headers["ETag"]})
+    assert again.status_code == 304
+
+
+def test_shared_etag_is_the_version_the_body_was_loaded_at(client, monkeypatch):
+    for module in (products, cache_module, http_cache):
+        monkeypatch.setattr(module, "CATALOG_CACHE_SHARED", True)
+    monkeypatch.setattr(cache_module, "CATALOG_CACHE_VERSION_CHECK", 0)
+    catalog_cache.clear()
+    loaded = []
+    page_content = products._page_content
+
+    def load_then_sync_newer(conn, **page):
+        content = page_content(conn, **page)
+        loaded.append(content[2])
+        # Another request on this worker syncs a newer version before this response is built
+        catalog_cache.shared_version = content[2] + 1
+        return content
+
+    monkeypatch.setattr(products, "_page_content", load_then_sync_newer)
+    response = _get(client, CATEGORY)
+    assert response.status_code == 200
+    assert loaded and loaded[0] is not None
+    assert response.headers["ETag"] == make_etag("v", loaded[0], response.request.url.path, "")
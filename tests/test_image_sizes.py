@@ -0,0 +1,124 @@
+"""Image urls in catalog responses: list forms carry one size, not the variants map."""
+import io
+
+import pytest
+from PIL import Image
+from sqlalchemy import text
+
+from conftest import IMAGES_DIR
+from Database.dbGetConnection import engine
+from services.hydration import fetch_products_by_ids
+from services.image_variants import apply_image_size
+from services.read_model import DETAIL_DOCUMENT, READ_MODEL_SIZES, _delete_product_documents, _write_product_documents
+
+
+def _jpeg(color):
+    buf = io.BytesIO()
+    Image.new("RGB", (640, 480), color).save(buf, "JPEG")
+    return buf.getvalue()
+
+
+@pytest.fixture(scope="module")
+def uploaded(client):
+    """A product in its own category whose main image has pre-generated variants."""
+    response = client.post(
+        "/products/products/create_product",
+        data={"title": "Reflector exterior", "price": "50", "category": "Reflectores"},
+        files={"main_image": ("reflector.jpg", _jpeg((200, 40, 40)), "image/jpeg")},
+    )
+    assert response.status_code == 200
+    return response.json()["product"]
+
+
+def _items(response):
+    body = response.json()
+    return body["items"] if isinstance(body, dict) else body
+
+
+@pytest.mark.parametrize("url", [
+    "/products/products",
+    "/products/category/Reflectores",
+    "/products/search?q=reflector",
+    "/products/filter?category=Reflectores",
+    "/products/batch?ids={id}&image_size=thumb",
+])
+def test_lists_drop_the_variants_map(client, uploaded, url):
+    items = _items(client.get(url.format(id=uploaded["id"])))
+    assert items
+    for item in items:
+        assert "image_variants" not in item
+        assert "main_image_webp" in item
+    item = next(i for i in items if i["id"] == uploaded["id"])
+    assert item["main_image"].endswith("_thumb.jpg")
+    assert item["main_image_webp"].endswith("_thumb.webp")
+
+
+def test_products_without_variants_get_a_null_webp(client, catalog):
+    items = client.get("/products/category/Cables").json()
+    assert items
+    assert all(item["main_image_webp"] is None for item in items)
+
+
+def test_variants_map_on_request(client, uploaded):
+    items = client.get("/products/category/Reflectores", params={"fields": "id,main_image,image_variants"}).json()
+    assert set(items[0]["image_variants"][uploaded["main_image"]]) == {"thumb", "card", "full"}
+    items = client.get("/products/category/Reflectores", params={"fields": "id,main_image"}).json()
+    assert "image_variants" not in items[0]
+    assert items[0]["main_image_webp"].endswith("_thumb.webp")
+
+
+def test_original_size_keeps_original_urls(client, uploaded):
+    item = client.get("/products/category/Reflectores", params={"image_size": "original"}).json()[0]
+    assert item["main_image"] == uploaded["main_image"]
+    assert item["main_image_webp"] is None
+    assert "image_variants" not in item
+
+
+def test_product_page_keeps_the_variants_map(client, uploaded):
+    product = client.get(f"/products/products/{uploaded['id']}").json()
+    assert product["main_image"] == uploaded["main_image"]
+    assert set(product["image_variants"][uploaded["main_image"]]) == {"thumb", "card", "full"}
+
+
+def test_read_model_documents(uploaded):
+    with engine.connect() as conn:
+        product = fetch_products_by_ids(conn, [uploaded["id"]])[uploaded["id"]]
+        _delete_product_documents(conn, [product["id"]])
+        _write_product_documents(conn, [product])
+        documents = dict(conn.execute(
+            text("SELECT image_size, document FROM product_documents WHERE product_id = :id"),
+            {"id": uploaded["id"]},
+        ).all())
+        conn.rollback()
+    assert set(documents) == {DETAIL_DOCUMENT, *READ_MODEL_SIZES}
+    assert "image_variants" in documents[DETAIL_DOCUMENT]
+    for size in READ_MODEL_SIZES:
+        assert "image_variants" not in documents[size]
+        assert "main_image_webp" in documents[size]
+
+
+def test_apply_image_size_keeps_the_map_when_asked():
+    product = {"id": "1", "main_image": "a.jpg", "images": ["b.jpg"], "image_variants": {
+        "a.jpg": {"card": {"jpg": "a_card.jpg", "webp": "a_card.webp"}},
+    }}
+    card = apply_image_size(product, "card")
+    assert card == {"id": "1", "main_image": "a_card.jpg", "main_image_webp": "a_card.webp", "images": ["b.jpg"]}
+    assert apply_image_size(product, "card", keep_variants=True)["image_variants"] == product["image_variants"]
+    assert apply_image_size({"id": "2", "main_image": None}, "thumb")["main_image_webp"] is None
+    assert "image_variants" in product
+
+
+@pytest.mark.parametrize("content", [b"not an image", None])
+def test_undecodable_original_has_no_variants(client, content):
+    if content is None:
+        # A JPEG cut off halfway
+        image = io.BytesIO()
+        Image.new("RGB", (640, 480), (200, 30, 30)).save(image, "JPEG")
+        content = image.getvalue()[:len(image.getvalue()) // 2]
+    fname = f"broken-{len(content)}.jpg"
+    with open(f"{IMAGES_DIR}{fname}", "wb") as f:
+        f.write(content)
+
+    for size in ("thumb", "card"):
+        assert client.get(f"/images/{fname}?size={size}").status_code == 404
+    assert client.get(f"/images/{fname}").status_code == 200
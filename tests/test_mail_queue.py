@@ -0,0 +1,259 @@
+"""Contact-form delivery through the spool, against the local SMTP stand-in."""
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+import httpx
+import pytest
+
+import services.mail_queue as mail
+from benchmarks.smtp_standin import SMTPStandIn
+from services.mail_queue import MailQueue
+
+FORM = {"full_name": "Ana Pérez", "email": "ana@example.com", "message": "¿Tienen stock?"}
+
+
+@pytest.fixture
+def spool(tmp_path, monkeypatch):
+    directory = str(tmp_path / "spool")
+    monkeypatch.setattr(mail, "MAIL_SPOOL_DIR", directory)
+    monkeypatch.setattr(mail, "MAIL_FAILED_DIR", os.path.join(directory, "failed"))
+    monkeypatch.setattr(mail, "MAIL_RETRY_BASE", 0.05)
+    monkeypatch.setattr(mail, "MAIL_RETRY_MAX", 0.2)
+    monkeypatch.setattr(mail, "MAIL_MAX_ATTEMPTS", 5)
+    monkeypatch.setattr(mail, "SMTP_HOST", "127.0.0.1")
+    monkeypatch.setattr(mail, "SMTP_PORT", _free_port())
+    monkeypatch.setattr(mail, "SMTP_SECURITY", "none")
+    monkeypatch.setenv("SENDER_EMAIL", "tienda@example.com")
+    monkeypatch.setenv("SENDER_PASSWORD", "secret")
+    monkeypatch.setenv("RECEIVER_EMAIL", "ventas@example.com")
+    return directory
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+async def _serve(standin):
+    return await asyncio.start_server(standin.handle, "127.0.0.1", mail.SMTP_PORT)
+
+
+async def _until(condition, timeout=5):
+    for _ in range(int(timeout / 0.01)):
+        if condition():
+            return
+        await asyncio.sleep(0.01)
+    raise AssertionError("timed out")
+
+
+def _files(directory):
+    return sorted(e.name for e in os.scandir(directory) if e.is_file())
+
+
+def _spool_record(spool, message_id, name=None, **fields):
+    """Spool a message as `name` (written aside and renamed, like the app does)."""
+    record = {"id": message_id, "subject": "Contacto", "body": "Hola", "reply_to": None, "attempts": 0, "created": 0, **fields}
+    os.makedirs(spool, exist_ok=True)
+    path = os.path.join(spool, name or f"{message_id}.json")
+    with open(f"{path}.part", "w", encoding="utf-8") as f:
+        json.dump(record, f)
+    os.replace(f"{path}.part", path)
+
+
+@pytest.mark.anyio
+async def test_form_is_accepted_and_spooled(app, spool):
+    # The lifespan does not run here, so nothing is sent
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://testserver") as client:
+        response = await client.post("/contact/formContact", json=FORM)
+    assert response.status_code == 202
+    message_id = response.json()["id"]
+    assert _files(spool) == [f"{message_id}.json"]
+    with open(os.path.join(spool, f"{message_id}.json"), encoding="utf-8") as f:
+        record = json.load(f)
+    assert record["subject"] == "Ana Pérez - Contacto"
+    assert record["reply_to"] == "ana@example.com"
+    assert "¿Tienen stock?" in record["body"]
+
+
+@pytest.mark.anyio
+@pytest.mark.parametrize("field, value", [
+    ("email", "ana@example.com\r\nBcc: otro@example.com"),
+    ("email", "no es un email"),
+    ("full_name", "Ana\r\nBcc: otro@example.com"),
+])
+async def test_header_injection_is_rejected(app, spool, field, value):
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://testserver") as client:
+        response = await client.post("/contact/formContact", json={**FORM, field: value})
+    assert response.status_code == 422
+    assert not os.path.exists(spool) or _files(spool) == []
+
+
+@pytest.mark.anyio
+async def test_enqueue_refuses_a_message_that_cannot_be_rendered(spool):
+    with pytest.raises(ValueError):
+        await MailQueue().enqueue("Contacto\r\nBcc: otro@example.com", "Hola")
+    assert not os.path.exists(spool) or _files(spool) == []
+
+
+@pytest.mark.anyio
+async def test_message_is_delivered_and_unspooled(spool):
+    standin = SMTPStandIn()
+    server = await _serve(standin)
+    queue = MailQueue(workers=2)
+    await queue.start()
+    try:
+        for _ in range(5):
+            await queue.enqueue("Contacto", "Hola", reply_to="ana@example.com")
+        await _until(lambda: standin.messages == 5)
+        await _until(lambda: not _files(spool))
+    finally:
+        await queue.stop()
+        server.close()
+    assert queue.stats()["sent"] == 5
+    # One connection per worker, reused across messages
+    assert standin.connections <= 2
+
+
+@pytest.mark.anyio
+async def test_transient_failure_is_retried_with_backoff(spool, monkeypatch):
+    delays = []
+    schedule = MailQueue._schedule_retry
+
+    def record_delay(self, record):
+        delays.append(schedule(self, record))
+        return delays[-1]
+
+    monkeypatch.setattr(MailQueue, "_schedule_retry", record_delay)
+    queue = MailQueue(workers=1)
+    await queue.start()
+    server = None
+    try:
+        # Nothing listens yet: connection refused
+        message_id = await queue.enqueue("Contacto", "Hola")
+        # Scheduled only once the attempt is recorded in the spool
+        await _until(lambda: queue.stats()["retried"] >= 3 and queue.stats()["waiting_retry"])
+        with open(os.path.join(spool, f"{message_id}.{os.getpid()}.sending"), encoding="utf-8") as f:
+            record = json.load(f)
+        assert record["attempts"] >= 3
+        assert record["last_error"]
+
+        standin = SMTPStandIn()
+        server = await _serve(standin)
+        await _until(lambda: standin.messages == 1)
+        await _until(lambda: not _files(spool))
+    finally:
+        await queue.stop()
+        if server is not None:
+            server.close()
+    # Exponential, with ±20% jitter, capped at MAIL_RETRY_MAX
+    assert 0.04 <= delays[0] <= 0.06
+    assert 0.08 <= delays[1] <= 0.12
+    assert all(delay <= 0.2 * 1.2 for delay in delays)
+    assert queue.stats()["failed"] == 0
+
+
+@pytest.mark.anyio
+async def test_rejected_message_moves_to_failed(spool):
+    standin = SMTPStandIn(refuse_recipients=True)
+    server = await _serve(standin)
+    queue = MailQueue(workers=1)
+    await queue.start()
+    try:
+        message_id = await queue.enqueue("Contacto", "Hola")
+        await _until(lambda: queue.stats()["failed"] == 1)
+    finally:
+        await queue.stop()
+        server.close()
+    assert queue.stats()["retried"] == 0
+    assert _files(spool) == []
+    with open(os.path.join(spool, "failed", f"{message_id}.json"), encoding="utf-8") as f:
+        record = json.load(f)
+    assert record["attempts"] == 1
+    assert "550" in record["last_error"]
+
+
+@pytest.mark.anyio
+async def test_unrenderable_spooled_message_is_not_retried(spool):
+    # e.g. spooled by a version that did not check the headers
+    _spool_record(spool, "e" * 32, reply_to="ana@example.com\r\nBcc: otro@example.com")
+    standin = SMTPStandIn()
+    server = await _serve(standin)
+    queue = MailQueue(workers=1)
+    await queue.start()
+    try:
+        await _until(lambda: queue.stats()["failed"] == 1)
+    finally:
+        await queue.stop()
+        server.close()
+    assert queue.stats()["retried"] == 0
+    assert standin.messages == 0
+    assert os.path.exists(os.path.join(spool, "failed", f"{'e' * 32}.json"))
+
+
+@pytest.mark.anyio
+async def test_restart_resumes_the_spool(spool):
+    # Accepted while no queue ran, claimed by a process that crashed, and
+    # claimed by a process that is still sending (left alone)
+    exited = subprocess.Popen([sys.executable, "-c", "pass"])
+    exited.wait()
+    _spool_record(spool, "a" * 32)
+    _spool_record(spool, "b" * 32, f"{'b' * 32}.{exited.pid}.sending")
+    _spool_record(spool, "c" * 32, f"{'c' * 32}.{os.getppid()}.sending")
+
+    standin = SMTPStandIn()
+    server = await _serve(standin)
+    queue = MailQueue(workers=1)
+    await queue.start()
+    try:
+        await _until(lambda: standin.messages == 2)
+    finally:
+        await queue.stop()
+        server.close()
+    assert _files(spool) == [f"{'c' * 32}.{os.getppid()}.sending"]
+
+
+@pytest.mark.anyio
+async def test_stop_hands_unsent_messages_back(spool):
+    queue = MailQueue(workers=1)
+    await queue.start()
+    message_id = await queue.enqueue("Contacto", "Hola")
+    await _until(lambda: queue.stats()["retried"] >= 1)
+    await queue.stop()
+    assert _files(spool) == [f"{message_id}.json"]
+
+
+@pytest.mark.anyio
+async def test_running_queue_picks_up_unclaimed_messages(spool):
+    standin = SMTPStandIn()
+    server = await _serve(standin)
+    queue = MailQueue(workers=1, scan_interval=0.05)
+    await queue.start()
+    try:
+        # e.g. handed back by a worker that stopped after this one started
+        _spool_record(spool, "d" * 32)
+        await _until(lambda: standin.messages == 1)
+    finally:
+        await queue.stop()
+        server.close()
+
+
+def test_each_message_is_claimed_by_one_worker(spool):
+    ids = [f"{i:032x}" for i in range(200)]
+    for message_id in ids:
+        _spool_record(spool, message_id)
+
+    with ProcessPoolExecutor(4, mp_context=get_context("fork")) as pool:
+        results = [pool.submit(mail._claim_spool) for _ in range(4)]
+        claimed = [record["id"] for result in results for record in result.result()]
+    assert sorted(claimed) == ids
+
+    # Those workers are gone now; their claims are taken over
+    assert sorted(record["id"] for record in mail._claim_spool()) == ids
+    assert all(name.endswith(f".{os.getpid()}.sending") for name in _files(spool))
@@ -0,0 +1,146 @@
+"""Statement counts of the product write path.
+
+Updates diff the child tables instead of deleting and re-inserting them, and
+a PATCH only touches what it sends; these counts catch regressions back to
+per-row statements or full rewrites.
+"""
+from sqlalchemy import text
+
+from conftest import IMAGES_BASE_URL
+from Database.dbGetConnection import engine
+from services.image_variants import StoredVariant
+from services.product_writes import update_product
+
+MAIN = f"{IMAGES_BASE_URL}/bench-00000.jpg"
+GALLERY = [f"{IMAGES_BASE_URL}/bench-00001.jpg", f"{IMAGES_BASE_URL}/bench-00002.jpg"]
+NEW_IMAGE = f"{IMAGES_BASE_URL}/bench-00003.jpg"
+
+
+def _update(product_id, fields, **children):
+    with engine.begin() as conn:
+        return update_product(conn, product_id, fields, **children)
+
+
+def _values(product_id, table, column):
+    with engine.connect() as conn:
+        return sorted(conn.execute(
+            text(f"SELECT {column} FROM {table} WHERE product_id = :id"), {"id": product_id}
+        ).scalars())
+
+
+def _touching(statements, *tables):
+    return [s for s in statements if any(table in s for table in tables)]
+
+
+def _write(statements):
+    """The statements of update_product in a request: those before its change-log entry.
+
+    The reads after the commit (warming the caches again) are not part of the write.
+    """
+    end = next(i for i, s in enumerate(statements) if "catalog_change_seq" in s)
+    return statements[:end]
+
+
+def test_price_only_update(product, statements):
+    _update(product, {"price": 120.0})
+    # Category lookup and one UPDATE; no child table is read
+    assert len(statements) == 2
+    assert not _touching(statements, "details", "sub_categorys", "products_imgs", "products_main_imgs")
+
+
+def test_details_replacement_writes_only_the_difference(product, statements):
+    _update(product, {}, details=["220V", "IP65", "Garantía 2 años"])
+    # Category, SELECT details, one DELETE and one executemany INSERT
+    assert len(statements) == 4
+    assert _values(product, "details", "detail_text") == ["220V", "Garantía 2 años", "IP65"]
+
+
+def test_unchanged_details_are_not_rewritten(product, statements):
+    _update(product, {}, details=["Garantía 1 año", "IP65", "220V"])
+    assert len(statements) == 2
+
+
+def test_many_new_details_are_one_insert(product, statements):
+    _update(product, {}, details=[f"Detalle {i}" for i in range(50)])
+    assert len(statements) == 4
+    assert len(_values(product, "details", "detail_text")) == 50
+
+
+def test_main_image_replacement(product, statements):
+    variants = [
+        StoredVariant(NEW_IMAGE, size, "webp", "", f"{IMAGES_BASE_URL}/variants/bench-00003_{size}.webp")
+        for size in ("thumb", "card")
+    ]
+    old_category, removed = _update(product, {}, main_image=NEW_IMAGE, variants=variants)
+    # Category, SELECT/UPDATE main image, variants still in use, variants of the
+    # old image, orphan check, SELECT/INSERT new variants
+    assert len(statements) == 8
+    assert old_category == "Iluminación"
+    # The seeded images are shared with other products
+    assert removed == []
+    assert _values(product, "products_main_imgs", "url") == [NEW_IMAGE]
+    assert len(_values(product, "products_img_variants", "url")) == 2
+
+
+def test_same_main_image_is_not_rewritten(product, statements):
+    _update(product, {}, main_image=MAIN)
+    assert len(statements) == 2
+
+
+def test_keep_images(product, statements):
+    _update(product, {}, keep_images=GALLERY[:1])
+    # Category, variant-url mapping, SELECT gallery, one DELETE, variants in use,
+    # variants of the dropped image, orphan check
+    assert len(statements) == 7
+    assert _values(product, "products_imgs", "url") == GALLERY[:1]
+
+
+def test_keep_images_empty_clears_the_gallery(product, statements):
+    _update(product, {}, keep_images=[])
+    assert len(statements) == 6
+    assert _values(product, "products_imgs", "url") == []
+
+
+def test_patch_price_touches_no_child_table(client, product, statements):
+    response = client.patch(f"/products/products/{product}", data={"price": "150"})
+    assert response.status_code == 200
+    statements = _write(statements)
+    assert len(statements) == 2
+    assert not _touching(statements, "details", "sub_categorys", "products_imgs", "products_main_imgs")
+
+
+def test_patch_details(client, product, statements):
+    response = client.patch(f"/products/products/{product}", data={"details": ["220V", "IP44"]})
+    assert response.status_code == 200
+    statements = _write(statements)
+    # Category, then SELECT, one DELETE for the two dropped rows and one INSERT
+    assert len(statements) == 4
+    assert len(_touching(statements, "details")) == 3
+    assert not _touching(statements, "sub_categorys", "products_imgs", "UPDATE Products")
+    assert _values(product, "details", "detail_text") == ["220V", "IP44"]
+
+
+def test_patch_keep_images(client, product, statements):
+    response = client.patch(f"/products/products/{product}", data={"keep_images": GALLERY[1:]})
+    assert response.status_code == 200
+    statements = _write(statements)
+    assert len(statements) == 7
+    assert not _touching(statements, "details", "sub_categorys")
+    assert _values(product, "products_imgs", "url") == GALLERY[1:]
+    assert _values(product, "details", "detail_text") == ["220V", "Garantía 1 año", "IP65"]
+
+
+def test_put_keeps_children_it_does_not_send(client, product, statements):
+    response = client.put(
+        f"/products/products/{product}",
+        data={"title": "Lámpara de prueba", "price": "100", "category": "Iluminación"},
+    )
+    assert response.status_code == 200
+    statements = _write(statements)
+    assert len(statements) == 2
+    assert not _touching(statements, "details", "sub_categorys", "products_imgs")
+    assert _values(product, "sub_categorys", "sub_category_name") == ["Led B", "Lámpara A"]
+
+
+def test_update_of_missing_product_is_404(client):
+    assert client.patch("/products/products/missing", data={"price": "1"}).status_code == 404
@@ -0,0 +1,76 @@
+"""Tokenizing and ranking of the in-memory product search."""
+import pytest
+
+from services.search_index import SearchIndex, stem
+
+PRODUCTS = [
+    {"id": "cable", "title": "Cable unipolar 2.5mm", "sub_categorys": ["Cables"], "details_list": ["Rollo 100m"]},
+    {"id": "lampara", "title": "Lámpara LED cálida", "sub_categorys": ["Iluminación"], "details_list": ["Potencia 10W"]},
+    {"id": "lamparas", "title": "Pack lámparas de pie", "sub_categorys": ["Iluminación"], "details_list": []},
+    {"id": "interruptor", "title": "Interruptor doble", "sub_categorys": ["Interruptores"], "details_list": ["Uso interior"]},
+]
+
+
+@pytest.fixture(scope="module")
+def index():
+    index = SearchIndex()
+    index.rebuild(PRODUCTS)
+    return index
+
+
+def _ids(index, query, prefix=True):
+    return sorted(pid for pid, _ in index.search(query, prefix=prefix))
+
+
+@pytest.mark.parametrize("singular, plural", [
+    ("cable", "cables"), ("lampara", "lamparas"), ("interruptor", "interruptores"),
+    ("led", "leds"), ("voltaje", "voltajes"), ("canal", "canales"),
+])
+def test_singular_and_plural_share_a_stem(singular, plural):
+    assert stem(singular) == stem(plural)
+
+
+@pytest.mark.parametrize("prefix", [True, False])
+@pytest.mark.parametrize("query, expected", [
+    ("cable", ["cable"]),
+    ("cables", ["cable"]),
+    ("Cables", ["cable"]),
+    ("lampara", ["lampara", "lamparas"]),
+    ("lámparas", ["lampara", "lamparas"]),
+    ("interruptores", ["interruptor"]),
+    ("cable unipolar", ["cable"]),
+    ("lamparas led", ["lampara"]),
+    ("interruptores interior", ["interruptor"]),
+])
+def test_whole_words_in_either_number(index, query, expected, prefix):
+    assert _ids(index, query, prefix) == expected
+
+
+@pytest.mark.parametrize("query, expected", [
+    ("lam", ["lampara", "lamparas"]),
+    ("cab", ["cable"]),
+    ("interrup", ["interruptor"]),
+    ("interruptore", ["interruptor"]),
+    ("lampara c", ["lampara"]),
+    ("pack la", ["lamparas"]),
+])
+def test_prefix_of_the_last_word(index, query, expected):
+    assert _ids(index, query) == expected
+
+
+def test_prefix_is_only_for_the_last_word(index):
+    assert _ids(index, "lam led") == []
+    assert _ids(index, "lam", prefix=False) == []
+
+
+def test_whole_word_scores_above_prefix(index):
+    hits = index.search("interior")
+    assert hits[0][0] == "interruptor"
+    assert dict(index.search("led"))["lampara"] > dict(index.search("le"))["lampara"]
+
+
+@pytest.mark.parametrize("query", ["cables", "cable", "lamparas", "Lámparas"])
+def test_search_endpoint_finds_plural_queries(client, query):
+    response = client.get("/products/search", params={"q": query})
+    assert response.status_code == 200
+    assert response.json()
@@ -0,0 +1,155 @@
+"""Request coalescing of identical catalog reads."""
+import asyncio
+import threading
+
+import httpx
+import pytest
+
+import routers.products as products
+from services.catalog_cache import catalog_cache
+from services.single_flight import SingleFlight, read_flight
+
+CATEGORY = "/products/category/Cables"
+CONCURRENT = 16
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+async def http(app):
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://testserver") as client:
+        yield client
+
+
+@pytest.fixture
+def gate(monkeypatch):
+    """Hold every page load until the test opens the gate; counts the loads."""
+    opened = threading.Event()
+    loads = []
+    page_content = products._page_content
+
+    def gated(conn, **page):
+        loads.append(page)
+        opened.wait(5)
+        return page_content(conn, **page)
+
+    monkeypatch.setattr(products, "_page_content", gated)
+    catalog_cache.clear()
+    gated.opened = opened
+    gated.loads = loads
+    return gated
+
+
+async def _followers(count):
+    """Wait until `count` more requests are waiting on an in-flight load."""
+    start = read_flight.stats()["tracked_totals"]["follower"]
+    for _ in range(500):
+        if read_flight.stats()["tracked_totals"]["follower"] - start >= count:
+            return
+        await asyncio.sleep(0.01)
+    raise AssertionError("the requests were not coalesced")
+
+
+async def test_identical_reads_share_one_load(http, gate, statements):
+    gate.opened.set()
+    single = await http.get(CATEGORY)
+    single_statements = len(statements)
+    assert single_statements > 0
+    gate.opened.clear()
+    gate.loads.clear()
+    catalog_cache.clear()
+    statements.clear()
+
+    requests = [asyncio.create_task(http.get(CATEGORY)) for _ in range(CONCURRENT)]
+    await _followers(CONCURRENT - 1)
+    gate.opened.set()
+    responses = await asyncio.gather(*requests)
+
+    assert len(gate.loads) == 1
+    assert len(statements) == single_statements
+    assert {r.status_code for r in responses} == {200}
+    assert {r.content for r in responses} == {single.content}
+    assert {r.headers["ETag"] for r in responses} == {single.headers["ETag"]}
+
+
+async def test_load_error_reaches_every_follower(http, gate, monkeypatch):
+    def failing(conn, **page):
+        gate.loads.append(page)
+        gate.opened.wait(5)
+        raise RuntimeError("database went away")
+
+    monkeypatch.setattr(products, "_page_content", failing)
+    requests = [asyncio.create_task(http.get(CATEGORY)) for _ in range(CONCURRENT)]
+    await _followers(CONCURRENT - 1)
+    gate.opened.set()
+    responses = await asyncio.gather(*requests)
+
+    assert len(gate.loads) == 1
+    assert {r.status_code for r in responses} == {500}
+    assert {r.json()["detail"] for r in responses} == {"database went away"}
+    # The failure is not remembered: the next request loads again
+    monkeypatch.setattr(products, "_page_content", gate)
+    assert (await http.get(CATEGORY)).status_code == 200
+
+
+async def test_follower_takes_over_a_cancelled_load():
+    flight = SingleFlight(wait=5, enabled=True)
+    calls = []
+    release = asyncio.Event()
+
+    async def load():
+        calls.append(len(calls))
+        await release.wait()
+        return len(calls)
+
+    leader = asyncio.create_task(flight.do(("page", "x"), load))
+    await asyncio.sleep(0)
+    followers = [asyncio.create_task(flight.do(("page", "x"), load)) for _ in range(3)]
+    await asyncio.sleep(0)
+    leader.cancel()
+    # Let a follower take over before the load can finish
+    await asyncio.sleep(0.01)
+    assert len(calls) == 2
+    release.set()
+
+    assert await asyncio.gather(*followers) == [2, 2, 2]
+    assert len(calls) == 2
+    with pytest.raises(asyncio.CancelledError):
+        await leader
+    assert flight.stats()["in_flight"] == 0
+
+
+async def test_follower_loads_alone_after_waiting_too_long():
+    flight = SingleFlight(wait=0.05, enabled=True)
+    release = asyncio.Event()
+
+    async def slow():
+        await release.wait()
+        return "leader"
+
+    async def fast():
+        return "own"
+
+    leader = asyncio.create_task(flight.do(("product", 1), slow))
+    await asyncio.sleep(0)
+    assert await flight.do(("product", 1), fast) == "own"
+    release.set()
+    assert await leader == "leader"
+    assert flight.stats()["tracked_totals"]["timeout"] == 1
+
+
+async def test_forget_starts_a_fresh_load():
+    flight = SingleFlight(enabled=True)
+    release = asyncio.Event()
+
+    async def load(value):
+        await release.wait()
+        return value
+
+    before = asyncio.create_task(flight.do(("page",), load, "old"))
+    await asyncio.sleep(0)
+    flight.forget()
+    after = asyncio.create_task(flight.do(("page",), load, "new"))
+    await asyncio.sleep(0)
+    release.set()
+    assert await asyncio.gather(before, after) == ["old", "new"]